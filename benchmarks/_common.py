@@ -0,0 +1,78 @@
+"""Helpers shared by the benchmarks. Each benchmark module has a `run()` that
+returns a dictionary of results (which `run_all.py` collects) and can also be
+run on its own.
+"""
+
+import os.path
+import sys
+current_path = os.path.dirname(__file__)
+dev_path = os.path.abspath(os.path.join(current_path, '..'))
+sys.path.insert(0, dev_path)
+
+import gc
+import json
+import platform
+import time
+
+
+def best_of(repeat, fn):
+    """Call the function the given number of times and return the shortest
+    duration and the result from that call. Garbage is collected between
+    calls so that resources (e.g. watches) held by a previous call are
+    released.
+    """
+
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+
+        start_s = time.perf_counter()
+        result = fn()
+        elapsed_s = time.perf_counter() - start_s
+
+        if best is None or elapsed_s < best[0]:
+            best = (elapsed_s, result)
+
+    return best
+
+
+def get_percentiles(values, percentiles=(50, 90, 99)):
+    """Return the nearest-rank percentiles (and the maximum) of the given
+    values.
+    """
+
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    result = {}
+    for percentile in percentiles:
+        index = max(0, int(round(percentile / 100.0 * len(ordered))) - 1)
+        result['p{}'.format(percentile)] = ordered[index]
+
+    result['max'] = ordered[-1]
+
+    return result
+
+
+def build_document(results):
+    return {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def write_results(filepath, results):
+    with open(filepath, 'w') as f:
+        json.dump(build_document(results), f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def print_results(name, results):
+    for key, value in sorted(results.items()):
+        if isinstance(value, float):
+            value = '{:.6g}'.format(value)
+
+        print("{:<10} {:<40} {}".format(name, key, value))
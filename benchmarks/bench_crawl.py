@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""Measure how long it takes to crawl generated trees and to get a tree ready
+to deliver events (crawl plus watch registration).
+"""
+
+import _common
+
+import argparse
+import os
+import tempfile
+
+import inotify.adapters
+import inotify.crawl
+
+_DEFAULT_ENTRY_COUNTS = (10000, 100000)
+
+# Directories are kept sparse enough that even the largest tree fits within
+# the usual `max_user_watches`.
+_FILES_PER_DIRECTORY = 49
+_FANOUT = 16
+
+
+def _build_tree(path, entries):
+    """Create a tree with (about) the given number of entries, and return how
+    many directories it has.
+    """
+
+    directory_count = max(1, entries // (_FILES_PER_DIRECTORY + 1))
+
+    directories = [path]
+    for i in range(1, directory_count):
+        parent = directories[(i - 1) // _FANOUT]
+
+        directory = os.path.join(parent, 'dir{}'.format(i))
+        os.mkdir(directory)
+
+        directories.append(directory)
+
+    for directory in directories:
+        for j in range(_FILES_PER_DIRECTORY):
+            with open(os.path.join(directory, 'file{}'.format(j)), 'w'):
+                pass
+
+    return len(directories)
+
+
+def run(entry_counts=_DEFAULT_ENTRY_COUNTS, workers=4, repeat=3):
+    results = {}
+
+    for entries in entry_counts:
+        with tempfile.TemporaryDirectory() as path:
+            directory_count = _build_tree(path, entries)
+
+            (crawl_s, paths) = _common.best_of(
+                                repeat,
+                                lambda: inotify.crawl.crawl(path))
+
+            assert len(paths) == directory_count
+
+            (parallel_crawl_s, _) = _common.best_of(
+                                        repeat,
+                                        lambda: inotify.crawl.crawl(path, workers=workers))
+
+            (ready_s, _) = _common.best_of(
+                            repeat,
+                            lambda: inotify.adapters.InotifyTree(path))
+
+            prefix = '{}_entries'.format(entries)
+
+            results[prefix + '_directories'] = directory_count
+            results[prefix + '_crawl_s'] = crawl_s
+            results[prefix + '_crawl_{}_workers_s'.format(workers)] = parallel_crawl_s
+            results[prefix + '_tree_ready_s'] = ready_s
+
+    return results
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument(
+        '--entries',
+        type=int,
+        nargs='+',
+        default=list(_DEFAULT_ENTRY_COUNTS),
+        help="Tree-sizes to test (e.g. 10000 100000 1000000)")
+
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+
+    results = run(
+                entry_counts=args.entries,
+                workers=args.workers,
+                repeat=args.repeat)
+
+    _common.print_results('crawl', results)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+"""Measure the throughput of the event decoder (with tuples and with compact
+events) against the original bytes-concatenation decoder by pushing a
+synthetic event stream through a pipe.
+"""
+
+import _common
+
+import argparse
+import logging
+import os
+import select
+import struct
+import tempfile
+
+import inotify.adapters
+import inotify.events
+
+_LOGGER = logging.getLogger(__name__)
+
+_HEADER_STRUCT_FORMAT = 'iIII'
+_STRUCT_HEADER_LENGTH = struct.calcsize(_HEADER_STRUCT_FORMAT)
+
+# The default pipe capacity.
+_CHUNK_LENGTH = 64 * 1024
+
+
+class _LegacyDecoder(object):
+    """The decoding loop that `_handle_inotify_event` used to have."""
+
+    def __init__(self, wd, path):
+        self.__watches_r = {wd: path}
+        self.__buffer = b''
+
+    def handle(self, fd):
+        b = os.read(fd, 1024)
+        if not b:
+            return
+
+        self.__buffer += b
+
+        while 1:
+            length = len(self.__buffer)
+
+            if length < _STRUCT_HEADER_LENGTH:
+                return
+
+            peek_slice = self.__buffer[:_STRUCT_HEADER_LENGTH]
+
+            header_raw = struct.unpack(
+                            _HEADER_STRUCT_FORMAT,
+                            peek_slice)
+
+            header = inotify.adapters._INOTIFY_EVENT(*header_raw)
+            type_names = inotify.events._resolve_event_names(header.mask)
+            _LOGGER.debug("Events received in stream: {}".format(type_names))
+
+            event_length = (_STRUCT_HEADER_LENGTH + header.len)
+            if length < event_length:
+                return
+
+            filename = self.__buffer[_STRUCT_HEADER_LENGTH:event_length]
+            filename_bytes = filename.rstrip(b'\0')
+
+            self.__buffer = self.__buffer[event_length:]
+
+            path = self.__watches_r.get(header.wd)
+            if path is not None:
+                filename_unicode = filename_bytes.decode('utf8')
+                yield (header, type_names, path, filename_unicode)
+
+            buffer_length = len(self.__buffer)
+            if buffer_length < _STRUCT_HEADER_LENGTH:
+                break
+
+
+def _build_stream(wd, count):
+    parts = []
+    for i in range(count):
+        filename = 'file{:08d}'.format(i).encode('utf8')
+        padded_length = (len(filename) // 16 + 1) * 16
+        parts.append(struct.pack(_HEADER_STRUCT_FORMAT, wd, 0x100, 0, padded_length))
+        parts.append(filename.ljust(padded_length, b'\0'))
+
+    return b''.join(parts)
+
+
+def _run(handle, stream):
+    """Feed the stream through a pipe and decode everything."""
+
+    r, w = os.pipe()
+
+    decoded = 0
+
+    try:
+        for offset in range(0, len(stream), _CHUNK_LENGTH):
+            os.write(w, stream[offset:offset + _CHUNK_LENGTH])
+
+            while select.select([r], [], [], 0)[0]:
+                for event in handle(r):
+                    decoded += 1
+    finally:
+        os.close(r)
+        os.close(w)
+
+    return decoded
+
+
+def _decode_all(handle, stream, events):
+    decoded = _run(handle, stream)
+    assert decoded == events, (decoded, events)
+
+
+def run(events=200000, repeat=3):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as path:
+        i = inotify.adapters.Inotify()
+        wd = i.add_watch(path)
+
+        compact_i = inotify.adapters.Inotify(compact_events=True)
+        compact_wd = compact_i.add_watch(path)
+
+        assert compact_wd == wd
+
+        stream = _build_stream(wd, events)
+
+        legacy = _LegacyDecoder(wd, path)
+
+        handles = [
+            ('legacy', legacy.handle),
+            ('current', i._handle_inotify_event),
+            ('compact', compact_i._handle_inotify_event),
+        ]
+
+        for name, handle in handles:
+            (best_s, _) = _common.best_of(
+                            repeat,
+                            lambda: _decode_all(handle, stream, events))
+
+            results['{}_events_per_s'.format(name)] = events / best_s
+
+    return results
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+
+    results = run(events=args.events, repeat=args.repeat)
+    _common.print_results('decode', results)
+
+
+if __name__ == '__main__':
+    _main()
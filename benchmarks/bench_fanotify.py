@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""Compare `inotify.fanotify.FanotifyTree` with `inotify.adapters.InotifyTree`:
+how long each takes to get ready on a generated tree, and how quickly each
+delivers the events for files that are created throughout it. Nothing is
+measured if fanotify isn't supported (or we don't have the capabilities).
+"""
+
+import _common
+
+import argparse
+import os
+import tempfile
+import time
+
+import bench_crawl
+
+import inotify.adapters
+import inotify.constants
+import inotify.fanotify
+
+_DEFAULT_ENTRY_COUNT = 100000
+_DEFAULT_EVENT_COUNT = 10000
+
+
+def _collect(tree, paths, event_count, prefix):
+    """Create (new) files throughout the tree and return how long it took
+    until all of their events were yielded.
+    """
+
+    start_s = time.perf_counter()
+
+    for i in range(event_count):
+        directory = paths[i % len(paths)]
+        with open(os.path.join(directory, '{}{}'.format(prefix, i)), 'w'):
+            pass
+
+    received = 0
+    for event in tree.event_gen(timeout_s=5, yield_nones=False):
+        received += 1
+        if received == event_count:
+            break
+
+    assert received == event_count, received
+
+    return time.perf_counter() - start_s
+
+
+def run(entries=_DEFAULT_ENTRY_COUNT, event_count=_DEFAULT_EVENT_COUNT, repeat=3):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as path:
+        if inotify.fanotify.is_supported(path) is False:
+            return results
+
+        bench_crawl._build_tree(path, entries)
+
+        paths = [
+            directory
+            for directory, _, _
+            in os.walk(path)
+        ]
+
+        def create(tree_cls):
+            return tree_cls(path, mask=inotify.constants.IN_CREATE)
+
+        (inotify_ready_s, _) = _common.best_of(
+                                repeat,
+                                lambda: create(inotify.adapters.InotifyTree))
+
+        (fanotify_ready_s, _) = _common.best_of(
+                                    repeat,
+                                    lambda: create(inotify.fanotify.FanotifyTree))
+
+        tree = create(inotify.adapters.InotifyTree)
+        inotify_events_s = _collect(tree, paths, event_count, 'inotify')
+        del tree
+
+        tree = create(inotify.fanotify.FanotifyTree)
+        fanotify_events_s = _collect(tree, paths, event_count, 'fanotify')
+        tree.close()
+
+    results['directories'] = len(paths)
+    results['inotify_tree_ready_s'] = inotify_ready_s
+    results['fanotify_tree_ready_s'] = fanotify_ready_s
+    results['inotify_events_per_s'] = event_count / inotify_events_s
+    results['fanotify_events_per_s'] = event_count / fanotify_events_s
+
+    return results
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=_DEFAULT_ENTRY_COUNT)
+    parser.add_argument('--events', type=int, default=_DEFAULT_EVENT_COUNT)
+    parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+
+    results = run(
+                entries=args.entries,
+                event_count=args.events,
+                repeat=args.repeat)
+
+    _common.print_results('fanotify', results)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""Measure how long a fresh interpreter takes to import `inotify.adapters`
+(relative to one that imports nothing).
+"""
+
+import _common
+
+import argparse
+import subprocess
+import sys
+
+_DEFAULT_REPEAT = 10
+
+
+def _run_interpreter(code):
+    subprocess.check_call(
+        [sys.executable, '-c', code],
+        cwd=_common.dev_path)
+
+
+def run(repeat=_DEFAULT_REPEAT):
+    (baseline_s, _) = _common.best_of(
+                        repeat,
+                        lambda: _run_interpreter('pass'))
+
+    (import_s, _) = _common.best_of(
+                        repeat,
+                        lambda: _run_interpreter('import inotify.adapters'))
+
+    return {
+        'interpreter_s': baseline_s,
+        'import_s': import_s - baseline_s,
+    }
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=_DEFAULT_REPEAT)
+
+    args = parser.parse_args()
+
+    results = run(repeat=args.repeat)
+    _common.print_results('import', results)
+
+
+if __name__ == '__main__':
+    _main()
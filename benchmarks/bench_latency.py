@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Measure the latency from writing a file to having its event yielded by
+`event_gen()`, for `Inotify` and for `InotifyTree`.
+"""
+
+import _common
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import inotify.adapters
+import inotify.constants
+
+_DEFAULT_FILE_COUNT = 2000
+_DEFAULT_INTERVAL_S = 0.0005
+
+
+def _write_files(path, count, interval_s, sent):
+    for i in range(count):
+        filename = 'file{}'.format(i)
+        sent[filename] = time.perf_counter()
+
+        with open(os.path.join(path, filename), 'w'):
+            pass
+
+        time.sleep(interval_s)
+
+
+def _measure(adapter, path, count, interval_s):
+    sent = {}
+    latencies_s = []
+
+    thread = threading.Thread(
+                target=_write_files,
+                args=(path, count, interval_s, sent))
+
+    thread.start()
+
+    try:
+        for event in adapter.event_gen(timeout_s=1, yield_nones=False):
+            received_s = time.perf_counter()
+
+            (header, _, _, filename) = event
+            if header.mask & inotify.constants.IN_CLOSE_WRITE == 0:
+                continue
+
+            latencies_s.append(received_s - sent[filename])
+            if len(latencies_s) == count:
+                break
+    finally:
+        thread.join()
+
+    return latencies_s
+
+
+def run(count=_DEFAULT_FILE_COUNT, interval_s=_DEFAULT_INTERVAL_S):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as path:
+        i = inotify.adapters.Inotify()
+        i.add_watch(path, inotify.constants.IN_CLOSE_WRITE)
+
+        adapters = [('inotify', i, path)]
+
+        tree_path = os.path.join(path, 'tree')
+        os.makedirs(os.path.join(tree_path, 'aa', 'bb'))
+
+        tree = inotify.adapters.InotifyTree(
+                tree_path,
+                mask=inotify.constants.IN_CLOSE_WRITE)
+
+        adapters.append(('tree', tree, os.path.join(tree_path, 'aa', 'bb')))
+
+        for name, adapter, write_path in adapters:
+            latencies_s = _measure(adapter, write_path, count, interval_s)
+            percentiles = _common.get_percentiles(latencies_s)
+
+            for key, value in percentiles.items():
+                results['{}_latency_{}_s'.format(name, key)] = value
+
+    return results
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=_DEFAULT_FILE_COUNT)
+    parser.add_argument('--interval-s', type=float, default=_DEFAULT_INTERVAL_S)
+
+    args = parser.parse_args()
+
+    results = run(count=args.files, interval_s=args.interval_s)
+    _common.print_results('latency', results)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""Measure how quickly watches can be registered, one at a time and in bulk.
+"""
+
+import _common
+
+import argparse
+import os
+import tempfile
+
+import inotify.adapters
+
+_DEFAULT_DIRECTORY_COUNT = 10000
+
+
+def _add_individually(paths):
+    i = inotify.adapters.Inotify()
+    for path in paths:
+        i.add_watch(path)
+
+
+def _add_in_bulk(paths):
+    i = inotify.adapters.Inotify()
+    (_, errors) = i.add_watches(paths)
+
+    assert not errors, errors
+
+
+def run(directories=_DEFAULT_DIRECTORY_COUNT, repeat=3):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as path:
+        paths = []
+        for i in range(directories):
+            directory = os.path.join(path, 'dir{}'.format(i))
+            os.mkdir(directory)
+
+            paths.append(directory)
+
+        (add_watch_s, _) = _common.best_of(
+                            repeat,
+                            lambda: _add_individually(paths))
+
+        (add_watches_s, _) = _common.best_of(
+                                repeat,
+                                lambda: _add_in_bulk(paths))
+
+    results['add_watch_per_s'] = directories / add_watch_s
+    results['add_watches_per_s'] = directories / add_watches_s
+
+    return results
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--directories', type=int, default=_DEFAULT_DIRECTORY_COUNT)
+    parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+
+    results = run(directories=args.directories, repeat=args.repeat)
+    _common.print_results('watches', results)
+
+
+if __name__ == '__main__':
+    _main()
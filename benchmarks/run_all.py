@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""Run all of the benchmarks and write the results as JSON. If a baseline
+(a previous output) is given, print how each result compares to it.
+"""
+
+import _common
+
+import argparse
+import json
+
+import bench_crawl
+import bench_decode
+import bench_fanotify
+import bench_import
+import bench_latency
+import bench_watches
+
+_BENCHMARKS = [
+    ('decode', bench_decode.run),
+    ('crawl', bench_crawl.run),
+    ('watches', bench_watches.run),
+    ('latency', bench_latency.run),
+    ('import', bench_import.run),
+    ('fanotify', bench_fanotify.run),
+]
+
+
+def _compare(results, baseline):
+    baseline_results = baseline['results']
+
+    for name, benchmark_results in sorted(results.items()):
+        for key, value in sorted(benchmark_results.items()):
+            previous = baseline_results.get(name, {}).get(key)
+            if not previous:
+                continue
+
+            print("{:<10} {:<40} {:>8.2f}x".format(name, key, value / previous))
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument(
+        '--output',
+        default='benchmark_results.json',
+        help="Where to write the results")
+
+    parser.add_argument(
+        '--baseline',
+        help="Previous results to compare against")
+
+    parser.add_argument(
+        '--only',
+        nargs='+',
+        choices=[name for name, _ in _BENCHMARKS])
+
+    args = parser.parse_args()
+
+    results = {}
+    for name, run in _BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+
+        results[name] = run()
+        _common.print_results(name, results[name])
+
+    _common.write_results(args.output, results)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        print('')
+        print("Compared to [{}] (rates are better when higher and durations "
+              "are better when lower):".format(args.baseline))
+        print('')
+
+        _compare(results, baseline)
+
+
+if __name__ == '__main__':
+    _main()
@@ -3,40 +3,131 @@ import select
 import os
 import struct
 import collections
+import itertools
 import time
 
 from errno import EINTR, ENOENT
 
 import inotify.constants
+import inotify.budget
 import inotify.calls
+import inotify.crawl
+import inotify.events
+import inotify.filters
+import inotify.metrics
+import inotify.mounts
+import inotify.polling
+import inotify.snapshot
+import inotify.watches
 
 # Constants.
 
 _DEFAULT_EPOLL_BLOCK_DURATION_S = 1
+_DEFAULT_READ_BUFFER_SIZE = 64 * 1024
+
+# The read-buffer grows (as needed) up to this so that a whole burst can be
+# read at once.
+_DEFAULT_MAXIMUM_READ_BUFFER_SIZE = 1024 * 1024
 _HEADER_STRUCT_FORMAT = 'iIII'
 
+# The longest filename that the kernel will report (NAME_MAX).
+_MAXIMUM_FILENAME_LENGTH = 255
+
+# Don't block on reads (we use epoll to wait) and don't leak the handle into
+# child processes.
+_DEFAULT_INIT_FLAGS = inotify.constants.IN_NONBLOCK | inotify.constants.IN_CLOEXEC
+
+# The overflow used to be dropped while decoding (its watch-descriptor is -1),
+# so this only started to apply to it once overflows were passed through. The
+# trees never raise it when they're recovering from overflows.
 _DEFAULT_TERMINAL_EVENTS = (
     'IN_Q_OVERFLOW',
     'IN_UNMOUNT',
 )
 
+# Polled watches are numbered from here so that they can't collide with the
+# kernel's (which are allocated upward from one).
+_POLLED_FIRST_WD = 1 << 30
+
+# What the trees watch with: the kernel ('inotify'), scanning ('polling'), or
+# the kernel except on the mounts that it's blind to ('auto').
+_BACKENDS = (
+    'auto',
+    'inotify',
+    'polling',
+)
+
+_DEFAULT_TREE_BACKEND = 'auto'
+
+# No matter what mask a tree is given, it needs these to curate its watches.
+_MINIMUM_TREE_MASK = \
+    inotify.constants.IN_ISDIR | \
+    inotify.constants.IN_CREATE | \
+    inotify.constants.IN_DELETE
+
+# How long a tree waits for the moved-to of a directory that was moved-from
+# before deciding that it left the tree, and how many it waits for at once.
+_PENDING_MOVE_WINDOW_S = 0.5
+_MAXIMUM_PENDING_MOVES = 4096
+
 # Globals.
 
 _LOGGER = logging.getLogger(__name__)
 
-_INOTIFY_EVENT = collections.namedtuple(
-                    '_INOTIFY_EVENT',
+_INOTIFY_EVENT = inotify.events._INOTIFY_EVENT
+
+_HEADER_STRUCT = struct.Struct(_HEADER_STRUCT_FORMAT)
+_STRUCT_HEADER_LENGTH = _HEADER_STRUCT.size
+
+# What is passed to the trace callback for each event that is decoded.
+# `decode_s` is the time spent decoding (shared by any events that were
+# dropped along the way), `queue_depth_bytes` is what's still buffered after
+# this event, and `is_dropped` indicates that it wasn't for a watch that we know
+# about.
+_TRACE_RECORD = collections.namedtuple(
+                    '_TRACE_RECORD',
                     [
-                        'wd',
-                        'mask',
-                        'cookie',
-                        'len',
+                        'header',
+                        'decode_s',
+                        'queue_depth_bytes',
+                        'is_dropped',
                     ])
 
-_STRUCT_HEADER_LENGTH = struct.calcsize(_HEADER_STRUCT_FORMAT)
+# The kernel fails a read with EINVAL if the buffer can't hold the next event,
+# so we always need room for at least one maximally-sized event.
+_MINIMUM_READ_LENGTH = _STRUCT_HEADER_LENGTH + _MAXIMUM_FILENAME_LENGTH + 1
 _IS_DEBUG = bool(int(os.environ.get('DEBUG', '0')))
 
 
+def _log_trace_record(record):
+    _LOGGER.debug("Trace: %s", record)
+
+
+def _get_mask_for_names(names):
+    mask = 0
+    for bit, name in inotify.constants.MASK_LOOKUP.items():
+        if name in names:
+            mask |= bit
+
+    return mask
+
+
+def _get_is_polled_cb(backend, paths):
+    """Return the function that decides which directories are polled, or
+    `None` if they're all watched by the kernel.
+    """
+
+    if backend not in _BACKENDS:
+        raise ValueError("Backend not valid: [{}]".format(backend))
+
+    if backend == 'inotify':
+        return None
+    elif backend == 'polling':
+        return lambda path: True
+
+    return inotify.mounts.get_is_blind_cb(paths)
+
+
 class EventTimeoutException(Exception):
     pass
 
@@ -48,25 +139,69 @@ class TerminalEventException(Exception):
 
 
 class Inotify(object):
-    def __init__(self, paths=[], block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S):
+    def __init__(self, paths=[], block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S,
+                 read_buffer_size=_DEFAULT_READ_BUFFER_SIZE,
+                 init_flags=_DEFAULT_INIT_FLAGS, compact_events=False,
+                 trace_cb=None,
+                 maximum_read_buffer_size=_DEFAULT_MAXIMUM_READ_BUFFER_SIZE):
+        # Checked before any handles are created, so that nothing leaks.
+        self.__inotify_fd = None
+
+        # We need to be able to hold a partial event in addition to a whole
+        # read.
+        if read_buffer_size < _MINIMUM_READ_LENGTH * 2:
+            raise ValueError("Read-buffer must be at least ({}) bytes: ({})".format(
+                             _MINIMUM_READ_LENGTH * 2, read_buffer_size))
+
         self.__block_duration = block_duration_s
-        self.__watches = {}
-        self.__watches_r = {}
-        self.__buffer = b''
+        self.__compact_events = compact_events
+
+        # Nothing is logged per-event. If tracing, we swap-in a decoder that
+        # reports a `_TRACE_RECORD` for every event; otherwise it costs nothing.
+        if trace_cb is None and _IS_DEBUG is True:
+            trace_cb = _log_trace_record
+
+        self.__trace_cb = trace_cb
+
+        if trace_cb is None:
+            self.__decode = self.__decode_buffer
+        else:
+            self.__decode = self.__decode_buffer_traced
 
-        self.__inotify_fd = inotify.calls.inotify_init()
+        self.__watches = inotify.watches.WatchIndex()
+        self.__metrics = inotify.metrics.InotifyMetrics()
+
+        self.__is_nonblocking = bool(init_flags & inotify.constants.IN_NONBLOCK)
+
+        self.__inotify_fd = inotify.calls.inotify_init1(init_flags)
         _LOGGER.debug("Inotify handle is (%d).", self.__inotify_fd)
 
         self.__epoll = select.epoll()
         self.__epoll.register(self.__inotify_fd, select.POLLIN)
 
+        # Events are read directly into this buffer and then decoded in-place.
+        # The unconsumed region is always [start, end).
+        self.__buffer = bytearray(read_buffer_size)
+        self.__buffer_view = memoryview(self.__buffer)
+        self.__buffer_start = 0
+        self.__buffer_end = 0
+
+        self.__maximum_read_buffer_size = \
+            max(read_buffer_size, maximum_read_buffer_size)
+
+        # When the last read happened (to measure how long the events took to
+        # be handled).
+        self.__read_s = 0
+
         self.__last_success_return = None
 
         for path in paths:
             self.add_watch(path)
 
     def __get_block_duration(self):
-        """Allow the block-duration to be an integer or a function-call."""
+        """Allow the block-duration to be an integer or a function-call. `None`
+        means to block until there's an event or the caller's timeout expires.
+        """
 
         try:
             return self.__block_duration()
@@ -75,8 +210,22 @@ class Inotify(object):
             return self.__block_duration
 
     def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the inotify handle (which also removes the watches). Nothing
+        else can be done afterwards.
+        """
+
+        if self.__inotify_fd is None:
+            return
+
         _LOGGER.debug("Cleaning-up inotify.")
+
+        self.__epoll.close()
+
         os.close(self.__inotify_fd)
+        self.__inotify_fd = None
 
     def add_watch(self, path_unicode, mask=inotify.constants.IN_ALL_EVENTS):
         _LOGGER.debug("Adding watch: [%s]", path_unicode)
@@ -95,30 +244,87 @@ class Inotify(object):
         wd = inotify.calls.inotify_add_watch(self.__inotify_fd, path_bytes, mask)
         _LOGGER.debug("Added watch (%d): [%s]", wd, path_unicode)
 
-        self.__watches[path_unicode] = wd
-        self.__watches_r[wd] = path_unicode
+        self.__watches.add(path_unicode, wd)
 
         return wd
 
+    def add_watches(self, paths, mask=inotify.constants.IN_ALL_EVENTS):
+        """Add watches for all of the given paths in one call. Returns a
+        dictionary of paths to watch-descriptors and a dictionary of paths to
+        errno-values for the ones that failed. Paths that are already being
+        watched are skipped.
+        """
+
+        paths = [path for path in paths if path not in self.__watches]
+
+        _LOGGER.debug("Adding (%d) watches.", len(paths))
+
+        results = inotify.calls.inotify_add_watches(
+                    self.__inotify_fd,
+                    [path.encode('utf8') for path in paths],
+                    mask)
+
+        watches = {}
+        errors = {}
+        for path, wd in zip(paths, results):
+            if wd < 0:
+                errors[path] = -wd
+                continue
+
+            self.__watches.add(path, wd)
+
+            watches[path] = wd
+
+        return watches, errors
+
+    def get_watch_id(self, path):
+        return self.__watches.get_wd(path)
+
+    def get_watch_path(self, wd):
+        return self.__watches.get_path(wd)
+
+    def move_watch(self, from_path, to_path):
+        """Update our tracking after a watched directory was renamed. The paths
+        of everything beneath it change along with it.
+        """
+
+        wd = self.__watches.get_wd(from_path)
+        if wd is None:
+            return
+
+        _LOGGER.debug("Moving watch (%d): [%s] => [%s]", wd, from_path, to_path)
+
+        self.__watches.move(wd, to_path)
+
+    def remove_watch_tree(self, path, superficial=False):
+        """Remove the watch for the given path and for everything beneath
+        it.
+        """
+
+        wd = self.__watches.get_wd(path)
+        if wd is None:
+            return
+
+        for wd in self.__watches.get_subtree(wd):
+            self.remove_watch_with_id(wd, superficial)
+
     def remove_watch(self, path, superficial=False):
         """Remove our tracking information and call inotify to stop watching
         the given path. When a directory is removed, we'll just have to remove
         our tracking since inotify already cleans-up the watch.
         """
 
-        wd = self.__watches.get(path)
+        wd = self.__watches.get_wd(path)
         if wd is None:
             return
 
         _LOGGER.debug("Removing watch for watch-handle (%d): [%s]",
                       wd, path)
 
-        del self.__watches[path]
-
         self.remove_watch_with_id(wd, superficial)
 
     def remove_watch_with_id(self, wd, superficial=False):
-        del self.__watches_r[wd]
+        self.__watches.remove(wd)
 
         if superficial is False:
             _LOGGER.debug("Removing watch for watch-handle (%d).", wd)
@@ -126,73 +332,311 @@ class Inotify(object):
             inotify.calls.inotify_rm_watch(self.__inotify_fd, wd)
 
     def _get_event_names(self, event_type):
-        names = []
-        for bit, name in inotify.constants.MASK_LOOKUP.items():
-            if event_type & bit:
-                names.append(name)
-                event_type -= bit
+        return inotify.events._get_event_names(event_type)
+
+    def __read_into_buffer(self, fd):
+        """Read as much as is available into the free space at the end of the
+        buffer, compacting any leftover partial event to the front first if
+        there isn't enough room for another read. Returns the number of bytes
+        read.
+
+        If the read fills the buffer, we ask the kernel how much is still
+        queued (FIONREAD), grow the buffer to fit it (up to the maximum), and
+        read the rest. Once the buffer has grown, a burst of the same size is
+        drained in a single read.
+        """
+
+        start = self.__buffer_start
+        end = self.__buffer_end
+
+        if start == end:
+            start = end = 0
+        elif len(self.__buffer) - end < _MINIMUM_READ_LENGTH:
+            leftover = bytes(self.__buffer_view[start:end])
+
+            end = len(leftover)
+            start = 0
+
+            self.__buffer[:end] = leftover
+
+        self.__buffer_start = start
+        self.__buffer_end = end
+
+        try:
+            length = os.readv(fd, [self.__buffer_view[end:]])
+        except BlockingIOError:
+            # Only possible if we were opened with IN_NONBLOCK.
+            return 0
+
+        self.__buffer_end += length
+        self.__metrics.record_read(length)
+
+        if self.__buffer_end == len(self.__buffer) and \
+           len(self.__buffer) < self.__maximum_read_buffer_size:
+            queued_bytes = inotify.calls.inotify_get_queued_bytes(fd)
+            if queued_bytes > 0:
+                self.__grow_buffer(queued_bytes)
+
+                more_length = os.readv(fd, [self.__buffer_view[self.__buffer_end:]])
 
-                if event_type == 0:
+                self.__buffer_end += more_length
+                self.__metrics.record_read(more_length)
+
+                length += more_length
+
+        self.__read_s = time.perf_counter()
+
+        return length
+
+    def __grow_buffer(self, queued_bytes):
+        """Replace the buffer with a larger one that has room for the given
+        number of bytes in addition to what's buffered (if we can).
+        """
+
+        buffered = bytes(self.__buffer_view[self.__buffer_start:self.__buffer_end])
+
+        size = len(self.__buffer)
+        while size < len(buffered) + queued_bytes and \
+              size < self.__maximum_read_buffer_size:
+            size *= 2
+
+        size = min(size, self.__maximum_read_buffer_size)
+
+        _LOGGER.debug("Growing read-buffer: (%d) => (%d)", len(self.__buffer), size)
+
+        self.__buffer = bytearray(size)
+        self.__buffer_view = memoryview(self.__buffer)
+
+        self.__buffer[:len(buffered)] = buffered
+        self.__buffer_start = 0
+        self.__buffer_end = len(buffered)
+
+    def __decode_buffer(self):
+        """Yield the whole events that are currently in the buffer. We walk
+        the buffer by offset and only advance the start of the unconsumed
+        region, so nothing is copied other than the filenames.
+
+        The metrics for the batch are recorded once we're done with it. Timing
+        each event is relatively expensive, so the time spent decoding
+        (excluding the time that the caller spends with each event) is only
+        measured for a sample of the batches.
+        """
+
+        buffer_ = self.__buffer
+        buffer_view = self.__buffer_view
+        unpack_from = _HEADER_STRUCT.unpack_from
+        compact_events = self.__compact_events
+        get_event_names = inotify.events.get_event_names
+        get_path = self.__watches.get_path
+        perf_counter = time.perf_counter
+
+        offset = self.__buffer_start
+        end = self.__buffer_end
+
+        metrics = self.__metrics
+        is_timed = metrics.is_batch_sampled()
+
+        yielded = 0
+        dropped = 0
+        overflows = 0
+        decode_s = 0
+        resumed_s = perf_counter()
+
+        try:
+            while end - offset >= _STRUCT_HEADER_LENGTH:
+                header_raw = unpack_from(buffer_, offset)
+
+                filename_offset = offset + _STRUCT_HEADER_LENGTH
+                event_end = filename_offset + header_raw[3]
+                if event_end > end:
                     break
 
-        assert event_type == 0, \
-               "We could not resolve all event-types: (%d)" % (event_type,)
+                # Mark the event as consumed before we yield in case the
+                # caller abandons us.
+                offset = event_end
+                self.__buffer_start = offset
+
+                path = get_path(header_raw[0])
+
+                # Queue-overflows aren't associated with a watch.
+                if path is None:
+                    if header_raw[0] != -1:
+                        dropped += 1
+                        continue
+
+                    overflows += 1
+
+                if compact_events is True:
+                    # Our filename is 16-byte aligned and right-padded with
+                    # NULs.
+                    if filename_offset == event_end:
+                        filename_bytes = b''
+                    else:
+                        filename_end = buffer_.find(0, filename_offset, event_end)
+                        if filename_end == -1:
+                            filename_end = event_end
+
+                        filename_bytes = bytes(buffer_view[filename_offset:filename_end])
+
+                    event = inotify.events.InotifyEvent(
+                                header_raw[0],
+                                header_raw[1],
+                                header_raw[2],
+                                header_raw[3],
+                                path,
+                                filename_bytes)
+                else:
+                    header = _INOTIFY_EVENT._make(header_raw)
+                    type_names = list(get_event_names(header.mask))
+
+                    # Our filename is 16-byte aligned and right-padded with
+                    # NULs.
+                    filename_bytes = buffer_[filename_offset:event_end].rstrip(b'\0')
+
+                    filename_unicode = filename_bytes.decode('utf8')
+                    event = (header, type_names, path, filename_unicode)
+
+                yielded += 1
+
+                if is_timed is True:
+                    decode_s += perf_counter() - resumed_s
+                    yield event
+                    resumed_s = perf_counter()
+                else:
+                    yield event
+
+            decode_s += perf_counter() - resumed_s
+
+            if self.__buffer_start == self.__buffer_end:
+                self.__buffer_start = 0
+                self.__buffer_end = 0
+        finally:
+            if yielded > 0 or dropped > 0:
+                if is_timed is False:
+                    decode_s = None
+
+                metrics.record_batch(
+                    yielded,
+                    dropped,
+                    overflows,
+                    decode_s,
+                    perf_counter() - self.__read_s)
+
+    def __decode_buffer_traced(self):
+        """Wrap the decoder and report a trace-record for each event that it
+        consumes, including any that it drops.
+        """
 
-        return names
+        trace_cb = self.__trace_cb
+        unpack_from = _HEADER_STRUCT.unpack_from
+        perf_counter = time.perf_counter
 
-    def _handle_inotify_event(self, wd):
-        """Handle a series of events coming-in from inotify."""
+        decoded = self.__decode_buffer()
+        while True:
+            offset = self.__buffer_start
+            end = self.__buffer_end
 
-        b = os.read(wd, 1024)
-        if not b:
-            return
+            start_s = perf_counter()
+            event = next(decoded, None)
+            decode_s = perf_counter() - start_s
+
+            # The decoder resets the buffer once it's been fully consumed.
+            consumed_to = self.__buffer_start
+            if self.__buffer_end == 0:
+                consumed_to = end
+
+            while offset < consumed_to:
+                header_raw = unpack_from(self.__buffer, offset)
+                offset += _STRUCT_HEADER_LENGTH + header_raw[3]
 
-        self.__buffer += b
+                record = _TRACE_RECORD(
+                            header=_INOTIFY_EVENT._make(header_raw),
+                            decode_s=decode_s,
+                            queue_depth_bytes=end - offset,
+                            is_dropped=event is None or offset < consumed_to)
 
-        while 1:
-            length = len(self.__buffer)
+                trace_cb(record)
 
-            if length < _STRUCT_HEADER_LENGTH:
-                _LOGGER.debug("Not enough bytes for a header.")
+            if event is None:
                 return
 
-            # We have, at least, a whole-header in the buffer.
+            yield event
 
-            peek_slice = self.__buffer[:_STRUCT_HEADER_LENGTH]
+    def __is_event_buffered(self):
+        """Return whether there's at least one whole event in the buffer that
+        hasn't been decoded yet (e.g. because a generator was abandoned).
+        """
 
-            header_raw = struct.unpack(
-                            _HEADER_STRUCT_FORMAT,
-                            peek_slice)
+        start = self.__buffer_start
+        end = self.__buffer_end
 
-            header = _INOTIFY_EVENT(*header_raw)
-            type_names = self._get_event_names(header.mask)
-            _LOGGER.debug("Events received in stream: {}".format(type_names))
+        if end - start < _STRUCT_HEADER_LENGTH:
+            return False
 
-            event_length = (_STRUCT_HEADER_LENGTH + header.len)
-            if length < event_length:
-                return
+        header_raw = _HEADER_STRUCT.unpack_from(self.__buffer, start)
+        return start + _STRUCT_HEADER_LENGTH + header_raw[3] <= end
 
-            filename = self.__buffer[_STRUCT_HEADER_LENGTH:event_length]
+    def _handle_inotify_event(self, wd):
+        """Handle a series of events coming-in from inotify."""
+
+        if self.__read_into_buffer(wd) == 0:
+            return
+
+        yield from self.__decode()
 
-            # Our filename is 16-byte aligned and right-padded with NULs.
-            filename_bytes = filename.rstrip(b'\0')
+    def __collect_events(self, events, max_events):
+        """Append whatever whole events are buffered to the given list without
+        going over `max_events`.
+        """
 
-            self.__buffer = self.__buffer[event_length:]
+        decoded = self.__decode()
+        if max_events is not None:
+            decoded = itertools.islice(decoded, max_events - len(events))
 
-            path = self.__watches_r.get(header.wd)
-            if path is not None:
-                filename_unicode = filename_bytes.decode('utf8')
-                yield (header, type_names, path, filename_unicode)
+        events.extend(decoded)
 
-            buffer_length = len(self.__buffer)
-            if buffer_length < _STRUCT_HEADER_LENGTH:
+    def read_events(self, max_events=None, timeout_s=0):
+        """Return everything that the kernel currently has queued as a list,
+        waiting up to `timeout_s` seconds for something to arrive if nothing
+        is queued yet (`None` waits indefinitely). If `max_events` is given,
+        anything beyond that remains buffered for the next call.
+
+        Unlike `event_gen()`, no filtering is done and no terminal events are
+        raised; the events are returned exactly as they are decoded.
+        """
+
+        events = []
+        self.__collect_events(events, max_events)
+
+        # Once we have something to return, only keep going for as long as
+        # there is more data immediately available.
+        if events:
+            timeout_s = 0
+
+        while max_events is None or len(events) < max_events:
+            # If we're nonblocking, we can just try the read when we're not
+            # meant to wait.
+            if (timeout_s != 0 or self.__is_nonblocking is False) and \
+               not self.__epoll.poll(timeout_s):
+                break
+
+            if self.__read_into_buffer(self.__inotify_fd) == 0:
                 break
 
+            self.__collect_events(events, max_events)
+            timeout_s = 0
+
+        return events
+
     def event_gen(
             self, timeout_s=None, yield_nones=True, filter_predicate=None,
             terminal_events=_DEFAULT_TERMINAL_EVENTS):
         """Yield one event after another. If `timeout_s` is provided, we'll
         break when no event is received for that many seconds.
+
+        If the block-duration is `None`, we only wake-up when there's an event
+        or when `timeout_s` expires, and a `None` is only yielded after each
+        batch of events.
         """
 
         # We will either return due to the optional filter or because of a
@@ -200,38 +644,73 @@ class Inotify(object):
         # this.
         self.__last_success_return = None
 
+        compact_events = self.__compact_events
+        terminal_mask = _get_mask_for_names(terminal_events)
+
         last_hit_s = time.time()
         while True:
-            block_duration_s = self.__get_block_duration()
-
-            # Poll, but manage signal-related errors.
+            # Whole events that were left in the buffer (by a generator that
+            # was abandoned) are yielded before we wait for more.
+            if self.__is_event_buffered() is True:
+                decoded_list = [self.__decode()]
+            else:
+                block_duration_s = self.__get_block_duration()
+
+                is_exact = block_duration_s is None
+                if is_exact is True and timeout_s is not None:
+                    block_duration_s = \
+                        max(0, last_hit_s + timeout_s - time.time())
+
+                # Poll, but manage signal-related errors.
+
+                try:
+                    events = self.__epoll.poll(block_duration_s)
+                except IOError as e:
+                    if e.errno != EINTR:
+                        raise
+
+                    if timeout_s is not None:
+                        time_since_event_s = time.time() - last_hit_s
+                        if time_since_event_s > timeout_s:
+                            break
 
-            try:
-                events = self.__epoll.poll(block_duration_s)
-            except IOError as e:
-                if e.errno != EINTR:
-                    raise
+                    continue
 
-                if timeout_s is not None:
-                    time_since_event_s = time.time() - last_hit_s
-                    if time_since_event_s > timeout_s:
-                        break
+                # When blocking until the deadline, we'll only come back
+                # empty-handed if the deadline has passed.
+                if not events and is_exact is True and timeout_s is not None:
+                    break
 
-                continue
+                # (fd) looks to always match the inotify FD.
+                decoded_list = [
+                    self._handle_inotify_event(fd)
+                    for fd, event_type
+                    in events
+                ]
 
             # Process events.
 
-            for fd, event_type in events:
-                # (fd) looks to always match the inotify FD.
+            for decoded in decoded_list:
+                for e in decoded:
+                    last_hit_s = time.time()
 
-                names = self._get_event_names(event_type)
-                _LOGGER.debug("Events received from epoll: {}".format(names))
+                    if compact_events is True:
+                        mask = e.mask
+                    else:
+                        mask = e[0].mask
 
-                for (header, type_names, path, filename) \
-                        in self._handle_inotify_event(fd):
-                    last_hit_s = time.time()
+                    # Only look at the individual types if there's a reason
+                    # to.
+                    if filter_predicate is None and \
+                       (mask & terminal_mask) == 0:
+                        yield e
+                        continue
+
+                    if compact_events is True:
+                        type_names = e.type_names
+                    else:
+                        type_names = e[1]
 
-                    e = (header, type_names, path, filename)
                     for type_name in type_names:
                         if filter_predicate is not None and \
                            filter_predicate(type_name, e) is False:
@@ -254,19 +733,332 @@ class Inotify(object):
     def last_success_return(self):
         return self.__last_success_return
 
+    @property
+    def fd(self):
+        return self.__inotify_fd
+
+    @property
+    def compact_events(self):
+        return self.__compact_events
+
+    @property
+    def watch_count(self):
+        return len(self.__watches)
+
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    def stats(self):
+        """Return an `inotify.metrics.InotifyStats` with the counters and
+        histograms so far, the number of watches, the size of the read-buffer,
+        and how much is waiting to be read.
+        """
+
+        return self.__metrics.get_stats(
+                self.__inotify_fd,
+                len(self.__watches),
+                len(self.__buffer))
+
+
+class HybridInotify(object):
+    """Watch directories with the kernel except for the ones that
+    `is_polled_cb` says to poll (with an `inotify.polling.PollingInotify`).
+    This can be used in place of an `Inotify`, and the events from both are
+    interleaved.
+
+    The polled directories are scanned whenever we wake-up from waiting on the
+    kernel, so the block-duration is capped at the poll-interval. The polled
+    watch-descriptors start at `_POLLED_FIRST_WD`.
+    """
+
+    def __init__(self, is_polled_cb,
+                 block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S,
+                 init_flags=_DEFAULT_INIT_FLAGS, compact_events=False,
+                 trace_cb=None,
+                 poll_interval_s=inotify.polling._DEFAULT_POLL_INTERVAL_S,
+                 directories_per_poll=None):
+        self.__is_polled_cb = is_polled_cb
+        self.__poll_interval_s = poll_interval_s
+
+        if block_duration_s is None:
+            block_duration_s = poll_interval_s
+        elif callable(block_duration_s) is False:
+            block_duration_s = min(block_duration_s, poll_interval_s)
+
+        self.__inotify = Inotify(
+                            block_duration_s=block_duration_s,
+                            init_flags=init_flags,
+                            compact_events=compact_events,
+                            trace_cb=trace_cb)
+
+        self.__polling = inotify.polling.PollingInotify(
+                            poll_interval_s=poll_interval_s,
+                            directories_per_poll=directories_per_poll,
+                            compact_events=compact_events,
+                            first_wd=_POLLED_FIRST_WD)
+
+        self.__last_success_return = None
+
+    def __get_backend(self, wd):
+        if wd >= _POLLED_FIRST_WD:
+            return self.__polling
+
+        return self.__inotify
+
+    def add_watch(self, path_unicode, mask=inotify.constants.IN_ALL_EVENTS):
+        if self.__is_polled_cb(path_unicode) is True:
+            return self.__polling.add_watch(path_unicode, mask)
+
+        return self.__inotify.add_watch(path_unicode, mask)
+
+    def add_watches(self, paths, mask=inotify.constants.IN_ALL_EVENTS):
+        """See `Inotify.add_watches()`."""
+
+        watched_paths = []
+        polled_paths = []
+        for path in paths:
+            if self.__is_polled_cb(path) is True:
+                polled_paths.append(path)
+            else:
+                watched_paths.append(path)
+
+        watches, errors = self.__inotify.add_watches(watched_paths, mask)
+
+        polled_watches, polled_errors = \
+            self.__polling.add_watches(polled_paths, mask)
+
+        watches.update(polled_watches)
+        errors.update(polled_errors)
+
+        return watches, errors
+
+    def get_watch_id(self, path):
+        wd = self.__inotify.get_watch_id(path)
+        if wd is None:
+            wd = self.__polling.get_watch_id(path)
+
+        return wd
+
+    def get_watch_path(self, wd):
+        return self.__get_backend(wd).get_watch_path(wd)
+
+    def move_watch(self, from_path, to_path):
+        self.__inotify.move_watch(from_path, to_path)
+        self.__polling.move_watch(from_path, to_path)
+
+    def remove_watch_tree(self, path, superficial=False):
+        # Either can have watches beneath the other's.
+        self.__inotify.remove_watch_tree(path, superficial)
+        self.__polling.remove_watch_tree(path, superficial)
+
+    def remove_watch(self, path, superficial=False):
+        wd = self.get_watch_id(path)
+        if wd is None:
+            return
+
+        self.remove_watch_with_id(wd, superficial)
+
+    def remove_watch_with_id(self, wd, superficial=False):
+        self.__get_backend(wd).remove_watch_with_id(wd, superficial)
+
+    def read_events(self, max_events=None, timeout_s=0):
+        """See `Inotify.read_events()`. While waiting, the polled directories
+        are scanned on schedule.
+        """
+
+        if timeout_s is None:
+            deadline_s = None
+        else:
+            deadline_s = time.monotonic() + timeout_s
+
+        while True:
+            events = self.__polling.read_events(max_events)
+
+            if max_events is None:
+                remaining = None
+            else:
+                remaining = max_events - len(events)
+
+            if remaining != 0:
+                if events:
+                    wait_s = 0
+                else:
+                    wait_s = self.__poll_interval_s
+
+                if deadline_s is not None:
+                    wait_s = min(wait_s, max(0, deadline_s - time.monotonic()))
+
+                events += self.__inotify.read_events(remaining, wait_s)
+
+            if events or \
+               (deadline_s is not None and time.monotonic() >= deadline_s):
+                return events
+
+    def event_gen(
+            self, timeout_s=None, yield_nones=True, filter_predicate=None,
+            terminal_events=_DEFAULT_TERMINAL_EVENTS):
+        """See `Inotify.event_gen()`. The events for the polled directories
+        are yielded after each scan.
+        """
+
+        self.__last_success_return = None
+
+        compact_events = self.__inotify.compact_events
+
+        last_hit_s = time.time()
+        for event in self.__inotify.event_gen(
+                        yield_nones=True,
+                        filter_predicate=filter_predicate,
+                        terminal_events=terminal_events):
+            if event is not None:
+                last_hit_s = time.time()
+                yield event
+
+                continue
+
+            for event in self.__polling.poll_events():
+                last_hit_s = time.time()
+
+                if filter_predicate is not None:
+                    if compact_events is True:
+                        type_names = event.type_names
+                    else:
+                        type_names = event[1]
+
+                    for type_name in type_names:
+                        if filter_predicate(type_name, event) is False:
+                            self.__last_success_return = (type_name, event)
+                            return
+
+                yield event
+
+            if timeout_s is not None:
+                time_since_event_s = time.time() - last_hit_s
+                if time_since_event_s > timeout_s:
+                    break
+
+            if yield_nones is True:
+                yield None
+
+        if self.__inotify.last_success_return is not None:
+            self.__last_success_return = self.__inotify.last_success_return
+
+    @property
+    def last_success_return(self):
+        return self.__last_success_return
+
+    @property
+    def fd(self):
+        """The kernel's handle. Note that the polled directories never make
+        it readable.
+        """
+
+        return self.__inotify.fd
+
+    @property
+    def compact_events(self):
+        return self.__inotify.compact_events
+
+    @property
+    def watch_count(self):
+        return self.__inotify.watch_count + self.__polling.watch_count
+
+    @property
+    def inotify(self):
+        return self.__inotify
+
+    @property
+    def polling(self):
+        return self.__polling
+
+    @property
+    def metrics(self):
+        return self.__inotify.metrics
+
+    def stats(self):
+        """The kernel's statistics, but with every watch counted. The ones for
+        the polled directories are available from `polling.stats()`.
+        """
+
+        return self.__inotify.stats()._replace(watches=self.watch_count)
+
 
 class _BaseTree(object):
     def __init__(self, mask=inotify.constants.IN_ALL_EVENTS,
-                 block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S):
+                 block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S,
+                 init_flags=_DEFAULT_INIT_FLAGS, crawl_workers=None,
+                 compact_events=False, trace_cb=None,
+                 overflow_recovery=False, filter_spec=None,
+                 snapshot_filepath=None, maximum_watches=None,
+                 poll_interval_s=inotify.budget._DEFAULT_POLL_INTERVAL_S,
+                 is_polled_cb=None,
+                 backend_poll_interval_s=inotify.polling._DEFAULT_POLL_INTERVAL_S):
+
+        self._filter_spec = filter_spec
+
+        if filter_spec is not None and filter_spec.mask is not None:
+            mask = filter_spec.mask
 
         # No matter what we actually received as the mask, make sure we have
         # the minimum that we require to curate our list of watches.
-        self._mask = mask | \
-                        inotify.constants.IN_ISDIR | \
-                        inotify.constants.IN_CREATE | \
-                        inotify.constants.IN_DELETE
-
-        self._i = Inotify(block_duration_s=block_duration_s)
+        self._mask = mask | _MINIMUM_TREE_MASK
+
+        self._crawl_workers = crawl_workers
+        self._time_to_ready_s = None
+
+        # The cookies of the directories that were moved-from, in arrival
+        # order, to their (deadline, path). The moved-to has the same cookie
+        # if the directory is still within something that we watch, but it
+        # might not be the next event or even in the same read.
+        self._pending_moves = collections.OrderedDict()
+
+        # If we have to stay within a number of watches, the directories that
+        # don't fit are polled.
+        if maximum_watches is not None:
+            self._budget = inotify.budget.WatchBudget(
+                            maximum_watches,
+                            poll_interval_s=poll_interval_s)
+        else:
+            self._budget = None
+
+        # If recovering from overflows, persisting what we know between runs,
+        # or polling, we keep track of the directories and their children so
+        # that we can tell what we missed.
+        self._overflow_recovery = overflow_recovery
+        self._snapshot_filepath = snapshot_filepath
+
+        if overflow_recovery is True or snapshot_filepath is not None or \
+           self._budget is not None:
+            self._snapshot = inotify.snapshot.TreeSnapshot()
+        else:
+            self._snapshot = None
+
+        # If there was a saved snapshot, what it has in common with our trees
+        # (loaded by `_load_trees_from_snapshot()`).
+        self._saved_snapshot = None
+
+        # Synthetic events for what changed while we weren't running. These
+        # are yielded before anything else.
+        self._catch_up_events = collections.deque()
+
+        if snapshot_filepath is not None:
+            self._saved_snapshot = inotify.snapshot.TreeSnapshot.load(
+                                    snapshot_filepath)
+
+        if is_polled_cb is None:
+            self._i = Inotify(block_duration_s=block_duration_s,
+                              init_flags=init_flags,
+                              compact_events=compact_events,
+                              trace_cb=trace_cb)
+        else:
+            self._i = HybridInotify(
+                        is_polled_cb,
+                        block_duration_s=block_duration_s,
+                        init_flags=init_flags,
+                        compact_events=compact_events,
+                        trace_cb=trace_cb,
+                        poll_interval_s=backend_poll_interval_s)
 
     def event_gen(self, ignore_missing_new_folders=False, **kwargs):
         """This is a secondary generator that wraps the principal one, and
@@ -275,116 +1067,658 @@ class _BaseTree(object):
         If we're doing anything funky and allowing the events to queue while a
         rename occurs then the folder may no longer exist. In this case, set
         `ignore_missing_new_folders`.
+
+        If we're recovering from overflows, an IN_Q_OVERFLOW is replaced with
+        synthetic create/delete events for whatever changed in the meantime.
+
+        If we started from a saved snapshot, the events for whatever changed
+        while we weren't running are yielded first.
+
+        If we have a watch-budget, the directories that aren't being watched
+        are polled (between events) and synthetic create/delete events are
+        yielded for them.
         """
 
-        for event in self._i.event_gen(**kwargs):
-            if event is not None:
-                (header, type_names, path, filename) = event
+        while self._catch_up_events:
+            yield self._catch_up_events.popleft()
+
+        if self._overflow_recovery is True:
+            terminal_events = kwargs.get('terminal_events', _DEFAULT_TERMINAL_EVENTS)
+
+            kwargs['terminal_events'] = tuple(
+                type_name
+                for type_name
+                in terminal_events
+                if type_name != 'IN_Q_OVERFLOW')
+
+        # We need to see the quiet periods in order to know that a directory
+        # was moved out of the tree.
+        yield_nones = kwargs.pop('yield_nones', True)
+
+        for event in self._i.event_gen(yield_nones=True, **kwargs):
+            if event is None:
+                self._finish_pending_move()
+
+                # A `None` comes after every batch of events, too.
+                if self._budget is not None and self._budget.is_poll_due() is True:
+                    yield from self._poll()
+
+                if yield_nones is True:
+                    yield None
+            else:
+                if self._overflow_recovery is True and \
+                   self._get_mask(event) & inotify.constants.IN_Q_OVERFLOW:
+                    _LOGGER.warning("Events were lost. Resynchronizing tree.")
+
+                    yield from self._resync()
+                    continue
+
+                self._handle_event(event, ignore_missing_new_folders)
+
+                if self._filter_spec is not None and \
+                   self._filter_spec.has_event_filter is True and \
+                   self.__is_event_included(event) is False:
+                    self._i.metrics.record_filtered()
+                    continue
+
+                yield event
+
+        self._finish_pending_move()
+
+        if self._budget is not None and self._budget.is_poll_due() is True:
+            yield from self._poll()
+
+    def __is_event_included(self, event):
+        if self._i.compact_events is True:
+            return self._filter_spec.is_event_included(
+                    event.mask, event.path, event.filename)
+
+        (header, _, path, filename) = event
+        return self._filter_spec.is_event_included(header.mask, path, filename)
+
+    def _is_excluded(self, path):
+        return self._filter_spec is not None and \
+               self._filter_spec.is_excluded(path) is True
+
+    def _get_wd(self, event):
+        if self._i.compact_events is True:
+            return event.wd
+        else:
+            return event[0].wd
+
+    def _get_mask(self, event):
+        if self._i.compact_events is True:
+            return event.mask
+        else:
+            return event[0].mask
+
+    def _handle_event(self, event, ignore_missing_new_folders=False):
+        """Add/remove watches as directories are added/removed."""
+
+        mask = self._get_mask(event)
+
+        if self._budget is not None:
+            self._budget.touch(self._get_wd(event))
+
+        if self._snapshot is not None:
+            self._update_snapshot(event, mask)
+
+        self._finish_pending_move()
+
+        if mask & inotify.constants.IN_MOVED_TO and \
+           mask & inotify.constants.IN_ISDIR:
+            pending_move = self._pending_moves.pop(event[0].cookie, None)
+
+            if pending_move is not None:
+                (_, from_path) = pending_move
+                (_, _, path, filename) = event
+                full_path = os.path.join(path, filename)
+
+                _LOGGER.debug("A directory has been renamed. We're "
+                              "relinking its watch: [%s] => [%s]",
+                              from_path, full_path)
+
+                # Everything beneath it is still being watched and will now
+                # be reported under the new path.
+                self._i.move_watch(from_path, full_path)
+
+                if self._snapshot is not None:
+                    self._load_tree(full_path)
+
+                return
+
+        if mask & inotify.constants.IN_ISDIR:
+            (_, _, path, filename) = event
+            full_path = os.path.join(path, filename)
+
+            if (
+                (mask & inotify.constants.IN_MOVED_TO) or
+                (mask & inotify.constants.IN_CREATE)
+               ) and \
+               (
+                os.path.exists(full_path) is True or
+                ignore_missing_new_folders is False
+               ) and \
+               self._is_excluded(full_path) is False:
+                # If something else was moved away from here, we can't wait
+                # for it any longer; its watches would be confused with the
+                # new ones.
+                for cookie, (_, from_path) in list(self._pending_moves.items()):
+                    if from_path == full_path:
+                        self.__give_up_on_move(cookie)
+
+                _LOGGER.debug("A directory has been created. We're "
+                              "adding a watch on it (because we're "
+                              "being recursive): [%s]", full_path)
+
+
+                self._load_tree(full_path)
+
+            if mask & inotify.constants.IN_DELETE:
+                _LOGGER.debug("A directory has been removed. We're "
+                              "being recursive, but it would have "
+                              "automatically been deregistered: [%s]",
+                              full_path)
+
+                # The watch would've already been cleaned-up internally.
+                self._i.remove_watch(full_path, superficial=True)
+            elif mask & inotify.constants.IN_MOVED_FROM:
+                # We'll know whether it's still within the tree if its
+                # moved-to arrives in time.
+                self._pending_moves[event[0].cookie] = (
+                    time.monotonic() + _PENDING_MOVE_WINDOW_S,
+                    full_path)
+
+                if len(self._pending_moves) > _MAXIMUM_PENDING_MOVES:
+                    self._finish_pending_move(is_forced=True)
+            elif mask & inotify.constants.IN_MOVED_TO:
+                _LOGGER.debug("A directory has been renamed. We're "
+                              "adding a watch on it (because we're "
+                              "being recursive): [%s]", full_path)
+
+                self._i.add_watch(full_path, self._mask)
+
+    def _finish_pending_move(self, is_forced=False):
+        """If a directory was moved-from and the moved-to didn't come in time,
+        it was moved out of the tree. Stop watching it and everything beneath
+        it. If `is_forced`, the oldest pending move is given up on regardless
+        of its deadline.
+        """
+
+        now_s = time.monotonic()
+
+        while self._pending_moves:
+            (cookie, (deadline_s, from_path)) = \
+                next(iter(self._pending_moves.items()))
+
+            if is_forced is False and deadline_s > now_s:
+                break
+
+            self.__give_up_on_move(cookie)
+            is_forced = False
+
+    def __give_up_on_move(self, cookie):
+        (_, from_path) = self._pending_moves.pop(cookie)
+
+        _LOGGER.debug("A directory has been moved out of the tree. We're "
+                      "removing its watches: [%s]", from_path)
+
+        try:
+            self._i.remove_watch_tree(from_path)
+        except inotify.calls.InotifyError:
+            # It may have also been deleted by now.
+            pass
+
+    def _update_snapshot(self, event, mask):
+        """Keep the children of the directories in our snapshot current."""
+
+        (_, _, path, filename) = event
+        if not filename:
+            return
+
+        if mask & (inotify.constants.IN_CREATE | inotify.constants.IN_MOVED_TO):
+            is_dir = (mask & inotify.constants.IN_ISDIR) != 0
+            self._snapshot.add_child(path, filename, is_dir)
+        elif mask & (inotify.constants.IN_DELETE | inotify.constants.IN_MOVED_FROM):
+            self._snapshot.remove_child(path, filename)
+
+            if mask & inotify.constants.IN_ISDIR:
+                self._snapshot.remove_subtree(os.path.join(path, filename))
+
+    def _resync(self, paths=None):
+        """Yield synthetic events for whatever was created or deleted since
+        we last knew about it, and update our watches to match. Only the
+        directories whose mtimes have changed are re-listed (or only the given
+        ones).
+        """
+
+        compact_events = self._i.compact_events
+
+        if paths is None:
+            paths = self._snapshot.find_stale()
+
+        for path in paths:
+            # This might have been removed along with a parent.
+            if path not in self._snapshot:
+                continue
+
+            result = self._snapshot.rescan(path)
+
+            # If it's gone, then we'll report it via its parent.
+            if result is None:
+                continue
+
+            (created, deleted) = result
+
+            wd = self._i.get_watch_id(path)
+
+            for filename, is_dir in deleted:
+                mask = inotify.constants.IN_DELETE
+
+                if is_dir is True:
+                    mask |= inotify.constants.IN_ISDIR
 
-                if header.mask & inotify.constants.IN_ISDIR:
                     full_path = os.path.join(path, filename)
+                    for removed_path in self._snapshot.remove_subtree(full_path):
+                        # If it was moved rather than deleted, the kernel is
+                        # still watching it.
+                        try:
+                            self._i.remove_watch(removed_path)
+                        except inotify.calls.InotifyError:
+                            pass
+
+                yield inotify.events.make_event(
+                        compact_events, wd, mask, path, filename)
+
+            for filename, is_dir in created:
+                if is_dir is False:
+                    yield inotify.events.make_event(
+                            compact_events,
+                            wd,
+                            inotify.constants.IN_CREATE,
+                            path,
+                            filename)
 
-                    if (
-                        (header.mask & inotify.constants.IN_MOVED_TO) or
-                        (header.mask & inotify.constants.IN_CREATE)
-                       ) and \
-                       (
-                        os.path.exists(full_path) is True or
-                        ignore_missing_new_folders is False
-                       ):
-                        _LOGGER.debug("A directory has been created. We're "
-                                      "adding a watch on it (because we're "
-                                      "being recursive): [%s]", full_path)
-
-
-                        self._load_tree(full_path)
-
-                    if header.mask & inotify.constants.IN_DELETE:
-                        _LOGGER.debug("A directory has been removed. We're "
-                                      "being recursive, but it would have "
-                                      "automatically been deregistered: [%s]",
-                                      full_path)
-
-                        # The watch would've already been cleaned-up internally.
-                        self._i.remove_watch(full_path, superficial=True)
-                    elif header.mask & inotify.constants.IN_MOVED_FROM:
-                        _LOGGER.debug("A directory has been renamed. We're "
-                                      "being recursive, but it would have "
-                                      "automatically been deregistered: [%s]",
-                                      full_path)
-
-                        self._i.remove_watch(full_path, superficial=True)
-                    elif header.mask & inotify.constants.IN_MOVED_TO:
-                        _LOGGER.debug("A directory has been renamed. We're "
-                                      "adding a watch on it (because we're "
-                                      "being recursive): [%s]", full_path)
-
-                        self._i.add_watch(full_path, self._mask)
+                    continue
 
-            yield event
+                yield inotify.events.make_event(
+                        compact_events,
+                        wd,
+                        inotify.constants.IN_CREATE | inotify.constants.IN_ISDIR,
+                        path,
+                        filename)
+
+                # Watch the new directory and report everything within it.
+
+                full_path = os.path.join(path, filename)
+                if self._is_excluded(full_path) is True:
+                    continue
+
+                self._load_tree(full_path)
+
+                for child_path, state in self._snapshot.iterate_subtree(full_path):
+                    child_wd = self._i.get_watch_id(child_path)
+
+                    for child_filename, child_is_dir in state.children.items():
+                        mask = inotify.constants.IN_CREATE
+                        if child_is_dir is True:
+                            mask |= inotify.constants.IN_ISDIR
+
+                        yield inotify.events.make_event(
+                                compact_events,
+                                child_wd,
+                                mask,
+                                child_path,
+                                child_filename)
+
+    def _load_trees_from_snapshot(self, paths, progress_cb=None):
+        """Watch the given trees using the directories in the saved snapshot
+        rather than crawling them, and then re-list only the ones that have
+        changed since. Trees that aren't in the snapshot are crawled. Returns
+        whether the snapshot was used.
+        """
+
+        if self._saved_snapshot is None:
+            return False
+
+        cached_paths = []
+        for path in paths:
+            tree = list(self._saved_snapshot.iterate_subtree(
+                        path,
+                        exclude_cb=self._is_excluded))
+
+            if not tree:
+                _LOGGER.debug("Tree not in snapshot: [%s]", path)
+                self._load_tree(path, progress_cb=progress_cb)
+                continue
+
+            for tree_path, state in tree:
+                self._snapshot.add(tree_path, state)
+                cached_paths.append(tree_path)
+
+        self._saved_snapshot = None
+
+        if not cached_paths:
+            return True
+
+        _LOGGER.debug("Watching (%d) directories from snapshot: [%s]",
+                      len(cached_paths), self._snapshot_filepath)
+
+        # The watches have to be in place before we look for changes so that
+        # we don't miss any that happen while we look.
+        self._add_watches(cached_paths)
+
+        self._catch_up_events.extend(self._resync())
+
+        _LOGGER.debug("There were (%d) changes since the snapshot was saved.",
+                      len(self._catch_up_events))
+
+        return True
+
+    def save_snapshot(self):
+        """Save the directories that we know about (and their children) so
+        that the next instance can start from them. This reflects the events
+        that have been retrieved so far.
+        """
+
+        if self._snapshot_filepath is None:
+            raise ValueError("The tree was not created with a "
+                             "snapshot_filepath.")
+
+        self._snapshot.save(self._snapshot_filepath)
 
     @property
     def inotify(self):
         return self._i
 
-    def _load_tree(self, path):
+    @property
+    def time_to_ready_s(self):
+        """How long the initial crawl and watch registration took."""
 
-        paths = []
+        return self._time_to_ready_s
 
-        q = [path]
-        while q:
-            current_path = q[0]
-            del q[0]
+    def __get_inherited_mask(self, path):
+        """Return the mask of the nearest watched ancestor that starts a
+        subtree with its own mask, or `None`.
+        """
 
-            try:
-                filenames = os.listdir(current_path)
-            except FileNotFoundError:
-                _LOGGER.warning("Path %s disappeared before we could list it", current_path)
-                continue
-                
-            paths.append(current_path)
+        parent = os.path.dirname(path)
+        while parent != path and self._i.get_watch_id(parent) is not None:
+            mask = self._filter_spec.get_directory_mask(parent)
+            if mask is not None:
+                return mask
 
-            for filename in filenames:
-                entry_filepath = os.path.join(current_path, filename)
-                if os.path.isdir(entry_filepath) is False:
-                    continue
+            path = parent
+            parent = os.path.dirname(path)
+
+        return None
 
-                q.append(entry_filepath)
+    def __group_by_mask(self, paths):
+        """Return the paths (parents before children) grouped by the mask that
+        they should be watched with.
+        """
 
+        if self._filter_spec is None:
+            return {self._mask: paths}
+
+        masks = {}
+        groups = {}
         for path in paths:
+            mask = self._filter_spec.get_directory_mask(path)
+
+            if mask is None:
+                mask = masks.get(os.path.dirname(path))
+
+            if mask is None:
+                mask = self.__get_inherited_mask(path)
+
+            if mask is None:
+                mask = self._mask
+
+            masks[path] = mask
+            groups.setdefault(mask | _MINIMUM_TREE_MASK, []).append(path)
+
+        return groups
+
+    def _load_tree(self, path, progress_cb=None):
+        if self._snapshot is not None:
+            listing_cb = self._snapshot.record
+        else:
+            listing_cb = None
+
+        if self._filter_spec is not None:
+            exclude_cb = self._filter_spec.is_excluded
+        else:
+            exclude_cb = None
+
+        paths = inotify.crawl.crawl(
+                    path,
+                    workers=self._crawl_workers,
+                    progress_cb=progress_cb,
+                    listing_cb=listing_cb,
+                    exclude_cb=exclude_cb)
+
+        self._add_watches(paths)
+
+    def _add_watches(self, paths):
+        """Watch the given directories (parents before children) with the
+        appropriate masks. Directories that have disappeared are skipped.
+        """
+
+        if self._budget is not None:
+            paths = self.__fit_to_budget(paths)
+
+        errors = {}
+        for mask, mask_paths in self.__group_by_mask(paths).items():
+            mask_watches, mask_errors = self._i.add_watches(mask_paths, mask)
+            errors.update(mask_errors)
+
+            if self._budget is not None:
+                for path, wd in mask_watches.items():
+                    self._budget.touch(wd)
+                    self._budget.remove_polled(path)
+
+        for path in paths:
+            errno_ = errors.get(path)
+            if errno_ is None:
+                continue
+            elif errno_ == ENOENT:
+                _LOGGER.warning("Path %s disappeared before we could watch it", path)
+                continue
+
+            raise inotify.calls.InotifyError(
+                    "Could not add watch: [{}]".format(path),
+                    errno=errno_)
+
+    def __fit_to_budget(self, paths):
+        """Evict the least-recently-active watches to make room for the given
+        paths (which are the most recently active). Return the ones that there
+        is room for; the rest are polled.
+        """
+
+        paths = [path for path in paths if self._i.get_watch_id(path) is None]
+
+        excess = self._i.watch_count + len(paths) - self._budget.maximum_watches
+        while excess > 0:
+            wd = self._budget.pop_coldest()
+            if wd is None:
+                break
+
+            path = self._i.get_watch_path(wd)
+            if path is None:
+                # It was removed some other way.
+                continue
+
+            _LOGGER.debug("Evicting watch (%d): [%s]", wd, path)
+
             try:
-                self._i.add_watch(path, self._mask)
-            except inotify.calls.InotifyError as e:
-                if e.errno == ENOENT:
-                    _LOGGER.warning("Path %s disappeared before we could watch it", path)
-                    continue
-                raise                
+                self._i.remove_watch_with_id(wd)
+            except inotify.calls.InotifyError:
+                # The directory might be gone.
+                pass
+
+            self._budget.add_polled(path, is_eviction=True)
+            excess -= 1
+
+        room = max(0, self._budget.maximum_watches - self._i.watch_count)
+
+        for path in paths[room:]:
+            self._budget.add_polled(path)
+
+        return paths[:room]
+
+    def _poll(self):
+        """Look for changes in the directories that we're not watching. If
+        any were created or deleted, yield synthetic events for them, and then
+        start watching the directory in place of a colder one.
+        """
+
+        self._budget.prune(
+            lambda wd: self._i.get_watch_path(wd) is not None,
+            self._i.watch_count)
+
+        for path in self._budget.polled_paths:
+            state = self._snapshot.get(path)
+            if state is None:
+                # It's gone (and was reported via its parent).
+                self._budget.remove_polled(path)
+                continue
+
+            try:
+                stat_result = os.stat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            if state.is_stale(stat_result) is False:
+                continue
+
+            events = list(self._resync([path]))
+            if not events:
+                continue
+
+            yield from events
+
+            _LOGGER.debug("Promoting polled directory: [%s]", path)
+
+            self._add_watches([path])
+
+            if self._i.get_watch_id(path) is not None:
+                self._budget.record_promotion()
+
+            # Pick-up anything that changed before the watch was in place.
+            yield from self._resync([path])
+
+    @property
+    def budget_stats(self):
+        """An `inotify.budget.WatchBudgetStats`, if there's a watch-budget."""
+
+        if self._budget is None:
+            return None
+
+        return self._budget.get_stats(self._i.watch_count)
 
 
 class InotifyTree(_BaseTree):
-    """Recursively watch a path."""
+    """Recursively watch a path.
 
-    def __init__(self, path, mask=inotify.constants.IN_ALL_EVENTS,
-                 block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S):
-        super(InotifyTree, self).__init__(mask=mask, block_duration_s=block_duration_s)
+    The initial crawl can list directories in parallel using `crawl_workers`
+    threads. `progress_cb` is called with an `inotify.crawl.CrawlProgress`
+    periodically while it runs.
+
+    `filter_spec` is an `inotify.filters.FilterSpec` that determines which
+    directories are watched and with what mask.
+
+    If `maximum_watches` is given, no more than that many directories are
+    watched. The least-recently active ones are evicted to make room, and
+    the ones that aren't watched are polled every `poll_interval_s` seconds.
 
-        self._load_tree(path)
+    `backend` is 'inotify', 'polling' (see `inotify.polling`), or 'auto',
+    which polls the directories that are on filesystems that inotify can't
+    see changes on (e.g. NFS and FUSE mounts) and watches the rest. Those are
+    polled every `backend_poll_interval_s` seconds (separately from the ones
+    that don't fit in `maximum_watches`).
+    """
 
-    def _load_tree(self, path):
+    def __init__(self, path, mask=inotify.constants.IN_ALL_EVENTS,
+                 block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S,
+                 init_flags=_DEFAULT_INIT_FLAGS, crawl_workers=None,
+                 progress_cb=None, compact_events=False, trace_cb=None,
+                 overflow_recovery=False, filter_spec=None,
+                 snapshot_filepath=None, maximum_watches=None,
+                 poll_interval_s=inotify.budget._DEFAULT_POLL_INTERVAL_S,
+                 backend=_DEFAULT_TREE_BACKEND,
+                 backend_poll_interval_s=inotify.polling._DEFAULT_POLL_INTERVAL_S):
+        super(InotifyTree, self).__init__(
+            mask=mask,
+            block_duration_s=block_duration_s,
+            init_flags=init_flags,
+            crawl_workers=crawl_workers,
+            compact_events=compact_events,
+            trace_cb=trace_cb,
+            overflow_recovery=overflow_recovery,
+            filter_spec=filter_spec,
+            snapshot_filepath=snapshot_filepath,
+            maximum_watches=maximum_watches,
+            poll_interval_s=poll_interval_s,
+            is_polled_cb=_get_is_polled_cb(backend, [path]),
+            backend_poll_interval_s=backend_poll_interval_s)
+
+        start_s = time.time()
+
+        if self._load_trees_from_snapshot([path], progress_cb=progress_cb) is False:
+            self._load_tree(path, progress_cb=progress_cb)
+
+        self._time_to_ready_s = time.time() - start_s
+
+        _LOGGER.debug("Tree is ready after (%.3f) seconds: [%s]",
+                      self._time_to_ready_s, path)
+
+    def _load_tree(self, path, progress_cb=None):
         _LOGGER.debug("Adding initial watches on tree: [%s]", path)
-        return super()._load_tree(path)
+        return super()._load_tree(path, progress_cb=progress_cb)
 
 
 class InotifyTrees(_BaseTree):
-    """Recursively watch over a list of trees."""
+    """Recursively watch over a list of trees. See `InotifyTree` regarding
+    `crawl_workers`, `progress_cb`, `filter_spec`, `maximum_watches`, and
+    `backend` (and `backend_poll_interval_s`).
+    """
 
     def __init__(self, paths, mask=inotify.constants.IN_ALL_EVENTS,
-                 block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S):
-        super(InotifyTrees, self).__init__(mask=mask, block_duration_s=block_duration_s)
-
-        self._load_trees(paths)
-
-    def _load_trees(self, paths):
+                 block_duration_s=_DEFAULT_EPOLL_BLOCK_DURATION_S,
+                 init_flags=_DEFAULT_INIT_FLAGS, crawl_workers=None,
+                 progress_cb=None, compact_events=False, trace_cb=None,
+                 overflow_recovery=False, filter_spec=None,
+                 snapshot_filepath=None, maximum_watches=None,
+                 poll_interval_s=inotify.budget._DEFAULT_POLL_INTERVAL_S,
+                 backend=_DEFAULT_TREE_BACKEND,
+                 backend_poll_interval_s=inotify.polling._DEFAULT_POLL_INTERVAL_S):
+        super(InotifyTrees, self).__init__(
+            mask=mask,
+            block_duration_s=block_duration_s,
+            init_flags=init_flags,
+            crawl_workers=crawl_workers,
+            compact_events=compact_events,
+            trace_cb=trace_cb,
+            overflow_recovery=overflow_recovery,
+            filter_spec=filter_spec,
+            snapshot_filepath=snapshot_filepath,
+            maximum_watches=maximum_watches,
+            poll_interval_s=poll_interval_s,
+            is_polled_cb=_get_is_polled_cb(backend, paths),
+            backend_poll_interval_s=backend_poll_interval_s)
+
+        start_s = time.time()
+
+        if self._load_trees_from_snapshot(paths, progress_cb=progress_cb) is False:
+            self._load_trees(paths, progress_cb=progress_cb)
+
+        self._time_to_ready_s = time.time() - start_s
+
+        _LOGGER.debug("Trees are ready after (%.3f) seconds.",
+                      self._time_to_ready_s)
+
+    def _load_trees(self, paths, progress_cb=None):
         _LOGGER.debug("Adding initial watches on trees: [%s]", ",".join(map(str, paths)))
         for path in paths:
-            self._load_tree(path)
+            self._load_tree(path, progress_cb=progress_cb)
@@ -0,0 +1,275 @@
+"""asyncio support. The inotify descriptor is nonblocking and is registered
+directly with the running event-loop, so nothing polls and no thread is
+required. The loop is only woken when the kernel has events for us.
+
+Events that have been read but not yet retrieved are queued. When
+`maximum_queued_events` are waiting, we stop reading until the caller catches
+up, so the kernel's queue backs-up (and may eventually overflow) rather than
+our memory growing without limit.
+"""
+
+import asyncio
+import collections
+import logging
+
+import inotify.adapters
+import inotify.constants
+
+_DEFAULT_MAXIMUM_QUEUED_EVENTS = 64 * 1024
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _BaseAsyncInotify(object):
+    def __init__(self, terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS,
+                 maximum_queued_events=_DEFAULT_MAXIMUM_QUEUED_EVENTS):
+        self.__terminal_events = terminal_events
+        self.__maximum_queued_events = maximum_queued_events
+        self.__events = collections.deque()
+        self.__loop = None
+        self.__waiter = None
+        self.__is_reading = False
+        self.__is_closed = False
+
+    @property
+    def inotify(self):
+        raise NotImplementedError()
+
+    def _handle_event(self, event):
+        """Called for every event as soon as it's read."""
+
+        pass
+
+    def _handle_events_read(self):
+        """Called once everything that was available has been read."""
+
+        pass
+
+    def __start(self):
+        self.__loop = asyncio.get_running_loop()
+
+        _LOGGER.debug("Registering inotify handle (%d) with the event-loop.",
+                      self.inotify.fd)
+
+        self.__resume()
+
+    def __resume(self):
+        self.__loop.add_reader(self.inotify.fd, self.__read_events)
+        self.__is_reading = True
+
+    def __pause(self):
+        self.__loop.remove_reader(self.inotify.fd)
+        self.__is_reading = False
+
+    def __read_events(self):
+        events = self.inotify.read_events()
+        if not events:
+            return
+
+        for event in events:
+            self._handle_event(event)
+
+        self._handle_events_read()
+
+        self.__events.extend(events)
+
+        if len(self.__events) >= self.__maximum_queued_events:
+            _LOGGER.debug("Too many events are queued (%d). Pausing.",
+                          len(self.__events))
+
+            self.__pause()
+
+        waiter = self.__waiter
+        if waiter is not None and waiter.done() is False:
+            waiter.set_result(None)
+
+    def close(self):
+        """Deregister from the event-loop and close the inotify handle. Any
+        events that were already read can still be retrieved.
+        """
+
+        if self.__is_closed is True:
+            return
+
+        self.__is_closed = True
+
+        if self.__is_reading is True:
+            self.__pause()
+
+        self.__loop = None
+
+        self.inotify.close()
+
+        # Wake anyone who's waiting so that they can stop.
+        waiter = self.__waiter
+        if waiter is not None and waiter.done() is False:
+            waiter.set_result(None)
+
+    @property
+    def queued_events(self):
+        """How many events have been read but not yet retrieved."""
+
+        return len(self.__events)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__loop is None and self.__is_closed is False:
+            self.__start()
+
+        while not self.__events:
+            if self.__is_closed is True:
+                raise StopAsyncIteration()
+
+            self.__waiter = self.__loop.create_future()
+
+            try:
+                await self.__waiter
+            finally:
+                self.__waiter = None
+
+        event = self.__events.popleft()
+
+        if self.__is_reading is False and \
+           self.__is_closed is False and \
+           len(self.__events) < self.__maximum_queued_events:
+            self.__resume()
+
+        for type_name in event[1]:
+            if type_name in self.__terminal_events:
+                raise inotify.adapters.TerminalEventException(type_name, event)
+
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncInotify(_BaseAsyncInotify):
+    """Watch one or more paths from an asyncio event-loop:
+
+        async for event in AsyncInotify(['/tmp']):
+            ...
+
+    Use `asyncio.wait_for()` on `__anext__()` to apply a timeout.
+    """
+
+    def __init__(self, paths=[],
+                 read_buffer_size=inotify.adapters._DEFAULT_READ_BUFFER_SIZE,
+                 terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS,
+                 maximum_queued_events=_DEFAULT_MAXIMUM_QUEUED_EVENTS):
+        super(AsyncInotify, self).__init__(
+            terminal_events=terminal_events,
+            maximum_queued_events=maximum_queued_events)
+
+        self._i = inotify.adapters.Inotify(
+                    paths=paths,
+                    read_buffer_size=read_buffer_size,
+                    init_flags=inotify.adapters._DEFAULT_INIT_FLAGS)
+
+    def add_watch(self, path_unicode, mask=inotify.constants.IN_ALL_EVENTS):
+        return self._i.add_watch(path_unicode, mask)
+
+    def remove_watch(self, path, superficial=False):
+        self._i.remove_watch(path, superficial=superficial)
+
+    @property
+    def inotify(self):
+        return self._i
+
+
+class _BaseAsyncTree(_BaseAsyncInotify):
+    def __init__(self, tree, ignore_missing_new_folders=False,
+                 terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS,
+                 maximum_queued_events=_DEFAULT_MAXIMUM_QUEUED_EVENTS):
+        super(_BaseAsyncTree, self).__init__(
+            terminal_events=terminal_events,
+            maximum_queued_events=maximum_queued_events)
+
+        self._tree = tree
+        self.__ignore_missing_new_folders = ignore_missing_new_folders
+
+        # Scheduled while a moved-from directory is waiting for its moved-to.
+        self.__expiry_handle = None
+
+    @property
+    def inotify(self):
+        return self._tree.inotify
+
+    def _handle_event(self, event):
+        # We curate the watches as soon as we read the event rather than when
+        # the caller gets to it in order to keep the race-window small.
+        self._tree._handle_event(
+            event,
+            ignore_missing_new_folders=self.__ignore_missing_new_folders)
+
+    def _handle_events_read(self):
+        # A directory that was moved-from without a moved-to in time has left
+        # the tree. Since nothing polls, we check again once the window has
+        # passed.
+        self._tree._finish_pending_move()
+
+        if self._tree._pending_moves and self.__expiry_handle is None:
+            self.__expiry_handle = asyncio.get_running_loop().call_later(
+                                    inotify.adapters._PENDING_MOVE_WINDOW_S,
+                                    self.__expire_pending_moves)
+
+    def __expire_pending_moves(self):
+        self.__expiry_handle = None
+        self._handle_events_read()
+
+    def close(self):
+        if self.__expiry_handle is not None:
+            self.__expiry_handle.cancel()
+            self.__expiry_handle = None
+
+        super(_BaseAsyncTree, self).close()
+
+
+class AsyncInotifyTree(_BaseAsyncTree):
+    """Recursively watch a path from an asyncio event-loop. Note that the
+    initial crawl happens synchronously in the constructor, and that nothing
+    is polled (we only wake-up when the kernel has events).
+    """
+
+    def __init__(self, path, mask=inotify.constants.IN_ALL_EVENTS,
+                 ignore_missing_new_folders=False,
+                 terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS,
+                 maximum_queued_events=_DEFAULT_MAXIMUM_QUEUED_EVENTS):
+        tree = inotify.adapters.InotifyTree(
+                path,
+                mask=mask,
+                init_flags=inotify.adapters._DEFAULT_INIT_FLAGS,
+                backend='inotify')
+
+        super(AsyncInotifyTree, self).__init__(
+            tree,
+            ignore_missing_new_folders=ignore_missing_new_folders,
+            terminal_events=terminal_events,
+            maximum_queued_events=maximum_queued_events)
+
+
+class AsyncInotifyTrees(_BaseAsyncTree):
+    """Recursively watch a list of trees from an asyncio event-loop. Note that
+    the initial crawl happens synchronously in the constructor.
+    """
+
+    def __init__(self, paths, mask=inotify.constants.IN_ALL_EVENTS,
+                 ignore_missing_new_folders=False,
+                 terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS,
+                 maximum_queued_events=_DEFAULT_MAXIMUM_QUEUED_EVENTS):
+        tree = inotify.adapters.InotifyTrees(
+                paths,
+                mask=mask,
+                init_flags=inotify.adapters._DEFAULT_INIT_FLAGS,
+                backend='inotify')
+
+        super(AsyncInotifyTrees, self).__init__(
+            tree,
+            ignore_missing_new_folders=ignore_missing_new_folders,
+            terminal_events=terminal_events,
+            maximum_queued_events=maximum_queued_events)
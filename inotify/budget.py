@@ -0,0 +1,117 @@
+"""Bookkeeping for trees that are allowed fewer watches than they have
+directories (e.g. because of `max_user_watches`). The watched directories are
+kept in least-recently-active order so that the coldest can be evicted to make
+room, and the directories that aren't watched are polled instead.
+"""
+
+import collections
+import time
+
+_DEFAULT_POLL_INTERVAL_S = 5
+
+WatchBudgetStats = collections.namedtuple(
+                    'WatchBudgetStats',
+                    [
+                        'watches',
+                        'maximum_watches',
+                        'evictions',
+                        'promotions',
+                        'polled_directories',
+                        'polls',
+                    ])
+
+
+class WatchBudget(object):
+    def __init__(self, maximum_watches, poll_interval_s=_DEFAULT_POLL_INTERVAL_S):
+        if maximum_watches < 1:
+            raise ValueError("At least one watch is required: ({})".format(
+                             maximum_watches))
+
+        self.__maximum_watches = maximum_watches
+        self.__poll_interval_s = poll_interval_s
+
+        # Watch-descriptors, least-recently active first. This might include
+        # ones that have since been removed; they're skipped when evicting.
+        self.__lru = collections.OrderedDict()
+
+        self.__polled = set()
+
+        self.__evictions = 0
+        self.__promotions = 0
+        self.__polls = 0
+
+        self.__next_poll_s = time.monotonic() + poll_interval_s
+
+    @property
+    def maximum_watches(self):
+        return self.__maximum_watches
+
+    @property
+    def polled_paths(self):
+        return list(self.__polled)
+
+    def touch(self, wd):
+        """Mark the watch as having just seen activity."""
+
+        lru = self.__lru
+
+        if wd in lru:
+            lru.move_to_end(wd)
+        else:
+            lru[wd] = None
+
+    def pop_coldest(self):
+        """Remove and return the least-recently-active watch-descriptor, or
+        `None` if there aren't any.
+        """
+
+        if not self.__lru:
+            return None
+
+        (wd, _) = self.__lru.popitem(last=False)
+        return wd
+
+    def prune(self, is_current_cb, watch_count):
+        """Forget the watch-descriptors that are no longer in use once they
+        outnumber the ones that are.
+        """
+
+        if len(self.__lru) <= watch_count * 2:
+            return
+
+        for wd in list(self.__lru):
+            if is_current_cb(wd) is False:
+                del self.__lru[wd]
+
+    def add_polled(self, path, is_eviction=False):
+        self.__polled.add(path)
+
+        if is_eviction is True:
+            self.__evictions += 1
+
+    def remove_polled(self, path):
+        self.__polled.discard(path)
+
+    def record_promotion(self):
+        """Count a polled directory that's now watched because it changed."""
+
+        self.__promotions += 1
+
+    def is_poll_due(self):
+        now_s = time.monotonic()
+        if now_s < self.__next_poll_s:
+            return False
+
+        self.__next_poll_s = now_s + self.__poll_interval_s
+        self.__polls += 1
+
+        return True
+
+    def get_stats(self, watch_count):
+        return WatchBudgetStats(
+                watches=watch_count,
+                maximum_watches=self.__maximum_watches,
+                evictions=self.__evictions,
+                promotions=self.__promotions,
+                polled_directories=len(self.__polled),
+                polls=self.__polls)
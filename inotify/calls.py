@@ -1,17 +1,23 @@
 import logging
 import ctypes
 import os
+import array
+import fcntl
+import termios
+import threading
 
 import inotify.library
 
 _LOGGER = logging.getLogger(__name__)
 
-_LIB = inotify.library.instance
-
 
 class InotifyError(Exception):
     def __init__(self, message, *args, **kwargs):
-        self._errno = ctypes.get_errno()
+        # The errno may be given explicitly if it didn't come from the last
+        # ctypes call.
+        self._errno = kwargs.pop('errno', None)
+        if self._errno is None:
+            self._errno = ctypes.get_errno()
 
         try:
             self._errmsg = os.strerror(self.errno)
@@ -52,25 +58,105 @@ def _check_nonnegative(result):
 
     return result
 
-inotify_init = _LIB.inotify_init
-inotify_init.argtypes = []
-inotify_init.restype = _check_nonnegative
+# The library functions are bound the first time that one of them is used
+# (see `__getattr__()`) so that importing doesn't load the library.
+_LAZY_NAMES = (
+    'inotify_init',
+    'inotify_init1',
+    'inotify_add_watch',
+    '_inotify_add_watch_unchecked',
+    'inotify_rm_watch',
+    'errno',
+)
+
+_is_bound = False
+_bind_lock = threading.Lock()
+
+def _bind():
+    global _is_bound
+
+    if _is_bound is True:
+        return
+
+    with _bind_lock:
+        if _is_bound is True:
+            return
+
+        library = inotify.library.get_instance()
+
+        inotify_init = library.inotify_init
+        inotify_init.argtypes = []
+        inotify_init.restype = _check_nonnegative
+
+        inotify_init1 = library.inotify_init1
+        inotify_init1.argtypes = [ctypes.c_int]
+        inotify_init1.restype = _check_nonnegative
+
+        inotify_add_watch = library.inotify_add_watch
+        inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32]
+
+        inotify_add_watch.restype = _check_nonnegative
+
+        # This is a separate function-object from the one above (which raises
+        # on failure) so that we can collect errors in bulk.
+        inotify_add_watch_unchecked = library['inotify_add_watch']
+        inotify_add_watch_unchecked.argtypes = inotify_add_watch.argtypes
+        inotify_add_watch_unchecked.restype = ctypes.c_int
+
+        inotify_rm_watch = library.inotify_rm_watch
+        inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        inotify_rm_watch.restype = _check_nonnegative
+
+        if getattr(library, 'errno', None) is not None:
+            errno = library.errno
+        elif getattr(library, 'err', None) is not None:
+            errno = library.err
+        else:
+            raise EnvironmentError("'errno' not found in library")
+
+        globals().update({
+            'inotify_init': inotify_init,
+            'inotify_init1': inotify_init1,
+            'inotify_add_watch': inotify_add_watch,
+            '_inotify_add_watch_unchecked': inotify_add_watch_unchecked,
+            'inotify_rm_watch': inotify_rm_watch,
+            'errno': errno,
+        })
+
+        _is_bound = True
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        _bind()
+        return globals()[name]
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def inotify_add_watches(fd, paths, mask):
+    """Add a watch for each of the given (bytes) paths in one call. Returns a
+    list with the watch-descriptor for each path, or the negated errno if that
+    one failed.
+    """
+
+    _bind()
+
+    results = []
+    for path in paths:
+        wd = _inotify_add_watch_unchecked(fd, path, mask)
+        if wd == -1:
+            wd = -ctypes.get_errno()
 
-inotify_add_watch = _LIB.inotify_add_watch
-inotify_add_watch.argtypes = [
-    ctypes.c_int, 
-    ctypes.c_char_p, 
-    ctypes.c_uint32]
+        results.append(wd)
 
-inotify_add_watch.restype = _check_nonnegative
+    return results
 
-inotify_rm_watch = _LIB.inotify_rm_watch
-inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
-inotify_rm_watch.restype = _check_nonnegative
+def inotify_get_queued_bytes(fd):
+    """Return how many bytes of events are waiting to be read."""
 
-if getattr(_LIB, 'errno', None) is not None:
-    errno = _LIB.errno
-elif getattr(_LIB, 'err', None) is not None:
-    errno = _LIB.err
-else:
-    raise EnvironmentError("'errno' not found in library")
+    buffer_ = array.array('i', [0])
+    fcntl.ioctl(fd, termios.FIONREAD, buffer_, True)
+
+    return buffer_[0]
@@ -0,0 +1,203 @@
+"""Merge bursts of events for the same file into a single `CoalescedEvent`
+with the masks OR-ed together and a count. A record is emitted when an event
+in `flush_mask` (IN_CLOSE_WRITE by default) arrives for it, when it has waited
+`window_s` seconds, or when too many records are waiting.
+
+This wraps the generator from any of the `event_gen()` methods:
+
+    for event in inotify.coalesce.coalesce(i.event_gen(yield_nones=True)):
+        ...
+
+The order of the events that were merged is lost, except that a creation is
+never merged with a deletion: whatever is waiting is emitted first, so that
+the file's final state can be known. Moves (which have cookies)
+and the events that aren't about a particular file (IN_Q_OVERFLOW,
+IN_IGNORED, IN_UNMOUNT) are passed through as they are, after anything that
+was waiting for the same file.
+"""
+
+import collections
+import logging
+import time
+
+import inotify.constants
+import inotify.events
+
+_DEFAULT_WINDOW_S = 0.1
+_DEFAULT_MAXIMUM_PENDING = 4096
+_DEFAULT_FLUSH_MASK = inotify.constants.IN_CLOSE_WRITE
+
+_PASSTHROUGH_MASK = \
+    inotify.constants.IN_MOVE | \
+    inotify.constants.IN_Q_OVERFLOW | \
+    inotify.constants.IN_IGNORED | \
+    inotify.constants.IN_UNMOUNT
+
+# The events that change whether a file exists.
+_EXISTENCE_MASK = \
+    inotify.constants.IN_CREATE | \
+    inotify.constants.IN_DELETE
+
+_LOGGER = logging.getLogger(__name__)
+
+CoalescedEvent = collections.namedtuple(
+                    'CoalescedEvent',
+                    [
+                        'wd',
+                        'mask',
+                        'type_names',
+                        'path',
+                        'filename',
+                        'count',
+                    ])
+
+
+class _Pending(object):
+    __slots__ = (
+        'deadline',
+        'mask',
+        'count',
+        'path',
+    )
+
+    def __init__(self, deadline, mask, path):
+        self.deadline = deadline
+        self.mask = mask
+        self.count = 1
+        self.path = path
+
+
+class Coalescer(object):
+    def __init__(self, window_s=_DEFAULT_WINDOW_S,
+                 maximum_pending=_DEFAULT_MAXIMUM_PENDING,
+                 flush_mask=_DEFAULT_FLUSH_MASK):
+        self.__window_s = window_s
+        self.__maximum_pending = maximum_pending
+        self.__flush_mask = flush_mask
+
+        # (wd, filename) to `_Pending`, in the order that they started.
+        self.__pending = collections.OrderedDict()
+
+        self.__collapsed_count = 0
+
+    def __len__(self):
+        return len(self.__pending)
+
+    @property
+    def collapsed_count(self):
+        """How many events have been absorbed into others so far."""
+
+        return self.__collapsed_count
+
+    def __emit(self, key, pending):
+        (wd, filename) = key
+
+        self.__collapsed_count += pending.count - 1
+
+        return CoalescedEvent(
+                wd=wd,
+                mask=pending.mask,
+                type_names=inotify.events.get_event_names(pending.mask),
+                path=pending.path,
+                filename=filename,
+                count=pending.count)
+
+    def flush(self, now=None):
+        """Return the records that have waited long enough. If `now` is
+        `None`, return all of them.
+        """
+
+        flushed = []
+        while self.__pending:
+            key, pending = next(iter(self.__pending.items()))
+            if now is not None and pending.deadline > now:
+                break
+
+            del self.__pending[key]
+            flushed.append(self.__emit(key, pending))
+
+        return flushed
+
+    def process(self, event):
+        """Return what should be emitted for the given event (which may be
+        `None`, to indicate that time has passed).
+        """
+
+        now = time.monotonic()
+
+        output = self.flush(now=now) if self.__pending else []
+
+        if event is None:
+            return output
+
+        if type(event) is tuple:
+            (header, _, path, filename) = event
+        else:
+            header = event
+            path = event.path
+            filename = event.filename
+
+        mask = header.mask
+        key = (header.wd, filename)
+
+        if mask & _PASSTHROUGH_MASK:
+            pending = self.__pending.pop(key, None)
+            if pending is not None:
+                output.append(self.__emit(key, pending))
+
+            output.append(event)
+            return output
+
+        pending = self.__pending.get(key)
+
+        # A creation after a deletion (or the reverse) starts a new record.
+        if pending is not None and \
+           pending.mask & _EXISTENCE_MASK & ~mask and \
+           mask & _EXISTENCE_MASK:
+            del self.__pending[key]
+            output.append(self.__emit(key, pending))
+
+            pending = None
+
+        if pending is None:
+            pending = _Pending(now + self.__window_s, mask, path)
+            self.__pending[key] = pending
+
+            if len(self.__pending) > self.__maximum_pending:
+                _LOGGER.warning("Too many files with pending events. "
+                                "Emitting the oldest early.")
+
+                (oldest_key, oldest) = self.__pending.popitem(last=False)
+                output.append(self.__emit(oldest_key, oldest))
+        else:
+            pending.mask |= mask
+            pending.count += 1
+
+        if mask & self.__flush_mask:
+            del self.__pending[key]
+            output.append(self.__emit(key, pending))
+
+        return output
+
+
+def coalesce(events, window_s=_DEFAULT_WINDOW_S,
+             maximum_pending=_DEFAULT_MAXIMUM_PENDING,
+             flush_mask=_DEFAULT_FLUSH_MASK):
+    """Wrap an event generator and yield `CoalescedEvent`s. Records are only
+    checked for expiry when something arrives, so pass `yield_nones=True` to
+    the wrapped generator if you want them to be emitted promptly. `None`s
+    are passed through.
+    """
+
+    coalescer = Coalescer(
+                    window_s=window_s,
+                    maximum_pending=maximum_pending,
+                    flush_mask=flush_mask)
+
+    for event in events:
+        yield from coalescer.process(event)
+
+        if event is None:
+            yield None
+
+    yield from coalescer.flush()
@@ -1,3 +1,5 @@
+import enum
+
 ## inotify_init1 flags.
 
 IN_CLOEXEC  = 0o2000000
@@ -76,3 +78,36 @@ MASK_LOOKUP = {
     0x40000000: 'IN_ISDIR',
     0x80000000: 'IN_ONESHOT',
 }
+
+
+class EventMask(enum.IntFlag):
+    """The event and flag bits as an `IntFlag`, so that membership can be
+    tested with bitwise operations (e.g. `EventMask.IN_CREATE in mask`).
+    """
+
+    IN_ACCESS        = IN_ACCESS
+    IN_MODIFY        = IN_MODIFY
+    IN_ATTRIB        = IN_ATTRIB
+    IN_CLOSE_WRITE   = IN_CLOSE_WRITE
+    IN_CLOSE_NOWRITE = IN_CLOSE_NOWRITE
+    IN_OPEN          = IN_OPEN
+    IN_MOVED_FROM    = IN_MOVED_FROM
+    IN_MOVED_TO      = IN_MOVED_TO
+    IN_CREATE        = IN_CREATE
+    IN_DELETE        = IN_DELETE
+    IN_DELETE_SELF   = IN_DELETE_SELF
+    IN_MOVE_SELF     = IN_MOVE_SELF
+
+    IN_UNMOUNT       = IN_UNMOUNT
+    IN_Q_OVERFLOW    = IN_Q_OVERFLOW
+    IN_IGNORED       = IN_IGNORED
+
+    IN_ONLYDIR       = IN_ONLYDIR
+    IN_DONT_FOLLOW   = IN_DONT_FOLLOW
+    IN_MASK_ADD      = IN_MASK_ADD
+    IN_ISDIR         = IN_ISDIR
+    IN_ONESHOT       = IN_ONESHOT
+
+    IN_CLOSE         = IN_CLOSE
+    IN_MOVE          = IN_MOVE
+    IN_ALL_EVENTS    = IN_ALL_EVENTS
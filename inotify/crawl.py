@@ -0,0 +1,176 @@
+"""Enumerate the directories of a tree so that they can be watched.
+
+We use `os.scandir()` so that the directory-entry type that comes back from
+the kernel can usually tell us whether something is a directory without an
+additional `stat()`. Listing a directory releases the GIL, so the listing can
+optionally be spread over a thread-pool.
+"""
+
+import logging
+import os
+import time
+import collections
+import concurrent.futures
+
+_DEFAULT_PROGRESS_INTERVAL = 10000
+
+_LOGGER = logging.getLogger(__name__)
+
+CrawlProgress = collections.namedtuple(
+                    'CrawlProgress',
+                    [
+                        'directories',
+                        'entries',
+                        'elapsed_s',
+                    ])
+
+
+def _scan(path, with_listing=False):
+    """Return the subdirectories of the given path, how many entries it had,
+    and (if requested) the directory's stat-result and a dictionary of its
+    children's names to whether they're directories. Returns `None` if the
+    path has disappeared.
+    """
+
+    subdirectories = []
+    count = 0
+
+    if with_listing is True:
+        children = {}
+    else:
+        children = None
+
+    try:
+        # We stat before listing so that anything that changes while we list
+        # will still make the directory look modified later.
+        if with_listing is True:
+            stat_result = os.stat(path)
+        else:
+            stat_result = None
+
+        with os.scandir(path) as it:
+            for entry in it:
+                count += 1
+
+                # This only needs to stat symlinks (which we follow, like
+                # `os.path.isdir()` would).
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if children is not None:
+                    children[entry.name] = is_dir
+
+                if is_dir is True:
+                    subdirectories.append(entry.path)
+    except (FileNotFoundError, NotADirectoryError):
+        _LOGGER.warning("Path %s disappeared before we could list it", path)
+        return None
+
+    return (subdirectories, count, stat_result, children)
+
+
+class _Crawler(object):
+    def __init__(self, progress_cb, progress_interval, listing_cb, exclude_cb):
+        self.__progress_cb = progress_cb
+        self.__listing_cb = listing_cb
+        self.__exclude_cb = exclude_cb
+        self.__progress_interval = progress_interval
+
+        self.__start_s = time.time()
+        self.__directories = 0
+        self.__entries = 0
+        self.__next_progress = progress_interval
+
+    def __get_progress(self):
+        return CrawlProgress(
+                directories=self.__directories,
+                entries=self.__entries,
+                elapsed_s=time.time() - self.__start_s)
+
+    def crawl(self, path, scan_level):
+        """Crawl breadth-first, a whole level at a time. `scan_level` returns
+        the scan-results for a list of paths in the same order.
+        """
+
+        paths = []
+
+        level = collections.deque([path])
+        while level:
+            next_level = collections.deque()
+
+            for current_path, result in zip(level, scan_level(level)):
+                if result is None:
+                    continue
+
+                (subdirectories, count, stat_result, children) = result
+
+                if self.__listing_cb is not None:
+                    self.__listing_cb(current_path, stat_result, children)
+
+                paths.append(current_path)
+
+                if self.__exclude_cb is not None:
+                    subdirectories = [
+                        subdirectory
+                        for subdirectory
+                        in subdirectories
+                        if self.__exclude_cb(subdirectory) is False
+                    ]
+
+                next_level.extend(subdirectories)
+
+                self.__directories += 1
+                self.__entries += count
+
+                if self.__progress_cb is not None and \
+                   self.__directories >= self.__next_progress:
+                    self.__next_progress += self.__progress_interval
+                    self.__progress_cb(self.__get_progress())
+
+            level = next_level
+
+        if self.__progress_cb is not None:
+            self.__progress_cb(self.__get_progress())
+
+        return paths
+
+
+def crawl(path, workers=None, progress_cb=None,
+          progress_interval=_DEFAULT_PROGRESS_INTERVAL, listing_cb=None,
+          exclude_cb=None):
+    """Return the given path and all of the directories beneath it in
+    breadth-first order. Symlinks to directories are followed.
+
+    If `workers` is given, each level of the tree is listed in parallel using
+    that many threads. The order of the result is the same either way.
+
+    If `progress_cb` is given, it's called with a `CrawlProgress` every
+    `progress_interval` directories and once more when we're done.
+
+    If `listing_cb` is given, it's called with the path, stat-result, and
+    children (names to whether they're directories) of each directory.
+
+    If `exclude_cb` is given, it's called with the path of each subdirectory
+    that we find. If it returns `True`, that subdirectory isn't returned or
+    descended into.
+    """
+
+    crawler = _Crawler(progress_cb, progress_interval, listing_cb, exclude_cb)
+    with_listing = listing_cb is not None
+
+    def scan(path):
+        return _scan(path, with_listing=with_listing)
+
+    if not workers:
+        def scan_level(level):
+            return map(scan, level)
+
+        return crawler.crawl(path, scan_level)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        def scan_level(level):
+            return executor.map(scan, level)
+
+        return crawler.crawl(path, scan_level)
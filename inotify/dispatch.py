@@ -0,0 +1,306 @@
+"""Hand events to a pool of worker processes so that CPU-bound handlers aren't
+limited to one thread. Events are read and decoded in this process and then
+written as compact binary records into a shared-memory ring for each worker.
+
+Each event goes to the worker chosen by a hash of its path, so all of the
+events for any one file are handled by the same worker, in order. If a worker
+falls behind and its ring fills up, `dispatch()` blocks until there's room
+(and raises `WorkerError` if the worker has exited).
+
+    with inotify.dispatch.Dispatcher(handle_event, workers=4) as dispatcher:
+        for event in i.event_gen(yield_nones=False):
+            dispatcher.dispatch(event)
+
+The handler is called in the worker with a `DispatchedEvent`.
+"""
+
+import collections
+import logging
+import multiprocessing
+import multiprocessing.shared_memory
+import os
+import struct
+import time
+import zlib
+
+import inotify.events
+
+_DEFAULT_WORKER_COUNT = 4
+_DEFAULT_SLOT_COUNT = 256
+
+# How long we wait for room before we count a stall.
+_STALL_CHECK_S = 0.01
+
+_KIND_EVENT = 0
+_KIND_STOP = 1
+
+# kind, wd, mask, cookie, path-length, filename-length
+_RECORD_HEADER = struct.Struct('<BiIIHH')
+
+# The longest path (PATH_MAX) and filename (NAME_MAX) that we can be given.
+_MAXIMUM_PATH_LENGTH = 4096
+_MAXIMUM_FILENAME_LENGTH = 255
+
+_SLOT_SIZE = \
+    _RECORD_HEADER.size + _MAXIMUM_PATH_LENGTH + _MAXIMUM_FILENAME_LENGTH
+
+_LOGGER = logging.getLogger(__name__)
+
+DispatchedEvent = collections.namedtuple(
+                    'DispatchedEvent',
+                    [
+                        'wd',
+                        'mask',
+                        'cookie',
+                        'path',
+                        'filename',
+                    ])
+
+DispatchStats = collections.namedtuple(
+                    'DispatchStats',
+                    [
+                        'worker',
+                        'dispatched',
+                        'pending',
+                        'stalls',
+                        'stalled_s',
+                    ])
+
+
+class WorkerError(Exception):
+    pass
+
+
+class _Ring(object):
+    """A single-producer, single-consumer ring of fixed-size slots. The
+    semaphores count the free and filled slots, and each side keeps track of
+    its own position.
+    """
+
+    def __init__(self, slot_count, context):
+        self.slot_count = slot_count
+
+        self.shared_memory = multiprocessing.shared_memory.SharedMemory(
+                                create=True,
+                                size=slot_count * _SLOT_SIZE)
+
+        self.free = context.Semaphore(slot_count)
+        self.filled = context.Semaphore(0)
+
+        self.position = 0
+
+    def write(self, kind, wd, mask, cookie, path_bytes, filename_bytes):
+        """Write a record into the next slot. We must already have acquired
+        a free slot.
+        """
+
+        offset = self.position * _SLOT_SIZE
+        view = self.shared_memory.buf
+
+        _RECORD_HEADER.pack_into(
+            view,
+            offset,
+            kind,
+            wd,
+            mask,
+            cookie,
+            len(path_bytes),
+            len(filename_bytes))
+
+        offset += _RECORD_HEADER.size
+        view[offset:offset + len(path_bytes)] = path_bytes
+
+        offset += len(path_bytes)
+        view[offset:offset + len(filename_bytes)] = filename_bytes
+
+        self.position = (self.position + 1) % self.slot_count
+        self.filled.release()
+
+    def read(self):
+        """Wait for the next record and return it as (kind, event)."""
+
+        self.filled.acquire()
+
+        offset = self.position * _SLOT_SIZE
+        view = self.shared_memory.buf
+
+        (kind, wd, mask, cookie, path_length, filename_length) = \
+            _RECORD_HEADER.unpack_from(view, offset)
+
+        offset += _RECORD_HEADER.size
+        path = bytes(view[offset:offset + path_length]).decode('utf8')
+
+        offset += path_length
+        filename = bytes(view[offset:offset + filename_length]).decode('utf8')
+
+        self.position = (self.position + 1) % self.slot_count
+
+        # We've copied everything out, so the slot can be reused.
+        self.free.release()
+
+        return kind, DispatchedEvent(wd, mask, cookie, path, filename)
+
+    def close(self):
+        self.shared_memory.close()
+
+
+def _run_worker(handler, ring):
+    while True:
+        (kind, event) = ring.read()
+        if kind == _KIND_STOP:
+            break
+
+        try:
+            handler(event)
+        except Exception:
+            _LOGGER.exception("Handler failed for event: %s", event)
+
+    ring.close()
+
+
+class Dispatcher(object):
+    def __init__(self, handler, workers=_DEFAULT_WORKER_COUNT,
+                 slot_count=_DEFAULT_SLOT_COUNT, context=None):
+        if context is None:
+            context = multiprocessing.get_context()
+
+        self.__handler = handler
+        self.__context = context
+
+        self.__rings = [_Ring(slot_count, context) for _ in range(workers)]
+        self.__processes = []
+
+        self.__dispatched_counts = [0] * workers
+        self.__stall_counts = [0] * workers
+        self.__stalled_s = [0.0] * workers
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        for index, ring in enumerate(self.__rings):
+            process = self.__context.Process(
+                        target=_run_worker,
+                        args=(self.__handler, ring),
+                        name='inotify-dispatch-{}'.format(index),
+                        daemon=True)
+
+            process.start()
+            self.__processes.append(process)
+
+    def close(self):
+        """Let the workers finish what's already been dispatched, and then
+        stop them and release the shared memory.
+        """
+
+        if self.__processes:
+            for index in range(len(self.__rings)):
+                try:
+                    self.__write(index, _KIND_STOP, 0, 0, 0, b'', b'')
+                except WorkerError as e:
+                    # It's already stopped.
+                    _LOGGER.warning("Could not stop worker: %s", e)
+
+            for process in self.__processes:
+                process.join()
+
+            self.__processes = []
+
+        for ring in self.__rings:
+            ring.close()
+            ring.shared_memory.unlink()
+
+        self.__rings = []
+
+    def __check_worker(self, index):
+        if index >= len(self.__processes):
+            raise WorkerError("Worker ({}) was not started.".format(index))
+
+        process = self.__processes[index]
+        if process.is_alive() is False:
+            raise WorkerError("Worker ({}) has exited: ({})".format(
+                              index, process.exitcode))
+
+    def __write(self, index, kind, wd, mask, cookie, path_bytes, filename_bytes):
+        ring = self.__rings[index]
+
+        # If the worker is behind, we wait (and keep track of how long), as
+        # long as it's still running.
+        if ring.free.acquire(timeout=_STALL_CHECK_S) is False:
+            start_s = time.monotonic()
+
+            while ring.free.acquire(timeout=_STALL_CHECK_S) is False:
+                self.__check_worker(index)
+
+            self.__stall_counts[index] += 1
+            self.__stalled_s[index] += \
+                time.monotonic() - start_s + _STALL_CHECK_S
+
+        ring.write(kind, wd, mask, cookie, path_bytes, filename_bytes)
+
+    def dispatch(self, event):
+        """Send the event to the worker that handles its path. This blocks if
+        that worker's ring is full, and raises `WorkerError` if that worker
+        has exited.
+        """
+
+        if isinstance(event, inotify.events.InotifyEvent) is True:
+            header = event
+            path = event.path
+            filename_bytes = event.filename_bytes
+        else:
+            (header, _, path, filename) = event
+            filename_bytes = filename.encode('utf8')
+
+        # Overflows don't have a path.
+        if path is None:
+            path_bytes = b''
+        else:
+            path_bytes = path.encode('utf8')
+
+        # Anything longer wouldn't fit in a slot.
+        if len(path_bytes) > _MAXIMUM_PATH_LENGTH:
+            raise ValueError("Path is too long to dispatch ({} > {}): "
+                             "[{}]".format(len(path_bytes),
+                             _MAXIMUM_PATH_LENGTH, path))
+
+        if len(filename_bytes) > _MAXIMUM_FILENAME_LENGTH:
+            raise ValueError("Filename is too long to dispatch ({} > {}): "
+                             "[{}]".format(len(filename_bytes),
+                             _MAXIMUM_FILENAME_LENGTH, filename_bytes))
+
+        full_path_bytes = os.path.join(path_bytes, filename_bytes)
+        index = zlib.crc32(full_path_bytes) % len(self.__rings)
+
+        self.__write(
+            index,
+            _KIND_EVENT,
+            header.wd,
+            header.mask,
+            header.cookie,
+            path_bytes,
+            filename_bytes)
+
+        self.__dispatched_counts[index] += 1
+
+    @property
+    def stats(self):
+        """Return a `DispatchStats` for each worker. `pending` is how many
+        records are waiting in its ring, and `stalls` and `stalled_s` are how
+        often and for how long we had to wait for it.
+        """
+
+        return [
+            DispatchStats(
+                worker=index,
+                dispatched=self.__dispatched_counts[index],
+                pending=ring.slot_count - ring.free.get_value(),
+                stalls=self.__stall_counts[index],
+                stalled_s=self.__stalled_s[index])
+            for index, ring
+            in enumerate(self.__rings)
+        ]
@@ -0,0 +1,181 @@
+"""A compact alternative to the (header, type_names, path, filename) tuples
+that are produced by default. Only the raw values from the kernel are stored;
+everything else is derived when it's asked for.
+"""
+
+import os
+import collections
+
+import inotify.constants
+
+_INOTIFY_EVENT = collections.namedtuple(
+                    '_INOTIFY_EVENT',
+                    [
+                        'wd',
+                        'mask',
+                        'cookie',
+                        'len',
+                    ])
+
+# The size of the header above, as the kernel packs it.
+_HEADER_LENGTH = 16
+
+
+# Masks are few and repeat constantly, so we just remember all of them. This is
+# only a safety-net in case something produces an endless variety.
+_MAXIMUM_CACHED_MASKS = 4096
+
+_EVENT_NAMES_CACHE = {}
+
+
+def _resolve_event_names(event_type):
+    names = []
+    for bit, name in inotify.constants.MASK_LOOKUP.items():
+        if event_type & bit:
+            names.append(name)
+            event_type -= bit
+
+            if event_type == 0:
+                break
+
+    assert event_type == 0, \
+           "We could not resolve all event-types: (%d)" % (event_type,)
+
+    return names
+
+
+def get_event_names(event_type):
+    """Return the names of the bits in the given mask as a tuple. The same
+    tuple is returned every time for the same mask.
+    """
+
+    try:
+        return _EVENT_NAMES_CACHE[event_type]
+    except KeyError:
+        pass
+
+    names = tuple(_resolve_event_names(event_type))
+
+    if len(_EVENT_NAMES_CACHE) >= _MAXIMUM_CACHED_MASKS:
+        _EVENT_NAMES_CACHE.clear()
+
+    _EVENT_NAMES_CACHE[event_type] = names
+    return names
+
+
+def _get_event_names(event_type):
+    """Return the names as a new list, as we always have."""
+
+    return list(get_event_names(event_type))
+
+
+def make_event(compact_events, wd, mask, path, filename, cookie=0):
+    """Build an event that didn't come from the kernel (or that came from
+    something other than inotify).
+    """
+
+    filename_bytes = filename.encode('utf8')
+
+    # The kernel pads the (NUL-terminated) name to a multiple of the header.
+    if filename_bytes:
+        length = ((len(filename_bytes) + _HEADER_LENGTH) //
+                  _HEADER_LENGTH) * _HEADER_LENGTH
+    else:
+        length = 0
+
+    if compact_events is True:
+        return InotifyEvent(wd, mask, cookie, length, path, filename_bytes)
+
+    header = _INOTIFY_EVENT(wd=wd, mask=mask, cookie=cookie, len=length)
+    type_names = list(get_event_names(mask))
+
+    return (header, type_names, path, filename)
+
+
+class InotifyEvent(object):
+    """A single event. This can still be unpacked, indexed, and compared like
+    the (header, type_names, path, filename) tuple that's normally produced.
+    """
+
+    __slots__ = (
+        'wd',
+        'mask',
+        'cookie',
+        'len',
+        'path',
+        'filename_bytes',
+    )
+
+    def __init__(self, wd, mask, cookie, len, path, filename_bytes):
+        self.wd = wd
+        self.mask = mask
+        self.cookie = cookie
+        self.len = len
+        self.path = path
+        self.filename_bytes = filename_bytes
+
+    @property
+    def header(self):
+        return _INOTIFY_EVENT(self.wd, self.mask, self.cookie, self.len)
+
+    @property
+    def type_names(self):
+        """A shared tuple. Note that indexing or unpacking the event will
+        produce a list, for compatibility.
+        """
+
+        return get_event_names(self.mask)
+
+    @property
+    def flags(self):
+        return inotify.constants.EventMask(self.mask)
+
+    @property
+    def filename(self):
+        return self.filename_bytes.decode('utf8')
+
+    @property
+    def full_path(self):
+        """The path of the watched directory joined with the filename (if the
+        event was for something within it).
+        """
+
+        if not self.filename_bytes:
+            return self.path
+
+        return os.path.join(self.path, self.filename)
+
+    def as_tuple(self):
+        return (self.header, _get_event_names(self.mask), self.path, self.filename)
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, InotifyEvent) is True:
+            other = other.as_tuple()
+        elif isinstance(other, tuple) is False:
+            return NotImplemented
+
+        return self.as_tuple() == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "InotifyEvent(wd={}, mask={}, cookie={}, len={}, path={!r}, " \
+               "filename={!r})".format(
+               self.wd, self.mask, self.cookie, self.len, self.path,
+               self.filename)
@@ -0,0 +1,788 @@
+"""Watch a whole tree with a single fanotify mark on its filesystem rather than
+with a watch for every directory, so nothing has to be crawled and the kernel
+doesn't keep anything per-directory.
+
+The events identify the directory by a file-handle (FAN_REPORT_DFID_NAME),
+which we resolve to a path by opening it and reading the link in `/proc`.
+Those paths are cached and kept current as directories are renamed. The
+events are produced in the same form as `inotify.adapters.Inotify`'s.
+
+This needs Linux 5.9 or later (5.17 to pair renames), CAP_SYS_ADMIN (to mark
+a filesystem), and CAP_DAC_READ_SEARCH (to open file-handles).
+"""
+
+import collections
+import ctypes
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+import inotify.adapters
+import inotify.calls
+import inotify.constants
+import inotify.events
+import inotify.library
+import inotify.metrics
+
+# `fanotify_init()` flags.
+_FAN_CLOEXEC = 0x1
+_FAN_NONBLOCK = 0x2
+_FAN_CLASS_NOTIF = 0x0
+_FAN_REPORT_DIR_FID = 0x400
+_FAN_REPORT_NAME = 0x800
+
+_DEFAULT_INIT_FLAGS = \
+    _FAN_CLASS_NOTIF | \
+    _FAN_CLOEXEC | \
+    _FAN_NONBLOCK | \
+    _FAN_REPORT_DIR_FID | \
+    _FAN_REPORT_NAME
+
+# `fanotify_mark()` flags.
+_FAN_MARK_ADD = 0x1
+_FAN_MARK_FILESYSTEM = 0x100
+
+# The event bits that fanotify shares with inotify have the same values
+# (including FAN_ONDIR and IN_ISDIR). These are the ones that it doesn't.
+_FAN_RENAME = 0x10000000
+
+_SUPPORTED_MASK = \
+    inotify.constants.IN_ACCESS | \
+    inotify.constants.IN_MODIFY | \
+    inotify.constants.IN_ATTRIB | \
+    inotify.constants.IN_CLOSE_WRITE | \
+    inotify.constants.IN_CLOSE_NOWRITE | \
+    inotify.constants.IN_OPEN | \
+    inotify.constants.IN_MOVED_FROM | \
+    inotify.constants.IN_MOVED_TO | \
+    inotify.constants.IN_CREATE | \
+    inotify.constants.IN_DELETE | \
+    inotify.constants.IN_DELETE_SELF | \
+    inotify.constants.IN_MOVE_SELF
+
+# The mark covers the whole filesystem, so anything that's reported for every
+# read (e.g. IN_ACCESS and IN_OPEN) is left out unless it's asked for.
+_DEFAULT_MASK = \
+    inotify.constants.IN_MODIFY | \
+    inotify.constants.IN_ATTRIB | \
+    inotify.constants.IN_CLOSE_WRITE | \
+    inotify.constants.IN_MOVED_FROM | \
+    inotify.constants.IN_MOVED_TO | \
+    inotify.constants.IN_CREATE | \
+    inotify.constants.IN_DELETE | \
+    inotify.constants.IN_DELETE_SELF | \
+    inotify.constants.IN_MOVE_SELF
+
+# What we always need in order to keep the cached paths current.
+_MINIMUM_MARK_MASK = \
+    inotify.constants.IN_ISDIR | \
+    inotify.constants.IN_CREATE
+
+# The kernel merges consecutive events for the same thing. We split them back
+# apart in this order.
+_EVENT_ORDER = (
+    inotify.constants.IN_CREATE,
+    inotify.constants.IN_MOVED_TO,
+    inotify.constants.IN_OPEN,
+    inotify.constants.IN_ACCESS,
+    inotify.constants.IN_MODIFY,
+    inotify.constants.IN_ATTRIB,
+    inotify.constants.IN_CLOSE_WRITE,
+    inotify.constants.IN_CLOSE_NOWRITE,
+    inotify.constants.IN_MOVED_FROM,
+    inotify.constants.IN_DELETE,
+    inotify.constants.IN_DELETE_SELF,
+    inotify.constants.IN_MOVE_SELF,
+)
+
+_FAN_EVENT_INFO_TYPE_DFID_NAME = 2
+_FAN_EVENT_INFO_TYPE_OLD_DFID_NAME = 10
+_FAN_EVENT_INFO_TYPE_NEW_DFID_NAME = 12
+
+_FANOTIFY_METADATA_VERSION = 3
+
+# event_len, vers, reserved, metadata_len, mask, fd, pid
+_METADATA_STRUCT = struct.Struct('=IBBHQii')
+
+# info_type, pad, len
+_INFO_HEADER_STRUCT = struct.Struct('=BBH')
+
+# The info-header and the filesystem-ID precede the `struct file_handle`
+# (handle_bytes and handle_type, and then the handle).
+_FILE_HANDLE_OFFSET = _INFO_HEADER_STRUCT.size + 8
+_FILE_HANDLE_HEADER_STRUCT = struct.Struct('=Ii')
+
+_MAXIMUM_HANDLE_SIZE = 128
+
+# What `/proc/self/fd` appends to the link of something that's been deleted.
+_DELETED_SUFFIX = ' (deleted)'
+_AT_FDCWD = -100
+
+# There's a single mark, so every event gets the same watch-descriptor.
+_WD = 1
+
+_DEFAULT_READ_BUFFER_SIZE = 64 * 1024
+
+# The paths of the directories that we've seen, by file-handle. This is only a
+# safety-net in case the filesystem is enormous.
+_MAXIMUM_CACHED_PATHS = 1024 * 1024
+
+_LOGGER = logging.getLogger(__name__)
+
+_is_bound = False
+_bind_lock = threading.Lock()
+
+
+def _bind():
+    global _is_bound
+
+    if _is_bound is True:
+        return
+
+    with _bind_lock:
+        if _is_bound is True:
+            return
+
+        library = inotify.library.get_instance()
+
+        fanotify_init = library.fanotify_init
+        fanotify_init.argtypes = [ctypes.c_uint, ctypes.c_uint]
+        fanotify_init.restype = inotify.calls._check_nonnegative
+
+        fanotify_mark = library.fanotify_mark
+        fanotify_mark.argtypes = [
+            ctypes.c_int,
+            ctypes.c_uint,
+            ctypes.c_uint64,
+            ctypes.c_int,
+            ctypes.c_char_p]
+
+        fanotify_mark.restype = inotify.calls._check_nonnegative
+
+        name_to_handle_at = library.name_to_handle_at
+        name_to_handle_at.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.c_int]
+
+        name_to_handle_at.restype = ctypes.c_int
+
+        # Failures are expected (for directories that have been deleted), so
+        # this doesn't raise.
+        open_by_handle_at = library.open_by_handle_at
+        open_by_handle_at.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        open_by_handle_at.restype = ctypes.c_int
+
+        globals().update({
+            '_fanotify_init': fanotify_init,
+            '_fanotify_mark': fanotify_mark,
+            '_name_to_handle_at': name_to_handle_at,
+            '_open_by_handle_at': open_by_handle_at,
+        })
+
+        _is_bound = True
+
+
+def _get_file_handle(path):
+    """Return the `struct file_handle` for the given path, or `None` if it's
+    gone.
+    """
+
+    buffer_ = ctypes.create_string_buffer(
+                _FILE_HANDLE_HEADER_STRUCT.size + _MAXIMUM_HANDLE_SIZE)
+
+    _FILE_HANDLE_HEADER_STRUCT.pack_into(buffer_, 0, _MAXIMUM_HANDLE_SIZE, 0)
+
+    mount_id = ctypes.c_int()
+    if _name_to_handle_at(
+            _AT_FDCWD,
+            path.encode('utf8'),
+            buffer_,
+            ctypes.byref(mount_id),
+            0) == -1:
+        return None
+
+    (handle_bytes, _) = _FILE_HANDLE_HEADER_STRUCT.unpack_from(buffer_, 0)
+    return buffer_.raw[:_FILE_HANDLE_HEADER_STRUCT.size + handle_bytes]
+
+
+class FanotifyTree(object):
+    """Recursively watch a path with a single mark on its filesystem. This
+    takes the same `mask` (of IN_* values) as the other trees, but see
+    `_DEFAULT_MASK`.
+
+    The events are reported for the paths (beneath the given one) that the
+    directories have when the events are read, and ones in directories that
+    have already been deleted are dropped unless we'd resolved the directory
+    before. There are no IN_IGNORED events.
+    """
+
+    def __init__(self, path, mask=_DEFAULT_MASK,
+                 block_duration_s=inotify.adapters._DEFAULT_EPOLL_BLOCK_DURATION_S,
+                 read_buffer_size=_DEFAULT_READ_BUFFER_SIZE,
+                 compact_events=False):
+        self.__fd = None
+        self.__mount_fd = None
+        self.__epoll = None
+
+        _bind()
+
+        start_s = time.time()
+
+        self.__path = path
+        self.__mask = mask & (_SUPPORTED_MASK | inotify.constants.IN_ISDIR)
+        self.__block_duration_s = block_duration_s
+        self.__read_buffer_size = read_buffer_size
+        self.__compact_events = compact_events
+
+        # The kernel reports resolved paths, so that's what we compare with.
+        self.__real_path = os.path.realpath(path)
+        self.__real_prefix = os.path.join(self.__real_path, '')
+
+        self.__paths = {}
+        self.__metrics = inotify.metrics.InotifyMetrics()
+        self.__pending = collections.deque()
+        self.__next_cookie = 1
+        self.__last_success_return = None
+
+        self.__fd = _fanotify_init(_DEFAULT_INIT_FLAGS, os.O_RDONLY | os.O_CLOEXEC)
+
+        try:
+            # The file-handles are opened relative to this.
+            self.__mount_fd = os.open(
+                                path,
+                                os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+
+            # If we can't open file-handles, then there's no point.
+            if self.__cache_directory(self.__real_path) is None:
+                raise inotify.calls.InotifyError(
+                        "Could not resolve file-handle: [{}]".format(path))
+
+            self.__is_renamed = self.__mark(path)
+
+            self.__epoll = select.epoll()
+            self.__epoll.register(self.__fd, select.POLLIN)
+        except:
+            self.close()
+            raise
+
+        self.__time_to_ready_s = time.time() - start_s
+
+        _LOGGER.debug("Filesystem of [%s] is marked (%d) after (%.3f) "
+                      "seconds.", path, self.__fd, self.__time_to_ready_s)
+
+    def __mark(self, path):
+        """Mark the filesystem. Returns whether renames are reported as one
+        event (FAN_RENAME) rather than as a moved-from and a moved-to.
+        """
+
+        mark_mask = self.__mask | _MINIMUM_MARK_MASK
+        base_mask = mark_mask & ~inotify.constants.IN_MOVE
+
+        try:
+            _fanotify_mark(
+                self.__fd,
+                _FAN_MARK_ADD | _FAN_MARK_FILESYSTEM,
+                base_mask | _FAN_RENAME,
+                _AT_FDCWD,
+                path.encode('utf8'))
+        except inotify.calls.InotifyError as e:
+            if e.errno != errno.EINVAL:
+                raise
+
+            # Older than 5.17.
+            _LOGGER.debug("FAN_RENAME isn't supported.")
+        else:
+            return True
+
+        _fanotify_mark(
+            self.__fd,
+            _FAN_MARK_ADD | _FAN_MARK_FILESYSTEM,
+            base_mask | inotify.constants.IN_MOVE,
+            _AT_FDCWD,
+            path.encode('utf8'))
+
+        return False
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if self.__epoll is not None:
+            self.__epoll.close()
+            self.__epoll = None
+
+        if self.__mount_fd is not None:
+            os.close(self.__mount_fd)
+            self.__mount_fd = None
+
+        if self.__fd is not None:
+            _LOGGER.debug("Cleaning-up fanotify.")
+
+            os.close(self.__fd)
+            self.__fd = None
+
+    def __cache(self, file_handle, real_path):
+        if len(self.__paths) >= _MAXIMUM_CACHED_PATHS:
+            self.__paths.clear()
+
+        self.__paths[file_handle] = real_path
+
+    def __cache_directory(self, real_path):
+        """Cache a directory before anything can happen to it. Returns its
+        path, or `None` if it's already gone.
+        """
+
+        file_handle = _get_file_handle(real_path)
+        if file_handle is None:
+            return None
+
+        self.__cache(file_handle, real_path)
+
+        # Make sure that we can open it.
+        if self.__resolve(file_handle, is_cached=False) is None:
+            return None
+
+        return real_path
+
+    def __resolve(self, file_handle, is_cached=True):
+        if is_cached is True:
+            real_path = self.__paths.get(file_handle)
+            if real_path is not None:
+                return real_path
+
+        fd = _open_by_handle_at(self.__mount_fd, file_handle, os.O_PATH)
+        if fd == -1:
+            return None
+
+        try:
+            # A directory that's been deleted can still be opened (while its
+            # inode lingers), but its link would be "<path> (deleted)".
+            if os.fstat(fd).st_nlink == 0:
+                return None
+
+            real_path = os.readlink('/proc/self/fd/{}'.format(fd))
+        finally:
+            os.close(fd)
+
+        if real_path.endswith(_DELETED_SUFFIX) is True:
+            return None
+
+        self.__cache(file_handle, real_path)
+        return real_path
+
+    def __move_cached(self, from_real_path, to_real_path):
+        """Update the cached paths of a renamed directory and everything
+        beneath it.
+        """
+
+        from_prefix = os.path.join(from_real_path, '')
+
+        for file_handle, real_path in list(self.__paths.items()):
+            if real_path == from_real_path:
+                self.__paths[file_handle] = to_real_path
+            elif real_path.startswith(from_prefix):
+                self.__paths[file_handle] = \
+                    os.path.join(to_real_path, real_path[len(from_prefix):])
+
+    def __forget_cached(self, real_path):
+        """Drop the cached paths of a directory that was moved somewhere that
+        we don't know about.
+        """
+
+        prefix = os.path.join(real_path, '')
+
+        for file_handle, cached_path in list(self.__paths.items()):
+            if cached_path == real_path or cached_path.startswith(prefix):
+                del self.__paths[file_handle]
+
+    def __get_tree_path(self, real_path):
+        """Return the path as it would be given beneath our tree, or `None` if
+        it's not in it.
+        """
+
+        if real_path == self.__real_path:
+            return self.__path
+        elif real_path.startswith(self.__real_prefix):
+            return os.path.join(self.__path, real_path[len(self.__real_prefix):])
+
+        return None
+
+    def __queue(self, mask, path, filename, cookie=0):
+        compact_events = self.__compact_events
+        is_dir = mask & inotify.constants.IN_ISDIR
+
+        for bit in _EVENT_ORDER:
+            if mask & bit & self.__mask:
+                self.__pending.append(
+                    inotify.events.make_event(
+                        compact_events,
+                        _WD,
+                        bit | is_dir,
+                        path,
+                        filename,
+                        cookie=cookie))
+
+    def __parse_records(self, data, offset, end):
+        """Return the file-handle and name of each of the event's records by
+        their types.
+        """
+
+        records = {}
+        while offset < end:
+            (info_type, _, length) = _INFO_HEADER_STRUCT.unpack_from(data, offset)
+
+            handle_offset = offset + _FILE_HANDLE_OFFSET
+            (handle_bytes, _) = \
+                _FILE_HANDLE_HEADER_STRUCT.unpack_from(data, handle_offset)
+
+            name_offset = \
+                handle_offset + _FILE_HANDLE_HEADER_STRUCT.size + handle_bytes
+
+            name_end = data.find(b'\0', name_offset, offset + length)
+            if name_end == -1:
+                name_end = offset + length
+
+            records[info_type] = (
+                data[handle_offset:name_offset],
+                data[name_offset:name_end].decode('utf8'),
+            )
+
+            offset += length
+
+        return records
+
+    def __handle_event(self, mask, file_handle, name):
+        """Queue events for something that happened within a directory (or to
+        it, if the name is "."). Returns whether it was for our tree, or
+        `None` if the directory couldn't be resolved.
+        """
+
+        real_path = self.__resolve(file_handle)
+        if real_path is None:
+            return None
+
+        if name == '.':
+            name = ''
+
+        path = self.__get_tree_path(real_path)
+        if path is None:
+            return False
+
+        if name and mask & inotify.constants.IN_ISDIR:
+            child_real_path = os.path.join(real_path, name)
+
+            if mask & inotify.constants.IN_CREATE:
+                self.__cache_directory(child_real_path)
+            elif mask & inotify.constants.IN_MOVED_FROM:
+                self.__forget_cached(child_real_path)
+
+        self.__queue(mask, path, name)
+
+        return True
+
+    def __handle_rename(self, mask, records):
+        """Queue a moved-from and a moved-to (with the same cookie) for
+        whichever sides of a rename are within our tree.
+        """
+
+        (from_file_handle, from_name) = records[_FAN_EVENT_INFO_TYPE_OLD_DFID_NAME]
+        (to_file_handle, to_name) = records[_FAN_EVENT_INFO_TYPE_NEW_DFID_NAME]
+
+        from_real_path = self.__resolve(from_file_handle)
+        to_real_path = self.__resolve(to_file_handle)
+
+        if from_real_path is None and to_real_path is None:
+            return None
+
+        is_dir = mask & inotify.constants.IN_ISDIR
+
+        if is_dir and from_real_path is not None:
+            if to_real_path is not None:
+                self.__move_cached(
+                    os.path.join(from_real_path, from_name),
+                    os.path.join(to_real_path, to_name))
+            else:
+                self.__forget_cached(os.path.join(from_real_path, from_name))
+
+        cookie = self.__next_cookie
+        self.__next_cookie += 1
+
+        is_included = False
+
+        if from_real_path is not None:
+            from_path = self.__get_tree_path(from_real_path)
+            if from_path is not None:
+                self.__queue(
+                    inotify.constants.IN_MOVED_FROM | is_dir,
+                    from_path,
+                    from_name,
+                    cookie=cookie)
+
+                is_included = True
+
+        if to_real_path is not None:
+            to_path = self.__get_tree_path(to_real_path)
+            if to_path is not None:
+                self.__queue(
+                    inotify.constants.IN_MOVED_TO | is_dir,
+                    to_path,
+                    to_name,
+                    cookie=cookie)
+
+                is_included = True
+
+        return is_included
+
+    def __decode(self, data):
+        """Queue the events for what was read."""
+
+        metrics = self.__metrics
+        is_timed = metrics.is_batch_sampled()
+
+        start_s = time.perf_counter()
+        queued = len(self.__pending)
+
+        dropped = 0
+        filtered = 0
+        overflows = 0
+
+        offset = 0
+        end = len(data)
+        while end - offset >= _METADATA_STRUCT.size:
+            (event_length, version, _, metadata_length, mask, fd, _) = \
+                _METADATA_STRUCT.unpack_from(data, offset)
+
+            if version != _FANOTIFY_METADATA_VERSION:
+                raise inotify.calls.InotifyError(
+                        "fanotify version not supported: ({})".format(
+                        version))
+
+            # With file-handles, there shouldn't be any file-descriptors.
+            if fd >= 0:
+                os.close(fd)
+
+            event_end = offset + event_length
+            records = self.__parse_records(data, offset + metadata_length, event_end)
+            offset = event_end
+
+            if mask & inotify.constants.IN_Q_OVERFLOW:
+                overflows += 1
+
+                self.__pending.append(
+                    inotify.events.make_event(
+                        self.__compact_events,
+                        -1,
+                        inotify.constants.IN_Q_OVERFLOW,
+                        None,
+                        ''))
+
+                continue
+
+            if mask & _FAN_RENAME:
+                result = self.__handle_rename(mask, records)
+            else:
+                record = records.get(_FAN_EVENT_INFO_TYPE_DFID_NAME)
+                if record is None:
+                    continue
+
+                (file_handle, name) = record
+                result = self.__handle_event(mask, file_handle, name)
+
+            if result is None:
+                dropped += 1
+            elif result is False:
+                filtered += 1
+
+        if is_timed is True:
+            decode_s = time.perf_counter() - start_s
+        else:
+            decode_s = None
+
+        metrics.record_batch(
+            len(self.__pending) - queued,
+            dropped,
+            overflows,
+            decode_s,
+            None)
+
+        if filtered:
+            metrics.record_filtered(filtered)
+
+    def __read(self):
+        """Read and decode whatever the kernel has. Returns whether there was
+        anything.
+        """
+
+        try:
+            data = os.read(self.__fd, self.__read_buffer_size)
+        except BlockingIOError:
+            return False
+
+        self.__metrics.record_read(len(data))
+        self.__decode(data)
+
+        return True
+
+    def read_events(self, max_events=None, timeout_s=0):
+        """Return the events that are waiting, like `Inotify.read_events()`."""
+
+        pending = self.__pending
+
+        if timeout_s is None:
+            timeout_s = -1
+
+        if not pending and self.__epoll.poll(timeout_s):
+            while self.__read() is True and \
+                  (max_events is None or len(pending) < max_events):
+                pass
+
+        count = len(pending)
+        if max_events is not None:
+            count = min(count, max_events)
+
+        return [pending.popleft() for _ in range(count)]
+
+    def event_gen(
+            self, timeout_s=None, yield_nones=True, filter_predicate=None,
+            terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS):
+        """Yield one event after another, like `Inotify.event_gen()`."""
+
+        self.__last_success_return = None
+
+        compact_events = self.__compact_events
+        terminal_mask = inotify.adapters._get_mask_for_names(terminal_events)
+        pending = self.__pending
+
+        last_hit_s = time.time()
+        while True:
+            if not pending:
+                is_ready = bool(self.__epoll.poll(self.__block_duration_s))
+
+                while is_ready is True and not pending and self.__read() is True:
+                    pass
+
+            while pending:
+                e = pending.popleft()
+                last_hit_s = time.time()
+
+                if compact_events is True:
+                    mask = e.mask
+                else:
+                    mask = e[0].mask
+
+                if filter_predicate is None and (mask & terminal_mask) == 0:
+                    yield e
+                    continue
+
+                if compact_events is True:
+                    type_names = e.type_names
+                else:
+                    type_names = e[1]
+
+                for type_name in type_names:
+                    if filter_predicate is not None and \
+                       filter_predicate(type_name, e) is False:
+                        self.__last_success_return = (type_name, e)
+                        return
+                    elif type_name in terminal_events:
+                        raise inotify.adapters.TerminalEventException(type_name, e)
+
+                yield e
+
+            if timeout_s is not None:
+                time_since_event_s = time.time() - last_hit_s
+                if time_since_event_s > timeout_s:
+                    break
+
+            if yield_nones is True:
+                yield None
+
+    @property
+    def last_success_return(self):
+        return self.__last_success_return
+
+    @property
+    def fd(self):
+        return self.__fd
+
+    @property
+    def compact_events(self):
+        return self.__compact_events
+
+    @property
+    def is_renames_paired(self):
+        """Whether moves have cookies (which requires Linux 5.17)."""
+
+        return self.__is_renamed
+
+    @property
+    def time_to_ready_s(self):
+        return self.__time_to_ready_s
+
+    @property
+    def cached_paths(self):
+        return len(self.__paths)
+
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    def stats(self):
+        """Return an `inotify.metrics.InotifyStats`. There's only ever the one
+        watch (the mark).
+        """
+
+        return self.__metrics.get_stats(self.__fd, 1, self.__read_buffer_size)
+
+
+def _create_tree(path, **kwargs):
+    """Return a `FanotifyTree`, or `None` if fanotify can't be used."""
+
+    try:
+        return FanotifyTree(path, **kwargs)
+    except (inotify.calls.InotifyError, OSError, AttributeError) as e:
+        _LOGGER.debug("fanotify can't be used: [%s] %s", path, e)
+        return None
+
+
+def is_supported(path):
+    """Return whether we can watch the filesystem that the given path is on
+    (i.e. the kernel is new enough and we have the capabilities).
+    """
+
+    tree = _create_tree(path, mask=inotify.constants.IN_CREATE)
+    if tree is None:
+        return False
+
+    tree.close()
+    return True
+
+
+def create_tree(path, mask=_DEFAULT_MASK,
+                block_duration_s=inotify.adapters._DEFAULT_EPOLL_BLOCK_DURATION_S,
+                compact_events=False):
+    """Return a `FanotifyTree` if it's supported and an
+    `inotify.adapters.InotifyTree` otherwise.
+    """
+
+    tree = _create_tree(
+            path,
+            mask=mask,
+            block_duration_s=block_duration_s,
+            compact_events=compact_events)
+
+    if tree is not None:
+        return tree
+
+    return inotify.adapters.InotifyTree(
+            path,
+            mask=mask,
+            block_duration_s=block_duration_s,
+            compact_events=compact_events)
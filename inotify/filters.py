@@ -0,0 +1,121 @@
+"""A declarative description of what a tree should watch. Excluded directories
+are never watched (or even crawled) and each directory can be watched with a
+narrower mask, so the events that we don't want are never produced by the
+kernel in the first place.
+
+Patterns are globs. A pattern without a slash is matched against the name of
+the file or directory (like "node_modules" or "*.pyc"); a pattern with a slash
+is matched against the whole path.
+"""
+
+import fnmatch
+import os
+import re
+
+import inotify.constants
+
+
+def _compile(patterns):
+    """Return a function that checks a path against all of the given
+    patterns at once, or `None` if there aren't any.
+    """
+
+    if not patterns:
+        return None
+
+    name_patterns = [p for p in patterns if '/' not in p]
+    path_patterns = [p for p in patterns if '/' in p]
+
+    def compile_(patterns_):
+        if not patterns_:
+            return None
+
+        expression = '|'.join(fnmatch.translate(p) for p in patterns_)
+        return re.compile(expression).match
+
+    match_name = compile_(name_patterns)
+    match_path = compile_(path_patterns)
+
+    def matches(path):
+        if match_name is not None and \
+           match_name(os.path.basename(path)) is not None:
+            return True
+
+        if match_path is not None and match_path(path) is not None:
+            return True
+
+        return False
+
+    return matches
+
+
+class FilterSpec(object):
+    """`mask`, if given, replaces the mask that the tree was constructed with.
+
+    Directories matching `exclude` aren't watched, and nothing beneath them
+    is. Events for files matching `exclude` are dropped and, if `include` is
+    given, so are events for files that don't match it (this part still
+    happens after we've read the events, but directories are unaffected so
+    the tree still sees everything that it needs).
+
+    `subtree_masks` is a dictionary of patterns to masks. A directory that
+    matches one (the first, in order) is watched with that mask, as is
+    everything beneath it unless it matches another.
+    """
+
+    def __init__(self, mask=None, include=None, exclude=None,
+                 subtree_masks=None):
+        self.__mask = mask
+
+        self.__include = _compile(include)
+        self.__exclude = _compile(exclude)
+
+        subtree_masks = subtree_masks or {}
+
+        self.__subtree_masks = [
+            (_compile([pattern]), subtree_mask)
+            for pattern, subtree_mask
+            in subtree_masks.items()
+        ]
+
+    @property
+    def mask(self):
+        return self.__mask
+
+    @property
+    def has_event_filter(self):
+        return self.__include is not None or self.__exclude is not None
+
+    def is_excluded(self, path):
+        """Whether the given directory should be left unwatched."""
+
+        return self.__exclude is not None and self.__exclude(path) is True
+
+    def get_directory_mask(self, path):
+        """Return the mask for the given directory if it starts a subtree with
+        its own mask, else `None`.
+        """
+
+        for matches, subtree_mask in self.__subtree_masks:
+            if matches(path) is True:
+                return subtree_mask
+
+        return None
+
+    def is_event_included(self, mask, path, filename):
+        """Whether an event should be passed along."""
+
+        if not filename:
+            return True
+
+        full_path = os.path.join(path, filename)
+
+        if self.__exclude is not None and self.__exclude(full_path) is True:
+            return False
+
+        if self.__include is not None and \
+           (mask & inotify.constants.IN_ISDIR) == 0 and \
+           self.__include(full_path) is False:
+            return False
+
+        return True
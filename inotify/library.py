@@ -1,8 +1,73 @@
+"""Load the C library (for the inotify calls) the first time that it's needed
+rather than at import.
+
+`ctypes.util.find_library()` can run `ldconfig` or a compiler in a
+subprocess, which is slow, so it's only used if the library can't be found
+otherwise.
+"""
+
 import ctypes
-import ctypes.util
+import logging
+import threading
+
+# What's tried, in order. `None` is whatever is already loaded into the
+# process, which includes the C library.
+_CANDIDATES = (
+    None,
+    'libc.so.6',
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_instance = None
+_lock = threading.Lock()
+
+
+def _load(filepath):
+    try:
+        library = ctypes.CDLL(filepath, use_errno=True)
+    except OSError:
+        return None
+
+    if getattr(library, 'inotify_init1', None) is None:
+        return None
+
+    return library
+
+
+def _find():
+    for filepath in _CANDIDATES:
+        library = _load(filepath)
+        if library is not None:
+            return library
+
+    import ctypes.util
+
+    filepath = ctypes.util.find_library('c')
+    if filepath is not None:
+        library = _load(filepath)
+        if library is not None:
+            return library
+
+    raise EnvironmentError("Could not find a C library with inotify support")
+
+
+def get_instance():
+    global _instance
+
+    if _instance is None:
+        with _lock:
+            if _instance is None:
+                _instance = _find()
+
+                _LOGGER.debug("Loaded C library: [%s]", _instance._name)
+
+    return _instance
+
 
-_FILEPATH = ctypes.util.find_library('c')
-if _FILEPATH is None:
-    _FILEPATH = 'libc.so.6'
+def __getattr__(name):
+    # This used to be loaded at import.
+    if name == 'instance':
+        return get_instance()
 
-instance = ctypes.CDLL(_FILEPATH, use_errno=True)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
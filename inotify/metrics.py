@@ -0,0 +1,362 @@
+"""Runtime metrics for a watcher. The counters and histograms are updated once
+per read and once per batch of decoded events rather than for every event, so
+this is cheap enough to always be on.
+
+Durations are kept in log-linear histograms (the scheme used by
+HdrHistogram): fixed memory, constant-time recording, and a bounded relative
+error for every value in range.
+
+The statistics can be written in the Prometheus text-format (e.g. for the
+node-exporter's textfile collector) without any additional dependencies.
+"""
+
+import collections
+import os
+import tempfile
+
+import inotify.calls
+
+_MAXIMUM_USER_WATCHES_FILEPATH = '/proc/sys/fs/inotify/max_user_watches'
+
+# Durations are recorded in microseconds up to a minute, with 8 bits of
+# precision (a relative error of less than 1%).
+_DEFAULT_HISTOGRAM_UNIT_S = 1e-6
+_DEFAULT_HISTOGRAM_HIGHEST_S = 60
+_DEFAULT_HISTOGRAM_PRECISION_BITS = 8
+
+# Only one in this many batches has its decoding timed.
+_DECODE_SAMPLE_INTERVAL = 16
+
+# Read sizes are recorded in bytes, up to the largest queue that the kernel
+# can have by default (16K maximally-sized events).
+_MAXIMUM_READ_BYTES = 16 * 1024 * (16 + 256)
+
+_DEFAULT_PROMETHEUS_PREFIX = 'inotify'
+_DEFAULT_PROMETHEUS_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+InotifyStats = collections.namedtuple(
+                'InotifyStats',
+                [
+                    'reads',
+                    'bytes_read',
+                    'read_bytes',
+                    'read_buffer_size',
+                    'events_read',
+                    'events_per_read',
+                    'events_dropped',
+                    'events_filtered',
+                    'overflows',
+                    'watches',
+                    'maximum_watches',
+                    'queued_bytes',
+                    'decode_s',
+                    'handler_lag_s',
+                ])
+
+# The name, type, and description of each of the statistics when exported.
+_PROMETHEUS_METRICS = [
+    ('reads', 'counter', "Reads from the inotify handle"),
+    ('bytes_read', 'counter', "Bytes read from the inotify handle"),
+    ('read_bytes', 'summary', "Bytes returned by each read"),
+    ('read_buffer_size', 'gauge', "The current size of the read-buffer"),
+    ('events_read', 'counter', "Events decoded and delivered"),
+    ('events_per_read', 'gauge', "Average events delivered per read"),
+    ('events_dropped', 'counter', "Events for watches that are no longer known"),
+    ('events_filtered', 'counter', "Events excluded by a filter"),
+    ('overflows', 'counter', "Kernel queue overflows"),
+    ('watches', 'gauge', "Active watches"),
+    ('maximum_watches', 'gauge', "The per-user watch limit (max_user_watches)"),
+    ('queued_bytes', 'gauge', "Bytes of events waiting in the kernel"),
+    ('decode_s', 'summary', "Time spent decoding a (sampled) batch of events"),
+    ('handler_lag_s', 'summary',
+     "Time from reading a batch of events until they were all handled"),
+]
+
+
+def get_maximum_user_watches():
+    """Return the per-user watch limit, or `None` if it can't be read."""
+
+    try:
+        with open(_MAXIMUM_USER_WATCHES_FILEPATH) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+class Histogram(object):
+    """Record non-negative values (e.g. durations) into log-linear buckets.
+    Values are counted in multiples of `unit` and anything above `highest` is
+    recorded as `highest`.
+    """
+
+    def __init__(self, unit=_DEFAULT_HISTOGRAM_UNIT_S,
+                 highest=_DEFAULT_HISTOGRAM_HIGHEST_S,
+                 precision_bits=_DEFAULT_HISTOGRAM_PRECISION_BITS):
+        self.__unit = unit
+        self.__precision_bits = precision_bits
+
+        # Values below this are counted exactly. Above it, each doubling of
+        # the value is split into half this many buckets.
+        self.__sub_bucket_count = 1 << precision_bits
+
+        self.__highest_units = int(highest / unit)
+
+        self.__counts = [0] * (self.__get_index(self.__highest_units) + 1)
+        self.__count = 0
+        self.__sum = 0
+        self.__max = 0
+
+    def __get_index(self, units):
+        if units < self.__sub_bucket_count:
+            return units
+
+        shift = units.bit_length() - self.__precision_bits
+
+        return self.__sub_bucket_count + \
+               (shift - 1) * (self.__sub_bucket_count >> 1) + \
+               (units >> shift) - (self.__sub_bucket_count >> 1)
+
+    def __get_highest_units(self, index):
+        """Return the largest value (in units) that maps to the given
+        bucket.
+        """
+
+        if index < self.__sub_bucket_count:
+            return index
+
+        half_count = self.__sub_bucket_count >> 1
+        offset = index - self.__sub_bucket_count
+
+        shift = offset // half_count + 1
+        sub_bucket = offset % half_count + half_count
+
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value):
+        units = min(int(value / self.__unit), self.__highest_units)
+        self.__counts[self.__get_index(units)] += 1
+
+        self.__count += 1
+        self.__sum += value
+
+        if value > self.__max:
+            self.__max = value
+
+    def merge(self, other):
+        """Add the values recorded by another histogram with the same
+        configuration.
+        """
+
+        for index, count in enumerate(other.__counts):
+            self.__counts[index] += count
+
+        self.__count += other.__count
+        self.__sum += other.__sum
+        self.__max = max(self.__max, other.__max)
+
+    def copy(self):
+        histogram = Histogram(
+                        unit=self.__unit,
+                        highest=self.__highest_units * self.__unit,
+                        precision_bits=self.__precision_bits)
+
+        histogram.merge(self)
+
+        return histogram
+
+    def get_percentile(self, percentile):
+        """Return the value at the given percentile (0-100). This is the
+        largest value that is equivalent to the ones that were recorded, so it
+        never under-reports.
+        """
+
+        if self.__count == 0:
+            return 0
+
+        target = max(1, int(round(percentile / 100.0 * self.__count)))
+
+        seen = 0
+        for index, count in enumerate(self.__counts):
+            seen += count
+            if seen >= target:
+                value = (self.__get_highest_units(index) + 1) * self.__unit
+                return min(value, self.__max)
+
+        return self.__max
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def sum(self):
+        return self.__sum
+
+    @property
+    def max(self):
+        return self.__max
+
+    @property
+    def mean(self):
+        if self.__count == 0:
+            return 0
+
+        return self.__sum / self.__count
+
+
+class InotifyMetrics(object):
+    """The counters and histograms kept by an `Inotify`."""
+
+    def __init__(self):
+        self.reads = 0
+        self.bytes_read = 0
+        self.events_read = 0
+        self.events_dropped = 0
+        self.events_filtered = 0
+        self.overflows = 0
+
+        self.read_bytes = Histogram(unit=1, highest=_MAXIMUM_READ_BYTES)
+        self.decode_s = Histogram()
+        self.handler_lag_s = Histogram()
+
+        self.__batches = 0
+
+    def record_read(self, length):
+        self.reads += 1
+        self.bytes_read += length
+
+        self.read_bytes.record(length)
+
+    def is_batch_sampled(self):
+        """Return whether the decoding of the next batch should be timed."""
+
+        return self.__batches % _DECODE_SAMPLE_INTERVAL == 0
+
+    def record_batch(self, events, dropped, overflows, decode_s, lag_s):
+        """Record a batch of decoded events. `decode_s` is `None` if the batch
+        wasn't sampled. `lag_s` is how long it's been since they were read (or
+        `None` if that doesn't apply).
+        """
+
+        self.__batches += 1
+
+        self.events_read += events
+        self.events_dropped += dropped
+        self.overflows += overflows
+
+        if decode_s is not None:
+            self.decode_s.record(decode_s)
+
+        if lag_s is not None:
+            self.handler_lag_s.record(lag_s)
+
+    def record_filtered(self, count=1):
+        self.events_filtered += count
+
+    def get_stats(self, fd, watches, read_buffer_size):
+        """Return an `InotifyStats` for the given handle (if there is one).
+        The histograms are copies.
+        """
+
+        if self.reads == 0:
+            events_per_read = 0
+        else:
+            events_per_read = self.events_read / self.reads
+
+        if fd is None:
+            queued_bytes = None
+        else:
+            queued_bytes = inotify.calls.inotify_get_queued_bytes(fd)
+
+        return InotifyStats(
+                reads=self.reads,
+                bytes_read=self.bytes_read,
+                read_bytes=self.read_bytes.copy(),
+                read_buffer_size=read_buffer_size,
+                events_read=self.events_read,
+                events_per_read=events_per_read,
+                events_dropped=self.events_dropped,
+                events_filtered=self.events_filtered,
+                overflows=self.overflows,
+                watches=watches,
+                maximum_watches=get_maximum_user_watches(),
+                queued_bytes=queued_bytes,
+                decode_s=self.decode_s.copy(),
+                handler_lag_s=self.handler_lag_s.copy())
+
+
+def _format_labels(labels, extra=None):
+    items = sorted(labels.items())
+    if extra is not None:
+        items.append(extra)
+
+    if not items:
+        return ''
+
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value
+        in items) + '}'
+
+
+def format_prometheus(stats, prefix=_DEFAULT_PROMETHEUS_PREFIX, labels={},
+                      quantiles=_DEFAULT_PROMETHEUS_QUANTILES):
+    """Return the given `InotifyStats` in the Prometheus text-format. Each
+    histogram is exported as a summary with the given quantiles, and the
+    counters have the conventional "_total" suffix. Statistics that aren't
+    available are omitted.
+    """
+
+    lines = []
+    for field, type_, description in _PROMETHEUS_METRICS:
+        value = getattr(stats, field)
+        if value is None:
+            continue
+
+        name = '{}_{}'.format(prefix, field)
+        if type_ == 'counter':
+            name += '_total'
+
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, type_))
+
+        if type_ != 'summary':
+            lines.append('{}{} {}'.format(name, _format_labels(labels), value))
+            continue
+
+        for quantile in quantiles:
+            lines.append('{}{} {}'.format(
+                         name,
+                         _format_labels(labels, ('quantile', quantile)),
+                         value.get_percentile(quantile * 100)))
+
+        lines.append('{}_sum{} {}'.format(name, _format_labels(labels), value.sum))
+        lines.append('{}_count{} {}'.format(name, _format_labels(labels), value.count))
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(filepath, stats, **kwargs):
+    """Write the statistics in the Prometheus text-format. The file is
+    replaced atomically so that a collector never sees a partial one.
+    """
+
+    text = format_prometheus(stats, **kwargs)
+
+    (fd, temp_filepath) = tempfile.mkstemp(
+                            dir=os.path.dirname(os.path.abspath(filepath)),
+                            prefix='.' + os.path.basename(filepath))
+
+    try:
+        # `mkstemp()` only makes it readable by us.
+        os.fchmod(fd, 0o644)
+
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+
+        os.replace(temp_filepath, filepath)
+    except:
+        os.unlink(temp_filepath)
+        raise
@@ -0,0 +1,160 @@
+"""Determine which filesystem each path is on (from `/proc/self/mountinfo`) so
+that we know where inotify is blind. On network and FUSE filesystems, changes
+that are made by other clients (or by the server) never produce events.
+"""
+
+import collections
+import logging
+import os
+import re
+
+_MOUNTINFO_FILEPATH = '/proc/self/mountinfo'
+
+# Filesystems whose changes can come from somewhere other than this kernel.
+_BLIND_FILESYSTEM_TYPES = set([
+    '9p',
+    'afs',
+    'ceph',
+    'cifs',
+    'coda',
+    'davfs',
+    'fuse',
+    'glusterfs',
+    'gpfs',
+    'lustre',
+    'ncpfs',
+    'nfs',
+    'nfs4',
+    'smb3',
+    'smbfs',
+    'sshfs',
+    'vboxsf',
+    'vmhgfs',
+])
+
+# FUSE filesystems are reported as "fuse.<name>" (e.g. "fuse.sshfs"). The ones
+# that are backed by a local block-device ("fuseblk", e.g. NTFS) only change
+# through the kernel.
+_BLIND_FILESYSTEM_TYPE_PREFIX = 'fuse.'
+
+_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+_LOGGER = logging.getLogger(__name__)
+
+MountInfo = collections.namedtuple(
+                'MountInfo',
+                [
+                    'mount_point',
+                    'filesystem_type',
+                    'source',
+                ])
+
+
+def _unescape(value):
+    """The kernel escapes spaces, tabs, newlines, and backslashes as octal."""
+
+    return _ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)), value)
+
+
+def read_mounts(filepath=_MOUNTINFO_FILEPATH):
+    """Return a `MountInfo` for every mount. Returns an empty list if the
+    mount-table can't be read.
+    """
+
+    try:
+        with open(filepath) as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        _LOGGER.warning("Could not read mounts: [%s] %s", filepath, e)
+        return []
+
+    mounts = []
+    for line in lines:
+        fields = line.split(' ')
+
+        # There's a variable number of optional fields before the separator.
+        try:
+            separator_index = fields.index('-', 6)
+        except ValueError:
+            continue
+
+        mount = MountInfo(
+                    mount_point=_unescape(fields[4]),
+                    filesystem_type=fields[separator_index + 1],
+                    source=_unescape(fields[separator_index + 2]))
+
+        mounts.append(mount)
+
+    return mounts
+
+
+def is_blind(mount):
+    filesystem_type = mount.filesystem_type
+
+    return filesystem_type in _BLIND_FILESYSTEM_TYPES or \
+           filesystem_type.startswith(_BLIND_FILESYSTEM_TYPE_PREFIX)
+
+
+def _is_within(path, mount_point):
+    if mount_point == '/':
+        return True
+
+    return path == mount_point or path.startswith(mount_point + '/')
+
+
+def get_mount(path, mounts):
+    """Return the mount that the given (absolute) path is on, or `None`."""
+
+    best = None
+    for mount in mounts:
+        if _is_within(path, mount.mount_point) is False:
+            continue
+
+        if best is None or len(mount.mount_point) >= len(best.mount_point):
+            best = mount
+
+    return best
+
+
+def get_is_blind_cb(paths, mounts=None):
+    """If any of the given trees are on (or contain) a filesystem where
+    inotify is blind, return a function that tells whether a path within them
+    is. Otherwise, return `None`. Symlinks aren't resolved.
+    """
+
+    if mounts is None:
+        mounts = read_mounts()
+
+    paths = [os.path.abspath(path) for path in paths]
+
+    # Only the mounts that are blind and the ones beneath them matter.
+    blind_mount_points = [
+        mount.mount_point
+        for mount
+        in mounts
+        if is_blind(mount) is True
+    ]
+
+    relevant_mounts = [
+        mount
+        for mount
+        in mounts
+        if any(
+            _is_within(mount.mount_point, mount_point)
+            for mount_point
+            in blind_mount_points)
+    ]
+
+    def is_blind_cb(path):
+        mount = get_mount(os.path.abspath(path), relevant_mounts)
+        return mount is not None and is_blind(mount) is True
+
+    for path in paths:
+        if is_blind_cb(path) is True:
+            return is_blind_cb
+
+        for mount_point in blind_mount_points:
+            if _is_within(mount_point, path) is True:
+                return is_blind_cb
+
+    return None
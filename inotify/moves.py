@@ -0,0 +1,236 @@
+"""Join the two halves of a rename (IN_MOVED_FROM and IN_MOVED_TO, which share
+a cookie) into a single `MovedEvent`. Halves that are never matched (because
+the other side was outside of what we're watching) are reported as deletes and
+creates once they've waited long enough.
+
+This wraps the generator from any of the `event_gen()` methods:
+
+    for event in inotify.moves.correlate(i.event_gen(yield_nones=True)):
+        ...
+
+Everything other than a move is passed through as soon as it arrives, after
+any moved-from for the same file that's still waiting (as a delete).
+"""
+
+import collections
+import logging
+import os
+import time
+
+import inotify.constants
+import inotify.events
+
+_DEFAULT_WINDOW_S = 0.5
+_DEFAULT_MAXIMUM_PENDING = 4096
+
+_LOGGER = logging.getLogger(__name__)
+
+MovedEvent = collections.namedtuple(
+                'MovedEvent',
+                [
+                    'src',
+                    'dst',
+                    'is_dir',
+                    'cookie',
+                    'from_event',
+                    'to_event',
+                ])
+
+
+def _get_header(event):
+    """Both the tuples and the compact events have `mask` and `cookie` at the
+    front.
+    """
+
+    if type(event) is tuple:
+        return event[0]
+
+    return event
+
+
+def _get_full_path(event):
+    (_, _, path, filename) = event
+    return os.path.join(path, filename)
+
+
+def _get_key(event):
+    """Return what identifies the file that an event is for."""
+
+    if type(event) is tuple:
+        return (event[0].wd, event[3])
+
+    return (event.wd, event.filename_bytes)
+
+
+def _replace_mask(event, mask):
+    if type(event) is tuple:
+        (header, _, path, filename) = event
+
+        return (
+            header._replace(mask=mask),
+            inotify.events._get_event_names(mask),
+            path,
+            filename)
+
+    return inotify.events.InotifyEvent(
+            event.wd,
+            mask,
+            event.cookie,
+            event.len,
+            event.path,
+            event.filename_bytes)
+
+
+class MoveCorrelator(object):
+    """Pending moved-froms are kept, in arrival order, for up to `window_s`
+    seconds. At most `maximum_pending` are kept; beyond that, the oldest are
+    given up on early.
+    """
+
+    def __init__(self, window_s=_DEFAULT_WINDOW_S,
+                 maximum_pending=_DEFAULT_MAXIMUM_PENDING):
+        self.__window_s = window_s
+        self.__maximum_pending = maximum_pending
+
+        # Cookies to (deadline, event).
+        self.__pending = collections.OrderedDict()
+
+        # How many pending moved-froms there are for each file.
+        self.__pending_keys = collections.Counter()
+
+    def __len__(self):
+        return len(self.__pending)
+
+    def __unmatched_from(self, event):
+        mask = _get_header(event).mask
+        mask &= ~inotify.constants.IN_MOVED_FROM
+
+        return _replace_mask(event, mask | inotify.constants.IN_DELETE)
+
+    def __unmatched_to(self, event):
+        mask = _get_header(event).mask
+        mask &= ~inotify.constants.IN_MOVED_TO
+
+        return _replace_mask(event, mask | inotify.constants.IN_CREATE)
+
+    def __pop(self, cookie):
+        (_, event) = self.__pending.pop(cookie)
+
+        key = _get_key(event)
+        self.__pending_keys[key] -= 1
+        if self.__pending_keys[key] == 0:
+            del self.__pending_keys[key]
+
+        return event
+
+    def __flush_key(self, key, cookie):
+        """Give up on the moved-froms for the given file (other than the one
+        with the given cookie), so that they're emitted (as deletes) before
+        anything that happened to it afterwards.
+        """
+
+        cookies = [
+            pending_cookie
+            for pending_cookie, (_, event)
+            in self.__pending.items()
+            if pending_cookie != cookie and _get_key(event) == key
+        ]
+
+        return [
+            self.__unmatched_from(self.__pop(cookie))
+            for cookie
+            in cookies
+        ]
+
+    def flush(self, now=None):
+        """Give up on the moved-froms that have waited too long and return them
+        as deletes. If `now` is `None`, give up on all of them.
+        """
+
+        flushed = []
+        while self.__pending:
+            cookie, (deadline, _) = next(iter(self.__pending.items()))
+            if now is not None and deadline > now:
+                break
+
+            flushed.append(self.__unmatched_from(self.__pop(cookie)))
+
+        return flushed
+
+    def process(self, event):
+        """Return what should be emitted for the given event (which may be
+        `None`, to indicate that time has passed).
+        """
+
+        output = []
+
+        if self.__pending:
+            output += self.flush(now=time.monotonic())
+
+        if event is None:
+            return output
+
+        header = _get_header(event)
+        mask = header.mask
+
+        if mask & inotify.constants.IN_MOVED_FROM:
+            self.__pending[header.cookie] = \
+                (time.monotonic() + self.__window_s, event)
+
+            self.__pending_keys[_get_key(event)] += 1
+
+            if len(self.__pending) > self.__maximum_pending:
+                _LOGGER.warning("Too many unmatched moves. Giving up on the "
+                                "oldest.")
+
+                oldest_cookie = next(iter(self.__pending))
+                output.append(self.__unmatched_from(self.__pop(oldest_cookie)))
+
+            return output
+
+        # Anything else that happens to a file that was moved away (e.g. it's
+        # recreated) means that the move wasn't within what we're watching.
+        if self.__pending_keys:
+            key = _get_key(event)
+            if key in self.__pending_keys:
+                output += self.__flush_key(key, header.cookie)
+
+        if mask & inotify.constants.IN_MOVED_TO:
+            if header.cookie not in self.__pending:
+                output.append(self.__unmatched_to(event))
+            else:
+                from_event = self.__pop(header.cookie)
+
+                output.append(
+                    MovedEvent(
+                        src=_get_full_path(from_event),
+                        dst=_get_full_path(event),
+                        is_dir=(mask & inotify.constants.IN_ISDIR) != 0,
+                        cookie=header.cookie,
+                        from_event=from_event,
+                        to_event=event))
+        else:
+            output.append(event)
+
+        return output
+
+
+def correlate(events, window_s=_DEFAULT_WINDOW_S,
+              maximum_pending=_DEFAULT_MAXIMUM_PENDING):
+    """Wrap an event generator and yield `MovedEvent`s in place of matched
+    pairs of moves. Unmatched halves are only given up on when something else
+    arrives, so pass `yield_nones=True` to the wrapped generator if you want
+    that to happen promptly. `None`s are passed through.
+    """
+
+    correlator = MoveCorrelator(
+                    window_s=window_s,
+                    maximum_pending=maximum_pending)
+
+    for event in events:
+        yield from correlator.process(event)
+
+        if event is None:
+            yield None
+
+    yield from correlator.flush()
@@ -0,0 +1,493 @@
+"""Produce the same events as `inotify.adapters.Inotify` by periodically
+scanning the watched directories. This is for filesystems where the kernel
+can't see changes because they can be made somewhere else (e.g. NFS, SMB, and
+FUSE mounts).
+
+Each scan only costs a stat() for a directory that hasn't changed; it's only
+re-listed if its mtime has. If the mask includes IN_MODIFY, IN_ATTRIB, or
+IN_CLOSE_WRITE, the directories are always re-listed and their files stat'd so
+that changes to them can be found, too.
+
+This is an approximation. Moves are reported as deletes and creates, opens and
+reads aren't seen, a file that's written and closed produces both IN_MODIFY
+and IN_CLOSE_WRITE, and anything that comes and goes between scans is missed.
+"""
+
+import collections
+import logging
+import os
+import time
+
+from errno import ENOENT, ENOTDIR
+
+import inotify.calls
+import inotify.constants
+import inotify.events
+import inotify.metrics
+import inotify.snapshot
+import inotify.watches
+
+_DEFAULT_POLL_INTERVAL_S = 1
+
+# The events that require the files in a directory to be stat'd.
+_FILE_MASK = \
+    inotify.constants.IN_MODIFY | \
+    inotify.constants.IN_ATTRIB | \
+    inotify.constants.IN_CLOSE_WRITE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _list(path, with_files):
+    """Return the stat-result of the directory, a dictionary of its children's
+    names to whether they're directories, and (if requested) a dictionary of
+    its files' names to their (mtime, size, ctime). Returns `None` if the
+    directory has disappeared.
+    """
+
+    children = {}
+
+    if with_files is True:
+        files = {}
+    else:
+        files = None
+
+    try:
+        # We stat before listing so that anything that changes while we list
+        # will still make the directory look modified later.
+        stat_result = os.stat(path)
+
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                children[entry.name] = is_dir
+
+                if files is None or is_dir is True:
+                    continue
+
+                try:
+                    file_stat_result = entry.stat()
+                except OSError:
+                    continue
+
+                files[entry.name] = (
+                    file_stat_result.st_mtime_ns,
+                    file_stat_result.st_size,
+                    file_stat_result.st_ctime_ns,
+                )
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+    return (stat_result, children, files)
+
+
+class _PolledDirectory(object):
+    __slots__ = (
+        'mask',
+        'state',
+        'files',
+    )
+
+    def __init__(self, mask, state, files):
+        self.mask = mask
+
+        # An `inotify.snapshot.DirectoryState`.
+        self.state = state
+
+        # `None` if the mask doesn't need the files to be stat'd.
+        self.files = files
+
+
+class PollingInotify(object):
+    """Watch directories by scanning them every `poll_interval_s` seconds.
+    If `directories_per_poll` is given, each scan only looks at that many
+    directories (in rotation) to bound its cost. Watch-descriptors are
+    assigned starting from `first_wd`.
+
+    Only directories can be watched.
+    """
+
+    def __init__(self, paths=[], poll_interval_s=_DEFAULT_POLL_INTERVAL_S,
+                 directories_per_poll=None, compact_events=False, first_wd=1):
+        self.__poll_interval_s = poll_interval_s
+        self.__directories_per_poll = directories_per_poll
+        self.__compact_events = compact_events
+
+        self.__watches = inotify.watches.WatchIndex()
+        self.__metrics = inotify.metrics.InotifyMetrics()
+
+        self.__directories = {}
+        self.__next_wd = first_wd
+
+        # Watch-descriptors in the order that they're scanned. Ones that have
+        # been removed are dropped when they come around.
+        self.__rotation = collections.deque()
+
+        # Directories that the last scan found to have been created. If one
+        # is then watched, everything in it is reported as created.
+        self.__created_paths = set()
+
+        self.__pending = collections.deque()
+        self.__next_poll_s = time.monotonic() + poll_interval_s
+
+        self.__last_success_return = None
+
+        for path in paths:
+            self.add_watch(path)
+
+    def __queue(self, wd, mask, path, filename, watch_mask):
+        if mask & watch_mask & ~inotify.constants.IN_ISDIR or \
+           mask & inotify.constants.IN_IGNORED:
+            event = inotify.events.make_event(
+                        self.__compact_events, wd, mask, path, filename)
+
+            self.__pending.append(event)
+
+    def add_watch(self, path_unicode, mask=inotify.constants.IN_ALL_EVENTS):
+        _LOGGER.debug("Adding polled watch: [%s]", path_unicode)
+
+        if path_unicode in self.__watches:
+            _LOGGER.warning("Path already being watched: [%s]", path_unicode)
+            return
+
+        result = _list(path_unicode, (mask & _FILE_MASK) != 0)
+        if result is None:
+            errno_ = ENOENT if os.path.exists(path_unicode) is False else ENOTDIR
+
+            raise inotify.calls.InotifyError(
+                    "Could not add watch: [{}]".format(path_unicode),
+                    errno=errno_)
+
+        (stat_result, children, files) = result
+
+        wd = self.__next_wd
+        self.__next_wd += 1
+
+        is_racy = time.time_ns() - stat_result.st_mtime_ns < \
+                  inotify.snapshot._RACY_WINDOW_NS
+
+        state = inotify.snapshot.DirectoryState(
+                    stat_result.st_ino,
+                    stat_result.st_mtime_ns,
+                    children,
+                    is_racy=is_racy)
+
+        self.__directories[wd] = _PolledDirectory(mask, state, files)
+        self.__watches.add(path_unicode, wd)
+        self.__rotation.append(wd)
+
+        _LOGGER.debug("Added polled watch (%d): [%s]", wd, path_unicode)
+
+        # It was created since the last scan, so everything in it is new.
+        if path_unicode in self.__created_paths:
+            self.__created_paths.discard(path_unicode)
+
+            for name, is_dir in children.items():
+                event_mask = inotify.constants.IN_CREATE
+
+                if is_dir is True:
+                    event_mask |= inotify.constants.IN_ISDIR
+                    self.__created_paths.add(os.path.join(path_unicode, name))
+
+                self.__queue(wd, event_mask, path_unicode, name, mask)
+
+        return wd
+
+    def add_watches(self, paths, mask=inotify.constants.IN_ALL_EVENTS):
+        """Add watches for all of the given paths. Returns a dictionary of
+        paths to watch-descriptors and a dictionary of paths to errno-values
+        for the ones that failed. Paths that are already being watched are
+        skipped.
+        """
+
+        watches = {}
+        errors = {}
+        for path in paths:
+            if path in self.__watches:
+                continue
+
+            try:
+                watches[path] = self.add_watch(path, mask)
+            except inotify.calls.InotifyError as e:
+                errors[path] = e.errno
+
+        return watches, errors
+
+    def get_watch_id(self, path):
+        return self.__watches.get_wd(path)
+
+    def get_watch_path(self, wd):
+        return self.__watches.get_path(wd)
+
+    def move_watch(self, from_path, to_path):
+        wd = self.__watches.get_wd(from_path)
+        if wd is None:
+            return
+
+        _LOGGER.debug("Moving polled watch (%d): [%s] => [%s]",
+                      wd, from_path, to_path)
+
+        self.__watches.move(wd, to_path)
+
+    def remove_watch_tree(self, path, superficial=False):
+        wd = self.__watches.get_wd(path)
+        if wd is None:
+            return
+
+        for wd in self.__watches.get_subtree(wd):
+            self.remove_watch_with_id(wd, superficial)
+
+    def remove_watch(self, path, superficial=False):
+        wd = self.__watches.get_wd(path)
+        if wd is None:
+            return
+
+        self.remove_watch_with_id(wd, superficial)
+
+    def remove_watch_with_id(self, wd, superficial=False):
+        """Stop polling the directory. Like the kernel, an IN_IGNORED is
+        produced unless the removal is superficial.
+        """
+
+        path = self.__watches.get_path(wd)
+
+        self.__watches.remove(wd)
+        directory = self.__directories.pop(wd, None)
+
+        if superficial is False and directory is not None:
+            self.__queue(wd, inotify.constants.IN_IGNORED, path, '', directory.mask)
+
+    def __scan(self, wd, directory):
+        path = self.__watches.get_path(wd)
+        watch_mask = directory.mask
+
+        if directory.files is None:
+            try:
+                stat_result = os.stat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                stat_result = None
+
+            if stat_result is not None and \
+               directory.state.is_stale(stat_result) is False:
+                return
+
+        result = _list(path, directory.files is not None)
+
+        if result is None:
+            _LOGGER.debug("Polled directory has disappeared: [%s]", path)
+
+            self.__queue(wd, inotify.constants.IN_DELETE_SELF, path, '', watch_mask)
+            self.remove_watch_with_id(wd)
+
+            return
+
+        (stat_result, children, files) = result
+
+        previous_children = directory.state.children
+
+        for name, is_dir in previous_children.items():
+            if children.get(name) == is_dir:
+                continue
+
+            mask = inotify.constants.IN_DELETE
+            if is_dir is True:
+                mask |= inotify.constants.IN_ISDIR
+
+            self.__queue(wd, mask, path, name, watch_mask)
+
+        for name, is_dir in children.items():
+            if previous_children.get(name) == is_dir:
+                continue
+
+            mask = inotify.constants.IN_CREATE
+            if is_dir is True:
+                mask |= inotify.constants.IN_ISDIR
+                self.__created_paths.add(os.path.join(path, name))
+
+            self.__queue(wd, mask, path, name, watch_mask)
+
+        if files is not None:
+            previous_files = directory.files
+
+            for name, (mtime_ns, size, ctime_ns) in files.items():
+                previous = previous_files.get(name)
+                if previous is None or previous == (mtime_ns, size, ctime_ns):
+                    continue
+
+                (previous_mtime_ns, previous_size, _) = previous
+
+                if mtime_ns != previous_mtime_ns or size != previous_size:
+                    self.__queue(wd, inotify.constants.IN_MODIFY, path, name, watch_mask)
+                    self.__queue(wd, inotify.constants.IN_CLOSE_WRITE, path, name, watch_mask)
+                else:
+                    self.__queue(wd, inotify.constants.IN_ATTRIB, path, name, watch_mask)
+
+        is_racy = time.time_ns() - stat_result.st_mtime_ns < \
+                  inotify.snapshot._RACY_WINDOW_NS
+
+        directory.state = inotify.snapshot.DirectoryState(
+                            stat_result.st_ino,
+                            stat_result.st_mtime_ns,
+                            children,
+                            is_racy=is_racy)
+
+        directory.files = files
+
+    def poll(self):
+        """Scan the directories now (or the next `directories_per_poll` of
+        them) and queue events for whatever changed.
+        """
+
+        start_s = time.monotonic()
+        self.__next_poll_s = start_s + self.__poll_interval_s
+
+        self.__created_paths = set()
+
+        rotation = self.__rotation
+
+        count = len(rotation)
+        if self.__directories_per_poll is not None:
+            count = min(count, self.__directories_per_poll)
+
+        queued = len(self.__pending)
+
+        for _ in range(count):
+            wd = rotation.popleft()
+
+            directory = self.__directories.get(wd)
+            if directory is None:
+                continue
+
+            rotation.append(wd)
+            self.__scan(wd, directory)
+
+        self.__metrics.record_batch(
+            len(self.__pending) - queued,
+            0,
+            0,
+            time.monotonic() - start_s,
+            None)
+
+    def poll_events(self):
+        """Scan if it's time to, and yield whatever events are queued. This
+        includes any that are queued while the caller handles them (e.g.
+        because it watched a new directory).
+        """
+
+        if time.monotonic() >= self.__next_poll_s:
+            self.poll()
+
+        pending = self.__pending
+        while pending:
+            yield pending.popleft()
+
+    def read_events(self, max_events=None, timeout_s=0):
+        """Return the events that are queued, scanning if it's time to. If
+        there aren't any, wait (scanning on schedule) for up to `timeout_s`
+        seconds for some (`None` waits indefinitely). If `max_events` is
+        given, anything beyond that remains queued for the next call.
+        """
+
+        if timeout_s is None:
+            deadline_s = None
+        else:
+            deadline_s = time.monotonic() + timeout_s
+
+        pending = self.__pending
+
+        while not pending:
+            now_s = time.monotonic()
+            if now_s >= self.__next_poll_s:
+                self.poll()
+
+                if pending:
+                    break
+
+            now_s = time.monotonic()
+            if deadline_s is not None and now_s >= deadline_s:
+                break
+
+            delay_s = self.__next_poll_s - now_s
+            if deadline_s is not None:
+                delay_s = min(delay_s, deadline_s - now_s)
+
+            time.sleep(max(0, delay_s))
+
+        count = len(pending)
+        if max_events is not None:
+            count = min(count, max_events)
+
+        return [pending.popleft() for _ in range(count)]
+
+    def event_gen(self, timeout_s=None, yield_nones=True, filter_predicate=None,
+                  terminal_events=()):
+        """Yield one event after another, like `Inotify.event_gen()`. A `None`
+        is yielded after each scan. If `timeout_s` is provided, we'll break
+        when no event is received for that many seconds.
+
+        `terminal_events` is accepted for compatibility. None of the events
+        that we produce are terminal.
+        """
+
+        self.__last_success_return = None
+
+        last_hit_s = time.monotonic()
+        while True:
+            delay_s = self.__next_poll_s - time.monotonic()
+            if timeout_s is not None:
+                delay_s = min(delay_s, last_hit_s + timeout_s - time.monotonic())
+
+            if delay_s > 0:
+                time.sleep(delay_s)
+
+            for e in self.poll_events():
+                last_hit_s = time.monotonic()
+
+                if filter_predicate is not None:
+                    if self.__compact_events is True:
+                        type_names = e.type_names
+                    else:
+                        type_names = e[1]
+
+                    for type_name in type_names:
+                        if filter_predicate(type_name, e) is False:
+                            self.__last_success_return = (type_name, e)
+                            return
+
+                yield e
+
+            if timeout_s is not None:
+                time_since_event_s = time.monotonic() - last_hit_s
+                if time_since_event_s > timeout_s:
+                    break
+
+            if yield_nones is True:
+                yield None
+
+    @property
+    def last_success_return(self):
+        return self.__last_success_return
+
+    @property
+    def compact_events(self):
+        return self.__compact_events
+
+    @property
+    def watch_count(self):
+        return len(self.__watches)
+
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    def stats(self):
+        """Return an `inotify.metrics.InotifyStats`. The scans are recorded
+        as the batches (with the time that they took as `decode_s`), and
+        there are no reads or read-buffer.
+        """
+
+        return self.__metrics.get_stats(None, len(self.__watches), 0)
@@ -0,0 +1,314 @@
+"""Watch a very large tree using several inotify instances. Each instance has
+its own kernel queue (each bounded by `max_queued_events`) and is drained by
+its own thread, so a burst in one part of the tree is less likely to overflow
+everything. Reading and decoding mostly happen outside of the GIL.
+
+The top-level directories of the tree are spread over the instances (the
+"shards"), each going to whichever has the fewest watches at the time. The
+root itself is watched by the first shard, which routes the top-level
+directories that are created, moved, or deleted to the shard that should own
+them.
+
+Events from all shards are merged into a single stream. The order of the
+events from any one shard is preserved, but there's no ordering between
+shards (the kernel doesn't give us one). If a shard's reader fails, all of
+them are stopped and the exception is raised by `event_gen()` once the events
+that were already merged have been retrieved.
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import queue
+import select
+import threading
+
+import inotify.adapters
+import inotify.calls
+import inotify.constants
+
+_DEFAULT_SHARD_COUNT = 4
+_DEFAULT_MAXIMUM_QUEUED_EVENTS = 64 * 1024
+_POLL_INTERVAL_S = 1
+
+_LOGGER = logging.getLogger(__name__)
+
+ShardStats = collections.namedtuple(
+                'ShardStats',
+                [
+                    'index',
+                    'watches',
+                    'events',
+                    'overflows',
+                    'queued_bytes',
+                ])
+
+
+class InotifyShardedTree(object):
+    def __init__(self, path, shards=_DEFAULT_SHARD_COUNT,
+                 mask=inotify.constants.IN_ALL_EVENTS, crawl_workers=None,
+                 compact_events=False, filter_spec=None,
+                 maximum_queued_events=_DEFAULT_MAXIMUM_QUEUED_EVENTS):
+        self.__path = path
+        self.__compact_events = compact_events
+
+        self.__shards = [
+            inotify.adapters._BaseTree(
+                mask=mask,
+                crawl_workers=crawl_workers,
+                compact_events=compact_events,
+                filter_spec=filter_spec)
+            for _ in range(shards)
+        ]
+
+        # A shard's lock is held while its events are read and handled, and
+        # while anything changes its watches.
+        self.__locks = [threading.Lock() for _ in range(shards)]
+
+        self.__event_counts = [0] * shards
+        self.__overflow_counts = [0] * shards
+
+        self.__queue = queue.Queue(maxsize=maximum_queued_events)
+        self.__stop_event = threading.Event()
+
+        # If a reader fails, the caller gets the exception.
+        self.__error = None
+
+        self.__load(path)
+
+        self.__threads = []
+        for index in range(shards):
+            thread = threading.Thread(
+                        target=self.__read_shard,
+                        args=(index,),
+                        name='inotify-shard-{}'.format(index),
+                        daemon=True)
+
+            thread.start()
+            self.__threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stop the reader threads and close the shards' inotify handles."""
+
+        self.__stop_event.set()
+
+        for thread in self.__threads:
+            thread.join()
+
+        self.__threads = []
+
+        for shard in self.__shards:
+            shard.inotify.close()
+
+    def __get_least_loaded(self):
+        return min(
+                range(len(self.__shards)),
+                key=lambda index: self.__shards[index].inotify.watch_count)
+
+    def __load(self, path):
+        root_shard = self.__shards[0]
+        root_shard.inotify.add_watch(path, root_shard._mask)
+
+        with os.scandir(path) as it:
+            subdirectories = [entry.path for entry in it if entry.is_dir()]
+
+        for subdirectory in subdirectories:
+            if root_shard._is_excluded(subdirectory) is True:
+                continue
+
+            index = self.__get_least_loaded()
+            self.__shards[index]._load_tree(subdirectory)
+
+    def __put(self, event):
+        """Wait for room in the merged queue. This is where the readers are
+        held back if the caller falls behind.
+        """
+
+        while self.__stop_event.is_set() is False:
+            try:
+                self.__queue.put(event, timeout=_POLL_INTERVAL_S)
+            except queue.Full:
+                continue
+
+            return
+
+    def __route(self, event, mask, stack, held):
+        """Determine which shard should handle an event for a directory in the
+        root, and make sure that we hold its lock.
+        """
+
+        (_, _, _, filename) = event
+        full_path = os.path.join(self.__path, filename)
+
+        index = None
+
+        if mask & (inotify.constants.IN_DELETE | inotify.constants.IN_MOVED_FROM):
+            for i, shard in enumerate(self.__shards):
+                if shard.inotify.get_watch_id(full_path) is not None:
+                    index = i
+                    break
+        elif mask & inotify.constants.IN_MOVED_TO:
+            cookie = event[0].cookie
+
+            for i, shard in enumerate(self.__shards):
+                if cookie in shard._pending_moves:
+                    index = i
+                    break
+
+        if index is None:
+            index = self.__get_least_loaded()
+
+        # We keep these until the end of the batch so that both halves of a
+        # move are seen by the owner without anything in-between. Only the
+        # first shard routes events, so it's the only one that ever holds
+        # more than one lock.
+        if index not in held:
+            stack.enter_context(self.__locks[index])
+            held.add(index)
+
+        return self.__shards[index]
+
+    def __handle_events(self, index, events, stack):
+        shard = self.__shards[index]
+        held = set([index])
+
+        for event in events:
+            mask = shard._get_mask(event)
+
+            if mask & inotify.constants.IN_Q_OVERFLOW:
+                _LOGGER.warning("Shard (%d) overflowed.", index)
+                self.__overflow_counts[index] += 1
+
+            target = shard
+
+            if index == 0 and mask & inotify.constants.IN_ISDIR:
+                if self.__compact_events is True:
+                    path = event.path
+                else:
+                    path = event[2]
+
+                if path == self.__path:
+                    target = self.__route(event, mask, stack, held)
+
+            target._handle_event(event)
+
+        shard._finish_pending_move()
+
+        self.__event_counts[index] += len(events)
+
+    def __read_shard(self, index):
+        try:
+            self.__read_shard_events(index)
+        except Exception as e:
+            _LOGGER.exception("Shard (%d) failed.", index)
+
+            if self.__error is None:
+                self.__error = e
+
+            # The merged stream would be missing this shard's events, so we
+            # stop the others, too.
+            self.__stop_event.set()
+
+    def __read_shard_events(self, index):
+        shard = self.__shards[index]
+        lock = self.__locks[index]
+
+        poller = select.poll()
+        poller.register(shard.inotify.fd, select.POLLIN)
+
+        while self.__stop_event.is_set() is False:
+            # We don't hold the lock while we wait.
+            if not poller.poll(_POLL_INTERVAL_S * 1000):
+                with lock:
+                    shard._finish_pending_move()
+
+                continue
+
+            with contextlib.ExitStack() as stack:
+                stack.enter_context(lock)
+
+                events = shard.inotify.read_events()
+                self.__handle_events(index, events, stack)
+
+            for event in events:
+                self.__put(event)
+
+    @property
+    def stats(self):
+        """Return a `ShardStats` for each shard. `queued_bytes` is what's
+        waiting in that shard's kernel queue.
+        """
+
+        return [
+            ShardStats(
+                index=index,
+                watches=shard.inotify.watch_count,
+                events=self.__event_counts[index],
+                overflows=self.__overflow_counts[index],
+                queued_bytes=inotify.calls.inotify_get_queued_bytes(
+                                shard.inotify.fd))
+            for index, shard
+            in enumerate(self.__shards)
+        ]
+
+    @property
+    def queued_events(self):
+        """How many events have been read but not yet retrieved."""
+
+        return self.__queue.qsize()
+
+    @property
+    def shards(self):
+        return list(self.__shards)
+
+    def event_gen(self, timeout_s=None, yield_nones=True,
+                  terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS):
+        """Yield the merged events. If `timeout_s` is given, we'll stop once
+        nothing has arrived for that many seconds. If a reader failed, its
+        exception is raised once everything before it has been yielded.
+        """
+
+        terminal_mask = inotify.adapters._get_mask_for_names(terminal_events)
+        compact_events = self.__compact_events
+
+        if timeout_s is None:
+            block_duration_s = _POLL_INTERVAL_S
+        else:
+            block_duration_s = timeout_s
+
+        while True:
+            try:
+                event = self.__queue.get(timeout=block_duration_s)
+            except queue.Empty:
+                if self.__error is not None:
+                    raise self.__error
+
+                if timeout_s is not None:
+                    break
+
+                if yield_nones is True:
+                    yield None
+
+                continue
+
+            if compact_events is True:
+                mask = event.mask
+                type_names = event.type_names
+            else:
+                mask = event[0].mask
+                type_names = event[1]
+
+            if mask & terminal_mask:
+                for type_name in type_names:
+                    if type_name in terminal_events:
+                        raise inotify.adapters.TerminalEventException(
+                                type_name, event)
+
+            yield event
@@ -0,0 +1,286 @@
+"""A record of the directories in a tree (their inode, mtime, and children) so
+that we can determine what changed while we weren't able to see events.
+
+A snapshot can be saved to disk and loaded again later (e.g. when a service
+restarts) to find what changed in the meantime. The file is a short header
+followed by the directories, serialized as JSON (so it doesn't depend on the
+version of Python that wrote it). Files from another version of this format,
+or that can't be decoded, are ignored.
+"""
+
+import json
+import logging
+import os
+import struct
+import tempfile
+import time
+
+import inotify.crawl
+
+# Many filesystems only update mtimes with a coarse granularity, so a change
+# made shortly after we list a directory might not change its mtime. We'll
+# always consider directories that were modified this recently (relative to
+# when we recorded them) to be stale.
+_RACY_WINDOW_NS = 2 * 10 ** 9
+
+_FILE_MAGIC = b'INSNAP'
+_FILE_VERSION = 2
+
+# The format-version.
+_FILE_HEADER_STRUCT = struct.Struct('!H')
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DirectoryState(object):
+    __slots__ = (
+        'inode',
+        'mtime_ns',
+        'children',
+        'is_racy',
+    )
+
+    def __init__(self, inode, mtime_ns, children, is_racy=False):
+        self.inode = inode
+        self.mtime_ns = mtime_ns
+
+        # Names to whether they're directories.
+        self.children = children
+
+        self.is_racy = is_racy
+
+    def is_stale(self, stat_result):
+        return self.is_racy is True or \
+               stat_result.st_ino != self.inode or \
+               stat_result.st_mtime_ns != self.mtime_ns
+
+    def __repr__(self):
+        return "DirectoryState(inode={}, mtime_ns={}, children=({}))".format(
+               self.inode, self.mtime_ns, len(self.children))
+
+
+class TreeSnapshot(object):
+    def __init__(self):
+        self.__directories = {}
+
+    @classmethod
+    def load(cls, filepath):
+        """Return the snapshot that was saved to the given file, or `None` if
+        it doesn't exist or can't be used.
+        """
+
+        try:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        header_length = len(_FILE_MAGIC) + _FILE_HEADER_STRUCT.size
+        if data[:len(_FILE_MAGIC)] != _FILE_MAGIC or len(data) < header_length:
+            _LOGGER.warning("Snapshot is not valid: [%s]", filepath)
+            return None
+
+        (version,) = _FILE_HEADER_STRUCT.unpack_from(data, len(_FILE_MAGIC))
+
+        if version != _FILE_VERSION:
+            _LOGGER.warning("Snapshot is from an incompatible version (%d): "
+                            "[%s]", version, filepath)
+
+            return None
+
+        # Anything that doesn't decode to what we wrote is treated as though
+        # there were no snapshot.
+        snapshot = cls()
+        try:
+            records = json.loads(data[header_length:].decode('ascii'))
+
+            for path, inode, mtime_ns, is_racy, children in records:
+                snapshot.__directories[path] = DirectoryState(
+                                                inode,
+                                                mtime_ns,
+                                                dict(children),
+                                                is_racy=is_racy)
+        except (ValueError, TypeError):
+            _LOGGER.warning("Snapshot is corrupt: [%s]", filepath)
+            return None
+
+        return snapshot
+
+    def save(self, filepath):
+        """Write the snapshot to the given file. The file is replaced
+        atomically so that a crash can never leave a partial one.
+        """
+
+        records = [
+            (path, state.inode, state.mtime_ns, state.is_racy, state.children)
+            for path, state
+            in self.__directories.items()
+        ]
+
+        (fd, temp_filepath) = tempfile.mkstemp(
+                                dir=os.path.dirname(os.path.abspath(filepath)),
+                                prefix='.' + os.path.basename(filepath))
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_FILE_MAGIC)
+                f.write(_FILE_HEADER_STRUCT.pack(_FILE_VERSION))
+
+                # Names that aren't valid UTF-8 carry surrogates, which are
+                # escaped (and restored by `load()`).
+                f.write(json.dumps(records, ensure_ascii=True).encode('ascii'))
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(temp_filepath, filepath)
+        except:
+            os.unlink(temp_filepath)
+            raise
+
+    def __len__(self):
+        return len(self.__directories)
+
+    def __contains__(self, path):
+        return path in self.__directories
+
+    def get(self, path):
+        return self.__directories.get(path)
+
+    @property
+    def paths(self):
+        return list(self.__directories.keys())
+
+    def add(self, path, state):
+        self.__directories[path] = state
+
+    def record(self, path, stat_result, children):
+        """Store the state of a directory. This is compatible with the
+        `listing_cb` of `inotify.crawl.crawl()`.
+        """
+
+        is_racy = time.time_ns() - stat_result.st_mtime_ns < _RACY_WINDOW_NS
+
+        self.__directories[path] = DirectoryState(
+                                    stat_result.st_ino,
+                                    stat_result.st_mtime_ns,
+                                    children,
+                                    is_racy=is_racy)
+
+    def add_child(self, path, name, is_dir):
+        state = self.__directories.get(path)
+        if state is not None:
+            state.children[name] = is_dir
+
+    def remove_child(self, path, name):
+        state = self.__directories.get(path)
+        if state is not None:
+            state.children.pop(name, None)
+
+    def remove_subtree(self, path):
+        """Forget the given directory and everything beneath it. Returns the
+        paths that were forgotten.
+        """
+
+        removed = []
+
+        # We use an explicit stack (rather than recursion) so that a deep tree
+        # can't exhaust the interpreter's stack.
+        stack = [path]
+        while stack:
+            current_path = stack.pop()
+
+            state = self.__directories.pop(current_path, None)
+            if state is None:
+                continue
+
+            removed.append(current_path)
+
+            # Reversed, so that they're popped in order.
+            for name, is_dir in reversed(list(state.children.items())):
+                if is_dir is True:
+                    stack.append(os.path.join(current_path, name))
+
+        return removed
+
+    def iterate_subtree(self, path, exclude_cb=None):
+        """Yield the path and state of the given directory and every known
+        directory beneath it. If `exclude_cb` is given, it's called with the
+        path of each subdirectory, and the ones for which it returns `True`
+        are skipped along with everything beneath them.
+        """
+
+        stack = [path]
+        while stack:
+            current_path = stack.pop()
+
+            state = self.__directories.get(current_path)
+            if state is None:
+                continue
+
+            yield current_path, state
+
+            child_paths = []
+            for name, is_dir in state.children.items():
+                if is_dir is False:
+                    continue
+
+                child_path = os.path.join(current_path, name)
+                if exclude_cb is not None and exclude_cb(child_path) is True:
+                    continue
+
+                child_paths.append(child_path)
+
+            # Reversed, so that they're popped in order.
+            stack.extend(reversed(child_paths))
+
+    def find_stale(self):
+        """Return the directories that have changed since we recorded them
+        (or have disappeared). This only costs a stat() per directory.
+        """
+
+        stale = []
+        for path, state in self.__directories.items():
+            try:
+                stat_result = os.stat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                stale.append(path)
+                continue
+
+            if state.is_stale(stat_result) is True:
+                stale.append(path)
+
+        return stale
+
+    def rescan(self, path):
+        """Re-list the given directory and return the children that were
+        created and deleted since we last knew about them, as lists of
+        (name, is_dir). Returns `None` if the directory is no longer there.
+        """
+
+        result = inotify.crawl._scan(path, with_listing=True)
+        if result is None:
+            return None
+
+        (_, _, stat_result, children) = result
+
+        state = self.__directories.get(path)
+        if state is None:
+            previous_children = {}
+        else:
+            previous_children = state.children
+
+        created = []
+        deleted = []
+
+        for name, is_dir in previous_children.items():
+            if children.get(name) != is_dir:
+                deleted.append((name, is_dir))
+
+        for name, is_dir in children.items():
+            if previous_children.get(name) != is_dir:
+                created.append((name, is_dir))
+
+        self.record(path, stat_result, children)
+
+        return created, deleted
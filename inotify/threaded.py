@@ -0,0 +1,458 @@
+"""Read from inotify on a background thread so that the kernel's queue keeps
+being drained while the caller is busy with the events that it already has.
+
+The events are handed over through a bounded queue. When it's full, the
+`overflow_policy` decides what happens to the next event:
+
+- 'block': the reader waits for room (so the kernel's queue backs-up and may
+  eventually overflow, as it would without the thread).
+- 'drop-oldest': the oldest event that's waiting is discarded.
+- 'coalesce': if the most recent event that's waiting is for the same file,
+  the new mask is OR-ed into it (like `inotify.coalesce`); otherwise the
+  reader waits. Creations and deletions are never merged.
+
+Watches can be added and removed from any thread.
+"""
+
+import collections
+import logging
+import os
+import select
+import threading
+import time
+
+import inotify.adapters
+import inotify.coalesce
+import inotify.constants
+import inotify.events
+
+_DEFAULT_MAXIMUM_QUEUED_EVENTS = 64 * 1024
+
+_OVERFLOW_POLICIES = (
+    'block',
+    'drop-oldest',
+    'coalesce',
+)
+
+_DEFAULT_OVERFLOW_POLICY = 'block'
+
+_DEFAULT_BLOCK_DURATION_S = 1
+
+# These are never merged into (or with) anything: moves and the events that
+# aren't about a particular file, and the ones that change whether a file
+# exists.
+_UNCOALESCABLE_MASK = \
+    inotify.coalesce._PASSTHROUGH_MASK | \
+    inotify.constants.IN_CREATE | \
+    inotify.constants.IN_DELETE | \
+    inotify.constants.IN_DELETE_SELF
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _merge(event, mask, compact_events):
+    """Return the event with the given mask OR-ed into it."""
+
+    if compact_events is True:
+        return inotify.events.InotifyEvent(
+                event.wd,
+                event.mask | mask,
+                event.cookie,
+                event.len,
+                event.path,
+                event.filename_bytes)
+
+    (header, _, path, filename) = event
+    header = header._replace(mask=header.mask | mask)
+
+    type_names = list(inotify.events.get_event_names(header.mask))
+
+    return (header, type_names, path, filename)
+
+
+class _HandoffQueue(object):
+    """A bounded queue of events between the reader and the caller. When
+    coalescing, only the most recent event is merged into, so nothing is
+    reordered.
+    """
+
+    def __init__(self, maximum_events, overflow_policy, compact_events):
+        self.__maximum_events = maximum_events
+        self.__overflow_policy = overflow_policy
+        self.__compact_events = compact_events
+
+        self.__events = collections.deque()
+
+        # The key of the most recent event, when coalescing.
+        self.__last_key = None
+
+        self.__condition = threading.Condition()
+        self.__is_closed = False
+
+        self.dropped_count = 0
+        self.coalesced_count = 0
+
+    def __len__(self):
+        return len(self.__events)
+
+    def __get_key(self, event):
+        """Return the key that an event can be coalesced by, or `None` if it
+        has to stay separate.
+        """
+
+        if self.__compact_events is True:
+            (wd, mask, filename) = (event.wd, event.mask, event.filename_bytes)
+        else:
+            (wd, mask, filename) = (event[0].wd, event[0].mask, event[3])
+
+        if mask & _UNCOALESCABLE_MASK:
+            return None
+
+        return (wd, mask & inotify.constants.IN_ISDIR, filename)
+
+    def __pop(self):
+        event = self.__events.popleft()
+        if not self.__events:
+            self.__last_key = None
+
+        return event
+
+    def __coalesce(self, event, key):
+        if key != self.__last_key:
+            return False
+
+        if self.__compact_events is True:
+            mask = event.mask
+        else:
+            mask = event[0].mask
+
+        self.__events[-1] = _merge(
+                                self.__events[-1],
+                                mask,
+                                self.__compact_events)
+        self.coalesced_count += 1
+
+        return True
+
+    def close(self):
+        with self.__condition:
+            self.__is_closed = True
+            self.__condition.notify_all()
+
+    def put(self, events):
+        """Queue the events, applying the overflow-policy whenever we're
+        full.
+        """
+
+        queued = self.__events
+        is_coalescing = self.__overflow_policy == 'coalesce'
+
+        with self.__condition:
+            for event in events:
+                if is_coalescing is True:
+                    key = self.__get_key(event)
+                else:
+                    key = None
+
+                while len(queued) >= self.__maximum_events:
+                    if self.__is_closed is True:
+                        return
+
+                    if self.__overflow_policy == 'drop-oldest':
+                        self.__pop()
+                        self.dropped_count += 1
+                        continue
+
+                    if key is not None and self.__coalesce(event, key) is True:
+                        break
+
+                    self.__condition.wait()
+                else:
+                    queued.append(event)
+                    self.__last_key = key
+
+            self.__condition.notify_all()
+
+    def get(self, timeout_s=None):
+        """Return the next event, or `None` if nothing arrived in time or if
+        we're closed and empty.
+        """
+
+        with self.__condition:
+            if not self.__events and self.__is_closed is False:
+                self.__condition.wait(timeout_s)
+
+            if not self.__events:
+                return None
+
+            event = self.__pop()
+            self.__condition.notify_all()
+
+            return event
+
+    @property
+    def is_finished(self):
+        """Whether we're closed and nothing is left."""
+
+        return self.__is_closed is True and not self.__events
+
+
+class ThreadedInotify(object):
+    """An `inotify.adapters.Inotify` that's read by a background thread. Call
+    `close()` (or use it as a context manager) to stop the thread.
+    """
+
+    def __init__(self, paths=[],
+                 maximum_queued_events=_DEFAULT_MAXIMUM_QUEUED_EVENTS,
+                 overflow_policy=_DEFAULT_OVERFLOW_POLICY,
+                 block_duration_s=_DEFAULT_BLOCK_DURATION_S,
+                 read_buffer_size=inotify.adapters._DEFAULT_READ_BUFFER_SIZE,
+                 compact_events=False, trace_cb=None):
+        if overflow_policy not in _OVERFLOW_POLICIES:
+            raise ValueError("Overflow policy not valid: [{}]".format(
+                             overflow_policy))
+
+        self.__block_duration_s = block_duration_s
+        self.__compact_events = compact_events
+
+        self.__i = inotify.adapters.Inotify(
+                    read_buffer_size=read_buffer_size,
+                    compact_events=compact_events,
+                    trace_cb=trace_cb)
+
+        # This is held while the reader reads and decodes, and while anything
+        # looks at or changes the watches.
+        self.__lock = threading.Lock()
+
+        self.__queue = _HandoffQueue(
+                        maximum_queued_events,
+                        overflow_policy,
+                        compact_events)
+
+        self.__last_success_return = None
+
+        # If the reader fails, the caller gets the exception.
+        self.__error = None
+
+        # Written to in order to wake the reader when we're closing.
+        (self.__wake_fd, self.__wake_write_fd) = os.pipe()
+        self.__stop_event = threading.Event()
+
+        for path in paths:
+            self.add_watch(path)
+
+        self.__thread = threading.Thread(
+                            target=self.__read,
+                            name='inotify-reader',
+                            daemon=True)
+
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stop the reader thread and close the inotify handle. Whatever has
+        already been read can still be retrieved.
+        """
+
+        if self.__thread is None:
+            return
+
+        self.__stop_event.set()
+        os.write(self.__wake_write_fd, b'\0')
+
+        self.__queue.close()
+
+        self.__thread.join()
+        self.__thread = None
+
+        os.close(self.__wake_fd)
+        os.close(self.__wake_write_fd)
+
+        with self.__lock:
+            self.__i.close()
+
+    def __read(self):
+        poller = select.poll()
+        poller.register(self.__i.fd, select.POLLIN)
+        poller.register(self.__wake_fd, select.POLLIN)
+
+        try:
+            while self.__stop_event.is_set() is False:
+                poller.poll()
+
+                if self.__stop_event.is_set() is True:
+                    break
+
+                with self.__lock:
+                    events = self.__i.read_events()
+
+                if events:
+                    self.__queue.put(events)
+        except Exception as e:
+            _LOGGER.exception("The reader failed.")
+            self.__error = e
+        finally:
+            self.__queue.close()
+
+    def add_watch(self, path_unicode, mask=inotify.constants.IN_ALL_EVENTS):
+        with self.__lock:
+            return self.__i.add_watch(path_unicode, mask)
+
+    def add_watches(self, paths, mask=inotify.constants.IN_ALL_EVENTS):
+        with self.__lock:
+            return self.__i.add_watches(paths, mask)
+
+    def get_watch_id(self, path):
+        with self.__lock:
+            return self.__i.get_watch_id(path)
+
+    def get_watch_path(self, wd):
+        with self.__lock:
+            return self.__i.get_watch_path(wd)
+
+    def move_watch(self, from_path, to_path):
+        with self.__lock:
+            self.__i.move_watch(from_path, to_path)
+
+    def remove_watch_tree(self, path, superficial=False):
+        with self.__lock:
+            self.__i.remove_watch_tree(path, superficial)
+
+    def remove_watch(self, path, superficial=False):
+        with self.__lock:
+            self.__i.remove_watch(path, superficial)
+
+    def remove_watch_with_id(self, wd, superficial=False):
+        with self.__lock:
+            self.__i.remove_watch_with_id(wd, superficial)
+
+    def __check_error(self):
+        if self.__error is not None:
+            raise self.__error
+
+    def read_events(self, max_events=None, timeout_s=0):
+        """Return the events that have been read so far, waiting up to
+        `timeout_s` seconds for one if there aren't any (`None` waits
+        indefinitely).
+        """
+
+        events = []
+
+        event = self.__queue.get(timeout_s)
+        while event is not None:
+            events.append(event)
+            if max_events is not None and len(events) >= max_events:
+                break
+
+            event = self.__queue.get(0)
+
+        if not events:
+            self.__check_error()
+
+        return events
+
+    def event_gen(
+            self, timeout_s=None, yield_nones=True, filter_predicate=None,
+            terminal_events=inotify.adapters._DEFAULT_TERMINAL_EVENTS):
+        """Yield the events as the reader hands them over, like
+        `Inotify.event_gen()`. We stop when we're closed and everything has
+        been retrieved.
+        """
+
+        self.__last_success_return = None
+
+        compact_events = self.__compact_events
+        terminal_mask = inotify.adapters._get_mask_for_names(terminal_events)
+
+        if timeout_s is None:
+            block_duration_s = self.__block_duration_s
+        else:
+            block_duration_s = min(timeout_s, self.__block_duration_s)
+
+        last_hit_s = time.time()
+        while True:
+            e = self.__queue.get(block_duration_s)
+
+            if e is None:
+                if self.__queue.is_finished is True:
+                    self.__check_error()
+                    break
+
+                if timeout_s is not None and \
+                   time.time() - last_hit_s > timeout_s:
+                    break
+
+                if yield_nones is True:
+                    yield None
+
+                continue
+
+            last_hit_s = time.time()
+
+            if compact_events is True:
+                mask = e.mask
+            else:
+                mask = e[0].mask
+
+            if filter_predicate is None and (mask & terminal_mask) == 0:
+                yield e
+                continue
+
+            if compact_events is True:
+                type_names = e.type_names
+            else:
+                type_names = e[1]
+
+            for type_name in type_names:
+                if filter_predicate is not None and \
+                   filter_predicate(type_name, e) is False:
+                    self.__last_success_return = (type_name, e)
+                    return
+                elif type_name in terminal_events:
+                    raise inotify.adapters.TerminalEventException(type_name, e)
+
+            yield e
+
+    @property
+    def last_success_return(self):
+        return self.__last_success_return
+
+    @property
+    def compact_events(self):
+        return self.__compact_events
+
+    @property
+    def watch_count(self):
+        with self.__lock:
+            return self.__i.watch_count
+
+    @property
+    def queued_events(self):
+        """How many events have been read but not yet retrieved."""
+
+        return len(self.__queue)
+
+    @property
+    def dropped_events(self):
+        """How many events were discarded by the 'drop-oldest' policy."""
+
+        return self.__queue.dropped_count
+
+    @property
+    def coalesced_events(self):
+        """How many events were merged into others by the 'coalesce'
+        policy.
+        """
+
+        return self.__queue.coalesced_count
+
+    def stats(self):
+        """See `Inotify.stats()`."""
+
+        with self.__lock:
+            return self.__i.stats()
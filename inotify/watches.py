@@ -0,0 +1,231 @@
+"""An index of our watches that mirrors the directory structure. Each watch
+knows its parent and its name within that parent rather than its full path, so
+renaming a directory only relinks one node no matter how much is beneath it.
+Full paths are resolved when they're needed and then cached until the next
+rename.
+"""
+
+import os
+
+
+class _WatchNode(object):
+    __slots__ = (
+        'wd',
+        'parent',
+        'name',
+        'children',
+    )
+
+    def __init__(self, wd, parent, name):
+        self.wd = wd
+
+        # If there's no parent, the name is the full path.
+        self.parent = parent
+        self.name = name
+
+        self.children = {}
+
+    def __repr__(self):
+        return "_WatchNode(wd={}, name={!r}, children=({}))".format(
+               self.wd, self.name, len(self.children))
+
+
+class WatchIndex(object):
+    def __init__(self):
+        self.__nodes = {}
+
+        # Watches that don't have a watched parent, by their full path, and
+        # their paths by the path of the parent that they'd have.
+        self.__roots = {}
+        self.__roots_by_parent = {}
+
+        # These are thrown away whenever paths change.
+        self.__path_cache = {}
+        self.__node_cache = {}
+
+    def __len__(self):
+        return len(self.__nodes)
+
+    def __contains__(self, path):
+        return self.__find(path) is not None
+
+    @property
+    def paths(self):
+        return [self.get_path(wd) for wd in self.__nodes]
+
+    def __invalidate(self):
+        self.__path_cache = {}
+        self.__node_cache = {}
+
+    def __resolve_path(self, node):
+        names = []
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+
+        names.append(node.name)
+        names.reverse()
+
+        return os.path.join(*names)
+
+    def __find(self, path):
+        try:
+            return self.__node_cache[path]
+        except KeyError:
+            pass
+
+        node = self.__roots.get(path)
+
+        if node is None:
+            (parent_path, name) = os.path.split(path)
+
+            if name and parent_path != path:
+                parent = self.__find(parent_path)
+                if parent is not None:
+                    node = parent.children.get(name)
+
+        if node is not None:
+            self.__node_cache[path] = node
+
+        return node
+
+    def __attach(self, node, path):
+        """Link the node in at the given path, adopting any roots that are
+        directly beneath it.
+        """
+
+        (parent_path, name) = os.path.split(path)
+        parent = self.__find(parent_path)
+
+        if parent is None or parent is node:
+            self.__add_root(node, path)
+        else:
+            node.parent = parent
+            node.name = name
+
+            parent.children[name] = node
+
+        for root_path in list(self.__roots_by_parent.get(path, ())):
+            root = self.__roots[root_path]
+            if root is node:
+                continue
+
+            self.__remove_root(root)
+
+            root.parent = node
+            root.name = os.path.basename(root_path)
+
+            node.children[root.name] = root
+
+    def __add_root(self, node, path):
+        node.parent = None
+        node.name = path
+
+        self.__roots[path] = node
+        self.__roots_by_parent.setdefault(os.path.dirname(path), set()).add(path)
+
+    def __remove_root(self, node):
+        path = node.name
+        del self.__roots[path]
+
+        parent_path = os.path.dirname(path)
+
+        siblings = self.__roots_by_parent[parent_path]
+        siblings.discard(path)
+
+        if not siblings:
+            del self.__roots_by_parent[parent_path]
+
+    def __detach(self, node):
+        if node.parent is None:
+            self.__remove_root(node)
+        else:
+            del node.parent.children[node.name]
+
+    def add(self, path, wd):
+        """Record the watch for the given path. If we already have the watch
+        (the kernel returns the same one for the same directory), it's moved.
+        """
+
+        node = self.__nodes.get(wd)
+        if node is not None:
+            self.move(wd, path)
+            return
+
+        existing = self.__find(path)
+        if existing is not None:
+            self.remove(existing.wd)
+
+        node = _WatchNode(wd, None, path)
+        self.__attach(node, path)
+
+        self.__nodes[wd] = node
+
+    def move(self, wd, path):
+        """Relink the watch (and, implicitly, everything beneath it) to the
+        given path.
+        """
+
+        node = self.__nodes[wd]
+
+        # Whatever was there before has been replaced.
+        existing = self.__find(path)
+        if existing is not None and existing is not node:
+            self.remove(existing.wd)
+
+        self.__detach(node)
+        self.__attach(node, path)
+
+        self.__invalidate()
+
+    def remove(self, wd):
+        """Forget the given watch. Anything beneath it keeps its current
+        path.
+        """
+
+        node = self.__nodes.pop(wd)
+        path = self.get_path(wd, node=node)
+
+        self.__detach(node)
+
+        for name, child in list(node.children.items()):
+            self.__add_root(child, os.path.join(path, name))
+
+        self.__path_cache.pop(wd, None)
+        self.__node_cache.pop(path, None)
+
+    def get_wd(self, path):
+        node = self.__find(path)
+        if node is None:
+            return None
+
+        return node.wd
+
+    def get_path(self, wd, node=None):
+        try:
+            return self.__path_cache[wd]
+        except KeyError:
+            pass
+
+        if node is None:
+            node = self.__nodes.get(wd)
+            if node is None:
+                return None
+
+        path = self.__resolve_path(node)
+        self.__path_cache[wd] = path
+
+        return path
+
+    def get_subtree(self, wd):
+        """Return the watches beneath the given one (including itself)."""
+
+        wds = []
+
+        nodes = [self.__nodes[wd]]
+        while nodes:
+            node = nodes.pop()
+            wds.append(node.wd)
+            nodes.extend(node.children.values())
+
+        return wds
@@ -21,6 +21,7 @@ setuptools.setup(
     author_email='myselfasunder@gmail.com',
     url='https://github.com/dsoprea/PyInotify',
     license='GPL 2',
+    python_requires='>=3.8',
     packages=setuptools.find_packages(exclude=['tests']),
     include_package_data=True,
     zip_safe=False,
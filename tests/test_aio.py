@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+import asyncio
+
+import inotify.adapters
+import inotify.aio
+import inotify.constants
+import inotify.test_support
+
+
+class TestAsyncInotify(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestAsyncInotify, self).__init__(*args, **kwargs)
+
+    @staticmethod
+    async def _read_events(watcher, count):
+        events = []
+        async for event in watcher:
+            events.append(event)
+            if len(events) == count:
+                break
+
+        return events
+
+    def test__cycle(self):
+        with inotify.test_support.temp_path() as path:
+            async def run():
+                async with inotify.aio.AsyncInotify([path]) as i:
+                    with open(os.path.join(path, 'new_file'), 'w'):
+                        pass
+
+                    events = await asyncio.wait_for(
+                                TestAsyncInotify._read_events(i, 3),
+                                timeout=5)
+
+                    # Nothing else should arrive.
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await asyncio.wait_for(i.__anext__(), timeout=0.2)
+
+                return events
+
+            events = asyncio.run(run())
+
+            expected = [
+                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=256, cookie=0, len=16), ['IN_CREATE'], path, 'new_file'),
+                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=32, cookie=0, len=16), ['IN_OPEN'], path, 'new_file'),
+                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=8, cookie=0, len=16), ['IN_CLOSE_WRITE'], path, 'new_file'),
+            ]
+
+            self.assertEqual(events, expected)
+
+    def test__maximum_queued_events(self):
+        with inotify.test_support.temp_path() as path:
+            async def run():
+                i = inotify.aio.AsyncInotify(maximum_queued_events=2)
+                i.add_watch(path, inotify.constants.IN_CREATE)
+
+                for name in ('file1', 'file2', 'file3'):
+                    with open(name, 'w'):
+                        pass
+
+                filenames = [(await i.__anext__())[3]]
+
+                # We stop reading while we're full, so this stays with the
+                # kernel until there's room.
+
+                with open('file4', 'w'):
+                    pass
+
+                await asyncio.sleep(0.2)
+                self.assertEqual(i.queued_events, 2)
+
+                events = await asyncio.wait_for(
+                            TestAsyncInotify._read_events(i, 3),
+                            timeout=5)
+
+                filenames += [event[3] for event in events]
+
+                # Closing closes the handle and ends the iteration.
+
+                i.close()
+                self.assertIsNone(i.inotify.fd)
+
+                remaining = [event async for event in i]
+
+                return filenames, remaining
+
+            (filenames, remaining) = asyncio.run(run())
+
+            self.assertEqual(filenames, ['file1', 'file2', 'file3', 'file4'])
+            self.assertEqual(remaining, [])
+
+
+class TestAsyncInotifyTree(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestAsyncInotifyTree, self).__init__(*args, **kwargs)
+
+    def test__automatic_new_watches_on_new_paths(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = os.path.join(path, 'folder1')
+
+            async def run():
+                async with inotify.aio.AsyncInotifyTree(path) as i:
+                    os.mkdir(path1)
+
+                    async for event in i:
+                        if event[3] == 'folder1':
+                            break
+
+                    with open(os.path.join(path1, 'filename'), 'w'):
+                        pass
+
+                    async for event in i:
+                        if event[2] == path1:
+                            return event
+
+            event = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+            expected = \
+                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=256, cookie=0, len=16), ['IN_CREATE'], path1, 'filename')
+
+            self.assertEqual(event, expected)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.adapters
+import inotify.constants
+import inotify.test_support
+
+
+class TestWatchBudget(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestWatchBudget, self).__init__(*args, **kwargs)
+
+    def __read_all_events(self, i):
+        events = list(i.event_gen(timeout_s=0.2, yield_nones=False))
+        return events
+
+    def test__maximum_watches(self):
+        with inotify.test_support.temp_path() as path:
+            paths = [path]
+            for name in ('aa', 'bb', 'cc', 'dd', 'ee'):
+                child_path = os.path.join(path, name)
+                os.mkdir(child_path)
+
+                paths.append(child_path)
+
+            i = inotify.adapters.InotifyTree(
+                    path,
+                    mask=inotify.constants.IN_CREATE,
+                    block_duration_s=0.1,
+                    maximum_watches=3,
+                    poll_interval_s=0)
+
+            # The top of the tree is watched and the rest is polled.
+
+            stats = i.budget_stats
+
+            self.assertEqual(stats.watches, 3)
+            self.assertEqual(stats.maximum_watches, 3)
+            self.assertEqual(stats.polled_directories, 3)
+            self.assertEqual(stats.evictions, 0)
+
+            polled_paths = [p for p in paths if i.inotify.get_watch_id(p) is None]
+            self.assertEqual(len(polled_paths), 3)
+
+            # A change in a polled directory is found and reported, and the
+            # directory is then watched in place of the least-recently active
+            # one.
+
+            polled_path = polled_paths[0]
+            with open(os.path.join(polled_path, 'file1'), 'w'):
+                pass
+
+            events = self.__read_all_events(i)
+
+            self.assertEqual(
+                [(event_path, filename, type_names)
+                 for _, type_names, event_path, filename
+                 in events],
+                [(polled_path, 'file1', ['IN_CREATE'])])
+
+            self.assertIsNotNone(i.inotify.get_watch_id(polled_path))
+
+            stats = i.budget_stats
+
+            self.assertEqual(stats.watches, 3)
+            self.assertEqual(stats.polled_directories, 3)
+            self.assertEqual(stats.evictions, 1)
+            self.assertEqual(stats.promotions, 1)
+            self.assertGreater(stats.polls, 0)
+
+            # Now that it's watched, it gets real events.
+
+            with open(os.path.join(polled_path, 'file2'), 'w'):
+                pass
+
+            events = self.__read_all_events(i)
+
+            self.assertEqual(
+                [(event_path, filename) for _, _, event_path, filename in events],
+                [(polled_path, 'file2')])
+
+            self.assertEqual(i.budget_stats.evictions, 1)
+
+            # A new directory is the most recently active, so it's watched.
+
+            new_path = os.path.join(polled_path, 'ff')
+            os.mkdir(new_path)
+
+            events = self.__read_all_events(i)
+
+            self.assertEqual(
+                [(event_path, filename) for _, _, event_path, filename in events],
+                [(polled_path, 'ff')])
+
+            self.assertIsNotNone(i.inotify.get_watch_id(new_path))
+
+            stats = i.budget_stats
+
+            self.assertEqual(stats.watches, 3)
+            self.assertEqual(stats.polled_directories, 4)
+            self.assertEqual(stats.evictions, 2)
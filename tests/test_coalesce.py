@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import unittest
+
+import inotify.adapters
+import inotify.coalesce
+import inotify.constants
+import inotify.test_support
+
+
+class TestCoalesce(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestCoalesce, self).__init__(*args, **kwargs)
+
+    def test__coalesce(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify(compact_events=True)
+            i.add_watch(path)
+
+            # Identical consecutive events are merged by the kernel, so we
+            # alternate.
+            with open(os.path.join(path, 'aa'), 'w') as f:
+                for _ in range(50):
+                    f.write('x')
+                    f.flush()
+
+                    os.chmod(f.name, 0o600)
+
+            with open(os.path.join(path, 'bb'), 'w') as f:
+                f.write('x')
+
+            os.rename(os.path.join(path, 'bb'), os.path.join(path, 'cc'))
+
+            events = inotify.coalesce.coalesce(
+                        i.event_gen(timeout_s=1, yield_nones=True),
+                        window_s=60)
+
+            events = [event for event in events if event is not None]
+
+            self.assertEqual(
+                [(event.filename, sorted(event.type_names), event.count) for event in events[:2]],
+                [
+                    ('aa', ['IN_ATTRIB', 'IN_CLOSE_WRITE', 'IN_CREATE', 'IN_MODIFY', 'IN_OPEN'], 103),
+                    ('bb', ['IN_CLOSE_WRITE', 'IN_CREATE', 'IN_MODIFY', 'IN_OPEN'], 4),
+                ])
+
+            # Moves are passed through.
+            self.assertEqual(
+                [(event.filename, event.type_names) for event in events[2:]],
+                [
+                    ('bb', ('IN_MOVED_FROM',)),
+                    ('cc', ('IN_MOVED_TO',)),
+                ])
+
+    def test__window(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify()
+            i.add_watch(path, inotify.constants.IN_ATTRIB | inotify.constants.IN_MODIFY)
+
+            filename = os.path.join(path, 'aa')
+            with open(filename, 'w') as f:
+                for _ in range(5):
+                    f.write('x')
+                    f.flush()
+
+                    os.chmod(filename, 0o600)
+
+            coalescer = inotify.coalesce.Coalescer(window_s=10)
+
+            output = []
+            for event in i.read_events():
+                output += coalescer.process(event)
+
+            self.assertEqual(output, [])
+            self.assertEqual(coalescer.flush(now=time.monotonic()), [])
+
+            output += coalescer.flush(now=time.monotonic() + 10)
+
+            self.assertEqual(len(output), 1)
+            self.assertEqual(output[0].count, 10)
+            self.assertEqual(coalescer.collapsed_count, 9)
+            self.assertEqual(len(coalescer), 0)
+
+    def test__recreated(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify()
+            i.add_watch(path, inotify.constants.IN_CREATE | inotify.constants.IN_DELETE)
+
+            filename = os.path.join(path, 'aa')
+
+            with open(filename, 'w'):
+                pass
+
+            os.unlink(filename)
+
+            with open(filename, 'w'):
+                pass
+
+            coalescer = inotify.coalesce.Coalescer(window_s=10)
+
+            output = []
+            for event in i.read_events():
+                output += coalescer.process(event)
+
+            output += coalescer.flush()
+
+            # The file exists at the end.
+            self.assertEqual(
+                [(event.filename, event.type_names, event.count) for event in output],
+                [
+                    ('aa', ('IN_CREATE',), 1),
+                    ('aa', ('IN_DELETE',), 1),
+                    ('aa', ('IN_CREATE',), 1),
+                ])
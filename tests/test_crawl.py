@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.adapters
+import inotify.crawl
+import inotify.test_support
+
+
+class TestCrawl(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestCrawl, self).__init__(*args, **kwargs)
+
+    @staticmethod
+    def _build_tree(path):
+        for rel_path in ('aa/cc/ee', 'aa/dd', 'bb/ff'):
+            os.makedirs(os.path.join(path, rel_path))
+
+        with open(os.path.join(path, 'aa', 'file'), 'w'):
+            pass
+
+        os.symlink(os.path.join(path, 'bb'), os.path.join(path, 'link_to_bb'))
+
+    def test__crawl(self):
+        with inotify.test_support.temp_path() as path:
+            TestCrawl._build_tree(path)
+
+            progress = []
+            paths = inotify.crawl.crawl(path, progress_cb=progress.append)
+
+            rel_paths = [os.path.relpath(p, path) for p in paths]
+
+            # Breadth-first, so the depths never decrease. The symlink is
+            # followed.
+            depths = [p.count('/') + (p != '.') for p in rel_paths]
+            self.assertEqual(depths, sorted(depths))
+
+            self.assertEqual(
+                sorted(rel_paths),
+                sorted(['.', 'aa', 'bb', 'link_to_bb', 'aa/cc', 'aa/dd',
+                        'bb/ff', 'link_to_bb/ff', 'aa/cc/ee']))
+
+            self.assertEqual(len(progress), 1)
+            self.assertEqual(progress[0].directories, 9)
+            self.assertEqual(progress[0].entries, 9)
+
+    def test__crawl__parallel_order(self):
+        with inotify.test_support.temp_path() as path:
+            TestCrawl._build_tree(path)
+
+            self.assertEqual(
+                inotify.crawl.crawl(path, workers=4),
+                inotify.crawl.crawl(path))
+
+    def test__crawl__missing(self):
+        self.assertEqual(inotify.crawl.crawl('/does/not/exist'), [])
+
+    def test__crawl__exclude(self):
+        with inotify.test_support.temp_path() as path:
+            TestCrawl._build_tree(path)
+
+            paths = inotify.crawl.crawl(
+                        path,
+                        exclude_cb=lambda p: os.path.basename(p) == 'aa')
+
+            self.assertEqual(
+                sorted(os.path.relpath(p, path) for p in paths),
+                sorted(['.', 'bb', 'link_to_bb', 'bb/ff', 'link_to_bb/ff']))
+
+    def test__tree__time_to_ready(self):
+        with inotify.test_support.temp_path() as path:
+            TestCrawl._build_tree(path)
+
+            i = inotify.adapters.InotifyTree(path, crawl_workers=2)
+            self.assertIsNotNone(i.time_to_ready_s)
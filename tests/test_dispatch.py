@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import unittest
+
+import inotify.adapters
+import inotify.constants
+import inotify.dispatch
+import inotify.events
+import inotify.test_support
+
+_CONTEXT = multiprocessing.get_context('fork')
+_RESULTS = _CONTEXT.Queue()
+
+
+def _handle_event(event):
+    _RESULTS.put((os.getpid(), event.path, event.filename, event.mask))
+
+
+def _exit(event):
+    os._exit(1)
+
+
+class TestDispatcher(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestDispatcher, self).__init__(*args, **kwargs)
+
+    def test__dispatch(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify()
+            i.add_watch(path, inotify.constants.IN_CREATE | inotify.constants.IN_CLOSE_WRITE)
+
+            filenames = ['file{}'.format(j) for j in range(20)]
+            for filename in filenames:
+                with open(os.path.join(path, filename), 'w'):
+                    pass
+
+            events = list(i.event_gen(timeout_s=1, yield_nones=False))
+            self.assertEqual(len(events), 40)
+
+            # A small ring, so that we'll have to wait on the workers.
+            dispatcher = inotify.dispatch.Dispatcher(
+                            _handle_event,
+                            workers=3,
+                            slot_count=2,
+                            context=_CONTEXT)
+
+            with dispatcher:
+                for event in events:
+                    dispatcher.dispatch(event)
+
+                stats = dispatcher.stats
+
+            self.assertEqual(sum(s.dispatched for s in stats), 40)
+
+            results = [_RESULTS.get(timeout=5) for _ in range(40)]
+
+            # Every event for a file was handled by the same worker, in order.
+
+            by_filename = {}
+            for pid, path_, filename, mask in results:
+                self.assertEqual(path_, path)
+                by_filename.setdefault(filename, []).append((pid, mask))
+
+            self.assertEqual(sorted(by_filename.keys()), sorted(filenames))
+
+            for handled in by_filename.values():
+                self.assertEqual(len(set(pid for pid, _ in handled)), 1)
+
+                self.assertEqual(
+                    [mask for _, mask in handled],
+                    [inotify.constants.IN_CREATE, inotify.constants.IN_CLOSE_WRITE])
+
+            self.assertGreater(len(set(pid for pid, _, _, _ in results)), 1)
+
+    def __get_event(self, path, filename):
+        return inotify.events.make_event(
+                False,
+                1,
+                inotify.constants.IN_CREATE,
+                path,
+                filename)
+
+    def test__dispatch__worker_exited(self):
+        dispatcher = inotify.dispatch.Dispatcher(
+                        _exit,
+                        workers=1,
+                        slot_count=1,
+                        context=_CONTEXT)
+
+        # The worker exits on the first event, so its ring fills up and then
+        # we can't wait for it.
+
+        with self.assertRaises(inotify.dispatch.WorkerError):
+            with dispatcher:
+                for j in range(10):
+                    dispatcher.dispatch(self.__get_event('/aa', 'file{}'.format(j)))
+
+    def test__dispatch__too_long(self):
+        with inotify.dispatch.Dispatcher(
+                _handle_event,
+                workers=1,
+                context=_CONTEXT) as dispatcher:
+            with self.assertRaises(ValueError):
+                dispatcher.dispatch(self.__get_event('/' + 'a' * 4096, 'file'))
+
+            with self.assertRaises(ValueError):
+                dispatcher.dispatch(self.__get_event('/aa', 'f' * 256))
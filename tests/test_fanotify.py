@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import unittest
+
+import inotify.adapters
+import inotify.constants
+import inotify.fanotify
+import inotify.test_support
+
+
+def _is_supported():
+    with inotify.test_support.temp_path() as path:
+        return inotify.fanotify.is_supported(path)
+
+
+@unittest.skipIf(
+    _is_supported() is False,
+    "fanotify isn't supported (or we don't have the capabilities)")
+class TestFanotifyTree(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestFanotifyTree, self).__init__(*args, **kwargs)
+
+    def __read_all_events(self, i):
+        events = i.event_gen(timeout_s=0.2, yield_nones=False)
+        return [(e[2], e[3], e[1]) for e in events]
+
+    def test__event_gen(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.fanotify.FanotifyTree(path, block_duration_s=0.1)
+
+            os.mkdir('aa')
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [
+                    (path, 'aa', ['IN_CREATE', 'IN_ISDIR']),
+                ])
+
+            with open(os.path.join('aa', 'file1'), 'w') as f:
+                f.write('data')
+
+            path1 = os.path.join(path, 'aa')
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [
+                    (path1, 'file1', ['IN_CREATE']),
+                    (path1, 'file1', ['IN_MODIFY']),
+                    (path1, 'file1', ['IN_CLOSE_WRITE']),
+                ])
+
+            # The cached path follows the rename.
+
+            os.rename('aa', 'bb')
+
+            events = list(i.event_gen(timeout_s=0.2, yield_nones=False))
+
+            self.assertEqual(
+                [(e[2], e[3], e[1]) for e in events],
+                [
+                    (path, 'aa', ['IN_MOVED_FROM', 'IN_ISDIR']),
+                    (path, 'bb', ['IN_MOVED_TO', 'IN_ISDIR']),
+                    (os.path.join(path, 'bb'), '', ['IN_MOVE_SELF', 'IN_ISDIR']),
+                ])
+
+            if i.is_renames_paired is True:
+                self.assertNotEqual(events[0][0].cookie, 0)
+                self.assertEqual(events[0][0].cookie, events[1][0].cookie)
+
+            os.unlink(os.path.join('bb', 'file1'))
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [
+                    (os.path.join(path, 'bb'), 'file1', ['IN_DELETE']),
+                ])
+
+            i.close()
+
+    def test__outside_tree(self):
+        with inotify.test_support.temp_path() as path:
+            os.mkdir('watched')
+            watched_path = os.path.join(path, 'watched')
+
+            i = inotify.fanotify.FanotifyTree(
+                    watched_path,
+                    block_duration_s=0.1,
+                    mask=inotify.constants.IN_CREATE,
+                    compact_events=True)
+
+            # The mark covers the whole filesystem.
+            with open('file1', 'w'):
+                pass
+
+            with open(os.path.join('watched', 'file2'), 'w'):
+                pass
+
+            events = list(i.event_gen(timeout_s=0.2, yield_nones=False))
+
+            self.assertEqual(
+                [(e.path, e.filename, e.type_names) for e in events],
+                [
+                    (watched_path, 'file2', ('IN_CREATE',)),
+                ])
+
+            stats = i.stats()
+
+            self.assertEqual(stats.watches, 1)
+            self.assertGreaterEqual(stats.events_filtered, 1)
+
+            i.close()
+
+    def test__deleted_directories(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.fanotify.FanotifyTree(
+                    path,
+                    block_duration_s=0.1,
+                    mask=inotify.constants.IN_CREATE | inotify.constants.IN_DELETE)
+
+            os.makedirs(os.path.join('new', 'd'))
+            with open(os.path.join('new', 'd', 'f'), 'w'):
+                pass
+
+            # Keep the inodes around so that the directories can still be
+            # opened after they've been deleted.
+            fds = [
+                os.open('new', os.O_PATH),
+                os.open(os.path.join('new', 'd'), os.O_PATH),
+            ]
+
+            shutil.rmtree('new')
+
+            # Everything is gone before we read, so what happened beneath the
+            # new directory can't be resolved (rather than being reported as
+            # in "<path> (deleted)").
+
+            try:
+                self.assertEqual(
+                    self.__read_all_events(i),
+                    [
+                        (path, 'new', ['IN_CREATE', 'IN_ISDIR']),
+                        (path, 'new', ['IN_DELETE', 'IN_ISDIR']),
+                    ])
+            finally:
+                for fd in fds:
+                    os.close(fd)
+
+            self.assertEqual(i.cached_paths, 1)
+
+            i.close()
+
+    def test__create_tree(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.fanotify.create_tree(path)
+            self.assertIsInstance(i, inotify.fanotify.FanotifyTree)
+
+            i.close()
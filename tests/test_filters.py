@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.adapters
+import inotify.constants
+import inotify.filters
+import inotify.test_support
+
+
+class TestFilterSpec(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestFilterSpec, self).__init__(*args, **kwargs)
+
+    def __read_all_events(self, i):
+        events = list(i.event_gen(timeout_s=1, yield_nones=False))
+        return [(path, filename) for _, _, path, filename in events]
+
+    def test__exclude(self):
+        with inotify.test_support.temp_path() as path:
+            os.makedirs(os.path.join(path, 'node_modules', 'aa'))
+            os.makedirs(os.path.join(path, 'src', '.git'))
+            os.makedirs(os.path.join(path, 'src', 'build', 'out'))
+
+            spec = inotify.filters.FilterSpec(
+                    mask=inotify.constants.IN_CREATE,
+                    exclude=['node_modules', '.git', '*/src/build', '*.pyc'])
+
+            i = inotify.adapters.InotifyTree(path, filter_spec=spec)
+
+            self.assertIsNotNone(i.inotify.get_watch_id(os.path.join(path, 'src')))
+
+            for rel_path in ('node_modules', 'node_modules/aa', 'src/.git', 'src/build', 'src/build/out'):
+                self.assertIsNone(i.inotify.get_watch_id(os.path.join(path, rel_path)))
+
+            for rel_path in ('node_modules/aa/file', 'src/build/out/file', 'src/file.pyc', 'src/file.py'):
+                with open(os.path.join(path, rel_path), 'w'):
+                    pass
+
+            os.mkdir(os.path.join(path, 'src', 'node_modules'))
+
+            with open(os.path.join(path, 'src', 'node_modules', 'file'), 'w'):
+                pass
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [(os.path.join(path, 'src'), 'file.py')])
+
+            self.assertIsNone(i.inotify.get_watch_id(os.path.join(path, 'src', 'node_modules')))
+
+    def test__include(self):
+        with inotify.test_support.temp_path() as path:
+            spec = inotify.filters.FilterSpec(
+                    mask=inotify.constants.IN_CREATE,
+                    include=['*.py'])
+
+            i = inotify.adapters.InotifyTree(path, filter_spec=spec)
+
+            os.mkdir(os.path.join(path, 'aa'))
+
+            # Directories aren't subject to `include`.
+            self.assertEqual(self.__read_all_events(i), [(path, 'aa')])
+
+            for filename in ('aa/file.py', 'aa/file.txt'):
+                with open(os.path.join(path, filename), 'w'):
+                    pass
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [(os.path.join(path, 'aa'), 'file.py')])
+
+    def test__subtree_masks(self):
+        with inotify.test_support.temp_path() as path:
+            os.makedirs(os.path.join(path, 'logs', 'aa'))
+
+            spec = inotify.filters.FilterSpec(
+                    mask=inotify.constants.IN_CREATE | inotify.constants.IN_CLOSE_WRITE,
+                    subtree_masks={
+                        'logs': inotify.constants.IN_CREATE,
+                    })
+
+            i = inotify.adapters.InotifyTree(path, filter_spec=spec)
+
+            path1 = os.path.join(path, 'logs', 'aa', 'bb')
+            os.mkdir(path1)
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [(os.path.join(path, 'logs', 'aa'), 'bb')])
+
+            for directory in (path1, path):
+                with open(os.path.join(directory, 'file'), 'w'):
+                    pass
+
+            events = list(i.event_gen(timeout_s=1, yield_nones=False))
+
+            self.assertEqual(
+                [(path_, filename, type_names) for _, type_names, path_, filename in events],
+                [
+                    (path1, 'file', ['IN_CREATE']),
+                    (path, 'file', ['IN_CREATE']),
+                    (path, 'file', ['IN_CLOSE_WRITE']),
+                ])
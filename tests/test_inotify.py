@@ -4,10 +4,13 @@ import os
 import unittest
 import collections
 import errno
+import time
 
 import inotify.constants
 import inotify.calls
 import inotify.adapters
+import inotify.crawl
+import inotify.events
 import inotify.test_support
 
 try:
@@ -229,6 +232,293 @@ class TestInotify(unittest.TestCase):
         else:
             raise Exception("Expected exception.")
 
+    def test__handle_inotify_event__partial_reads(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify()
+            wd = i.add_watch(path)
+
+            stream = b''
+            for filename, mask in ((b'aa', 256), (b'bb', 32), (b'', 1024)):
+                padded_length = ((len(filename) + 15) // 16) * 16
+                stream += inotify.adapters._HEADER_STRUCT.pack(wd, mask, 0, padded_length)
+                stream += filename.ljust(padded_length, b'\0')
+
+            r, w = os.pipe()
+
+            try:
+                # Split the stream in the middle of the second event.
+                split_at = inotify.adapters._STRUCT_HEADER_LENGTH + 16 + 5
+
+                os.write(w, stream[:split_at])
+                events = list(i._handle_inotify_event(r))
+
+                os.write(w, stream[split_at:])
+                events += list(i._handle_inotify_event(r))
+            finally:
+                os.close(r)
+                os.close(w)
+
+            expected = [
+                (inotify.adapters._INOTIFY_EVENT(wd=wd, mask=256, cookie=0, len=16), ['IN_CREATE'], path, 'aa'),
+                (inotify.adapters._INOTIFY_EVENT(wd=wd, mask=32, cookie=0, len=16), ['IN_OPEN'], path, 'bb'),
+                (inotify.adapters._INOTIFY_EVENT(wd=wd, mask=1024, cookie=0, len=0), ['IN_DELETE_SELF'], path, ''),
+            ]
+
+            self.assertEqual(events, expected)
+
+    def test__read_events(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify([path])
+
+            self.assertEqual(i.read_events(), [])
+
+            TestInotify._open_write_close(path, 'new_file')
+
+            events = i.read_events(max_events=2, timeout_s=1)
+
+            expected = [
+                TestInotify._event_create(wd=1, path=path, filename='new_file'),
+                TestInotify._event_open(wd=1, path=path, filename='new_file'),
+            ]
+
+            self.assertEqual(events, expected)
+
+            # The remainder should have been kept for the next call.
+
+            events = i.read_events()
+
+            expected = [
+                TestInotify._event_close_write(wd=1, path=path, filename='new_file'),
+            ]
+
+            self.assertEqual(events, expected)
+            self.assertEqual(i.read_events(), [])
+
+    def test__event_gen__abandoned(self):
+        with inotify.test_support.temp_path() as path:
+            filenames = ['file{}'.format(j) for j in range(200)]
+            for filename in filenames:
+                with open(os.path.join(path, filename), 'w'):
+                    pass
+
+            i = inotify.adapters.Inotify(
+                    read_buffer_size=1024,
+                    maximum_read_buffer_size=1024,
+                    compact_events=True)
+
+            i.add_watch(path, inotify.constants.IN_DELETE)
+
+            for filename in filenames:
+                os.unlink(os.path.join(path, filename))
+
+            # Each generator is abandoned after one event, leaving whole
+            # events in the buffer. The next one has to yield those without
+            # waiting for the kernel.
+
+            received = []
+            for _ in filenames:
+                for event in i.event_gen(timeout_s=0.1, yield_nones=False):
+                    received.append(event.filename)
+                    break
+
+            self.assertEqual(received, filenames)
+
+    def test__init_flags(self):
+        i = inotify.adapters.Inotify()
+
+        self.assertFalse(os.get_blocking(i.fd))
+        self.assertFalse(os.get_inheritable(i.fd))
+
+    def test__close(self):
+        i = inotify.adapters.Inotify()
+        fd = i.fd
+
+        i.close()
+        self.assertIsNone(i.fd)
+
+        with self.assertRaises(OSError):
+            os.fstat(fd)
+
+        # Closing again (e.g. when collected) is harmless.
+        i.close()
+
+    def test__event_gen__block_until_deadline(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify([path], block_duration_s=None)
+
+            TestInotify._open_write_close(path, 'new_file')
+
+            # We should get one `None` after the batch and then nothing until
+            # the deadline.
+            events = list(i.event_gen(timeout_s=0.5))
+
+            expected = [
+                TestInotify._event_create(wd=1, path=path, filename='new_file'),
+                TestInotify._event_open(wd=1, path=path, filename='new_file'),
+                TestInotify._event_close_write(wd=1, path=path, filename='new_file'),
+                None,
+            ]
+
+            self.assertEqual(events, expected)
+
+    def test__compact_events(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify([path], compact_events=True)
+
+            TestInotify._open_write_close(path, 'new_file')
+            os.mkdir(os.path.join(path, 'new_folder'))
+
+            events = self.__read_all_events(i)
+
+            for event in events:
+                self.assertIsInstance(event, inotify.events.InotifyEvent)
+
+            # They should still look like tuples to existing callers.
+            expected = [
+                TestInotify._event_create(wd=1, path=path, filename='new_file'),
+                TestInotify._event_open(wd=1, path=path, filename='new_file'),
+                TestInotify._event_close_write(wd=1, path=path, filename='new_file'),
+                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=1073742080, cookie=0, len=16), ['IN_CREATE', 'IN_ISDIR'], path, 'new_folder'),
+            ]
+
+            self.assertEqual(events, expected)
+
+            (header, type_names, event_path, filename) = events[0]
+            self.assertEqual(header.mask, inotify.constants.IN_CREATE)
+            self.assertEqual(filename, 'new_file')
+
+            event = events[3]
+            self.assertEqual(event.wd, 1)
+            self.assertEqual(event.mask, 1073742080)
+            self.assertEqual(event.filename_bytes, b'new_folder')
+            self.assertEqual(event.full_path, os.path.join(path, 'new_folder'))
+            self.assertFalse(hasattr(event, '__dict__'))
+
+    def test__trace_cb(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = TestInotify._make_temp_path(path, 'aa')
+
+            records = []
+            i = inotify.adapters.Inotify([path, path1], trace_cb=records.append)
+
+            TestInotify._open_write_close(path, 'new_file')
+
+            # The events for this watch will be dropped once we forget it.
+            i.remove_watch(path1, superficial=True)
+            TestInotify._open_write_close(path1, 'dropped_file')
+
+            events = self.__read_all_events(i)
+
+            expected = [
+                TestInotify._event_create(wd=1, path=path, filename='new_file'),
+                TestInotify._event_open(wd=1, path=path, filename='new_file'),
+                TestInotify._event_close_write(wd=1, path=path, filename='new_file'),
+            ]
+
+            self.assertEqual(events, expected)
+
+            headers = [(r.header.wd, r.header.mask, r.is_dropped) for r in records]
+
+            expected = [
+                (1, 256, False),
+                (1, 32, False),
+                (1, 8, False),
+                (2, 256, True),
+                (2, 32, True),
+                (2, 8, True),
+            ]
+
+            self.assertEqual(headers, expected)
+
+            # Everything was read in one go, so the queue should drain.
+            depths = [r.queue_depth_bytes for r in records]
+            self.assertEqual(depths, sorted(depths, reverse=True))
+            self.assertEqual(depths[-1], 0)
+
+    def test__read_buffer_size__too_small(self):
+        fd_count = len(os.listdir('/proc/self/fd'))
+
+        with self.assertRaises(ValueError):
+            inotify.adapters.Inotify(read_buffer_size=256)
+
+        # Nothing was opened.
+        self.assertEqual(len(os.listdir('/proc/self/fd')), fd_count)
+
+    def test__read_buffer_size__grows(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify(
+                    read_buffer_size=4096,
+                    maximum_read_buffer_size=64 * 1024)
+
+            i.add_watch(path, inotify.constants.IN_CREATE)
+
+            def create_files(prefix):
+                for j in range(500):
+                    TestInotify._make_temp_path(path, '{}{:04d}'.format(prefix, j))
+
+            # The first read fills the buffer, so it grows to fit everything
+            # else that's queued and reads the rest.
+
+            create_files('aa')
+
+            events = i.read_events()
+            self.assertEqual(len(events), 500)
+
+            stats = i.stats()
+
+            self.assertEqual(stats.reads, 2)
+            self.assertEqual(stats.read_buffer_size, 16 * 1024)
+            self.assertEqual(stats.read_bytes.count, 2)
+            self.assertEqual(stats.bytes_read, 500 * 32)
+
+            # The same amount now only takes one read.
+
+            create_files('bb')
+
+            events = i.read_events()
+            self.assertEqual(len(events), 500)
+
+            stats = i.stats()
+
+            self.assertEqual(stats.reads, 3)
+            self.assertEqual(stats.read_buffer_size, 16 * 1024)
+            self.assertEqual(stats.read_bytes.max, 500 * 32)
+
+            # But it never grows beyond the maximum.
+
+            create_files('cc')
+            create_files('dd')
+            create_files('ee')
+            create_files('ff')
+            create_files('gg')
+
+            events = i.read_events()
+            self.assertEqual(len(events), 2500)
+
+            self.assertEqual(i.stats().read_buffer_size, 64 * 1024)
+
+    def test__add_watches(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = TestInotify._make_temp_path(path, 'aa')
+            path2 = TestInotify._make_temp_path(path, 'bb')
+            missing_path = os.path.join(path, 'missing')
+
+            i = inotify.adapters.Inotify()
+            watches, errors = i.add_watches([path1, missing_path, path2])
+
+            self.assertEqual(watches, {path1: 1, path2: 2})
+            self.assertEqual(errors, {missing_path: errno.ENOENT})
+
+            TestInotify._open_write_close(path2, 'new_file')
+
+            events = i.read_events(max_events=1, timeout_s=1)
+
+            expected = [
+                TestInotify._event_create(wd=2, path=path2, filename='new_file'),
+            ]
+
+            self.assertEqual(events, expected)
+
     def test__get_event_names(self):
         all_mask = 0
         for bit in inotify.constants.MASK_LOOKUP.keys():
@@ -242,6 +532,19 @@ class TestInotify(unittest.TestCase):
 
         self.assertEqual(names, all_names)
 
+    def test__get_event_names__cached(self):
+        mask = inotify.constants.IN_CREATE | inotify.constants.IN_ISDIR
+
+        names = inotify.events.get_event_names(mask)
+
+        self.assertEqual(names, ('IN_CREATE', 'IN_ISDIR'))
+        self.assertIs(inotify.events.get_event_names(mask), names)
+
+        flags = inotify.constants.EventMask(mask)
+
+        self.assertIn(inotify.constants.EventMask.IN_CREATE, flags)
+        self.assertNotIn(inotify.constants.EventMask.IN_DELETE, flags)
+
 
 class TestInotifyTree(unittest.TestCase):
     def __init__(self, *args, **kwargs):
@@ -346,20 +649,11 @@ class TestInotifyTree(unittest.TestCase):
             for event in events2:
                 event[1].sort()
 
+            # The watch is just relinked, so the folder isn't listed again.
             expected = [
-                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=1073741825, cookie=0, len=16), ['IN_ACCESS', 'IN_ISDIR'], path, 'new_folder'),
-                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=1073741825, cookie=0, len=16), ['IN_ACCESS', 'IN_ISDIR'], path, 'new_folder'),
-                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=1073741840, cookie=0, len=16), ['IN_CLOSE_NOWRITE', 'IN_ISDIR'], path, 'new_folder'),
-                (inotify.adapters._INOTIFY_EVENT(wd=1, mask=1073741856, cookie=0, len=16), ['IN_ISDIR', 'IN_OPEN'], path, 'new_folder'),
-
                 (inotify.adapters._INOTIFY_EVENT(wd=1, mask=1073741888, cookie=events2[0][0].cookie, len=16), ['IN_ISDIR', 'IN_MOVED_FROM'], path, 'old_folder'),
                 (inotify.adapters._INOTIFY_EVENT(wd=1, mask=1073741952, cookie=events2[1][0].cookie, len=16), ['IN_ISDIR', 'IN_MOVED_TO'], path, 'new_folder'),
                 (inotify.adapters._INOTIFY_EVENT(wd=2, mask=2048, cookie=0, len=0), ['IN_MOVE_SELF'], os.path.join(path, 'new_folder'), ''),
-
-                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=1073741825, cookie=0, len=0), ['IN_ACCESS', 'IN_ISDIR'], os.path.join(path, 'new_folder'), ''),
-                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=1073741825, cookie=0, len=0), ['IN_ACCESS', 'IN_ISDIR'], os.path.join(path, 'new_folder'), ''),
-                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=1073741840, cookie=0, len=0), ['IN_CLOSE_NOWRITE', 'IN_ISDIR'], os.path.join(path, 'new_folder'), ''),
-                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=1073741856, cookie=0, len=0), ['IN_ISDIR', 'IN_OPEN'], os.path.join(path, 'new_folder'), ''),
             ]
 
             self.assertEqual(sorted(events2), sorted(expected))
@@ -397,6 +691,116 @@ class TestInotifyTree(unittest.TestCase):
 
             self.assertEqual(sorted(events3), sorted(expected))
 
+    def test__renames__descendants(self):
+        with inotify.test_support.temp_path() as path:
+            old_path = os.path.join(path, 'old_folder')
+            new_path = os.path.join(path, 'new_folder')
+
+            os.makedirs(os.path.join(old_path, 'aa', 'bb'))
+
+            i = inotify.adapters.InotifyTree(
+                    path,
+                    mask=inotify.constants.IN_CREATE | inotify.constants.IN_MOVE)
+
+            os.rename(old_path, new_path)
+            self.__read_all_events(i)
+
+            with open(os.path.join(new_path, 'aa', 'bb', 'filename'), 'w'):
+                pass
+
+            events = self.__read_all_events(i)
+
+            self.assertEqual(
+                [(event_path, filename) for _, _, event_path, filename in events],
+                [(os.path.join(new_path, 'aa', 'bb'), 'filename')])
+
+            self.assertIsNone(i.inotify.get_watch_id(old_path))
+            self.assertEqual(i.inotify.get_watch_id(os.path.join(new_path, 'aa')), 3)
+
+    def test__renames__not_adjacent(self):
+        with inotify.test_support.temp_path() as path:
+            old_path = os.path.join(path, 'old_folder')
+            new_path = os.path.join(path, 'new_folder')
+
+            os.makedirs(os.path.join(old_path, 'aa'))
+
+            i = inotify.adapters.InotifyTree(
+                    path,
+                    mask=inotify.constants.IN_CREATE | inotify.constants.IN_MOVE)
+
+            os.rename(old_path, new_path)
+            self.__read_all_events(i)
+
+            # The two halves can be separated by other events, and by reads,
+            # as long as the moved-to arrives in time.
+
+            os.rename(new_path, old_path)
+
+            moved_mask = inotify.constants.IN_ISDIR | inotify.constants.IN_MOVED_FROM
+            i._handle_event(
+                inotify.events.make_event(
+                    False, 1, moved_mask, path, 'new_folder', cookie=100))
+
+            with open(os.path.join(path, 'filename'), 'w'):
+                pass
+
+            i._handle_event(
+                inotify.events.make_event(
+                    False, 1, inotify.constants.IN_CREATE, path, 'filename'))
+
+            i._finish_pending_move()
+
+            moved_mask = inotify.constants.IN_ISDIR | inotify.constants.IN_MOVED_TO
+            i._handle_event(
+                inotify.events.make_event(
+                    False, 1, moved_mask, path, 'old_folder', cookie=100))
+
+            self.assertIsNone(i.inotify.get_watch_id(new_path))
+            self.assertEqual(i.inotify.get_watch_id(os.path.join(old_path, 'aa')), 3)
+
+            # If the moved-to doesn't arrive in time, the directory has left
+            # the tree.
+
+            moved_mask = inotify.constants.IN_ISDIR | inotify.constants.IN_MOVED_FROM
+            i._handle_event(
+                inotify.events.make_event(
+                    False, 1, moved_mask, path, 'old_folder', cookie=200))
+
+            i._finish_pending_move()
+            self.assertEqual(i.inotify.get_watch_id(old_path), 2)
+
+            time.sleep(inotify.adapters._PENDING_MOVE_WINDOW_S)
+
+            i._finish_pending_move()
+            self.assertIsNone(i.inotify.get_watch_id(old_path))
+            self.assertIsNone(i.inotify.get_watch_id(os.path.join(old_path, 'aa')))
+
+    def test__renames__out_of_tree(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = os.path.join(path, 'watched')
+            path2 = os.path.join(path, 'unwatched')
+
+            os.makedirs(os.path.join(path1, 'folder1', 'aa'))
+            os.mkdir(path2)
+
+            i = inotify.adapters.InotifyTree(
+                    path1,
+                    mask=inotify.constants.IN_CREATE | inotify.constants.IN_MOVE)
+
+            os.rename(
+                os.path.join(path1, 'folder1'),
+                os.path.join(path2, 'folder1'))
+
+            self.__read_all_events(i)
+
+            self.assertIsNone(i.inotify.get_watch_id(os.path.join(path1, 'folder1')))
+            self.assertIsNone(i.inotify.get_watch_id(os.path.join(path1, 'folder1', 'aa')))
+
+            with open(os.path.join(path2, 'folder1', 'aa', 'filename'), 'w'):
+                pass
+
+            self.assertEqual(self.__read_all_events(i), [])
+
     def test__automatic_new_watches_on_new_paths(self):
 
         # Tests that watches are actively established as new folders are
@@ -455,6 +859,173 @@ class TestInotifyTree(unittest.TestCase):
 
             self.assertEqual(events, expected)
 
+    def test__compact_events(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.InotifyTree(path, compact_events=True)
+
+            path1 = os.path.join(path, 'folder1')
+            os.mkdir(path1)
+
+            self.__read_all_events(i)
+
+            with open(os.path.join(path1, 'filename'), 'w'):
+                pass
+
+            events = self.__read_all_events(i)
+
+            expected = [
+                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=256, cookie=0, len=16), ['IN_CREATE'], path1, 'filename'),
+                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=32, cookie=0, len=16), ['IN_OPEN'], path1, 'filename'),
+                (inotify.adapters._INOTIFY_EVENT(wd=2, mask=8, cookie=0, len=16), ['IN_CLOSE_WRITE'], path1, 'filename'),
+            ]
+
+            self.assertEqual(events, expected)
+
+    def test__overflow_recovery(self):
+        with open('/proc/sys/fs/inotify/max_queued_events') as f:
+            max_queued_events = int(f.read())
+
+        if max_queued_events > 100000:
+            raise unittest.SkipTest("The event queue is too large to overflow")
+
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.InotifyTree(
+                    path,
+                    mask=inotify.constants.IN_CREATE,
+                    overflow_recovery=True)
+
+            filenames = set()
+            for j in range(max_queued_events + 1000):
+                filename = 'file{}'.format(j)
+                filenames.add(filename)
+
+                with open(os.path.join(path, filename), 'w'):
+                    pass
+
+            path1 = os.path.join(path, 'folder1')
+            os.mkdir(path1)
+
+            with open(os.path.join(path1, 'filename'), 'w'):
+                pass
+
+            events = self.__read_all_events(i)
+
+            type_names = set()
+            for _, event_type_names, _, _ in events:
+                type_names.update(event_type_names)
+
+            self.assertNotIn('IN_Q_OVERFLOW', type_names)
+
+            seen = set(
+                    filename
+                    for _, _, event_path, filename
+                    in events
+                    if event_path == path)
+
+            self.assertEqual(seen, filenames | set(['folder1']))
+
+            self.assertIn(
+                (path1, 'filename'),
+                set((event_path, filename) for _, _, event_path, filename in events))
+
+            # We should be watching the new folder, too.
+
+            with open(os.path.join(path1, 'filename2'), 'w'):
+                pass
+
+            events = self.__read_all_events(i)
+
+            self.assertEqual(
+                [(event_path, filename) for _, _, event_path, filename in events],
+                [(path1, 'filename2')])
+
+    def test__save_snapshot__no_filepath(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.InotifyTree(path, overflow_recovery=True)
+
+            with self.assertRaises(ValueError):
+                i.save_snapshot()
+
+    def test__snapshot_filepath(self):
+        with inotify.test_support.temp_path() as snapshot_path, \
+             inotify.test_support.temp_path() as path:
+            path1 = os.path.join(path, 'aa')
+            path2 = os.path.join(path, 'cc')
+
+            os.makedirs(os.path.join(path1, 'bb'))
+            os.mkdir(path2)
+
+            with open(os.path.join(path2, 'file1'), 'w'):
+                pass
+
+            # Make the directories old enough that their mtimes can be trusted.
+            for dirpath, _, _ in os.walk(path):
+                os.utime(dirpath, ns=(10 ** 18, 10 ** 18))
+
+            filepath = os.path.join(snapshot_path, 'tree.snapshot')
+            mask = inotify.constants.IN_CREATE | inotify.constants.IN_DELETE
+
+            # There's no snapshot yet, so this crawls.
+
+            i = inotify.adapters.InotifyTree(path, mask=mask, snapshot_filepath=filepath)
+            i.save_snapshot()
+
+            del i
+
+            # Changes while we're not running.
+
+            os.unlink(os.path.join(path2, 'file1'))
+
+            path3 = os.path.join(path1, 'dd')
+            os.mkdir(path3)
+
+            with open(os.path.join(path3, 'file2'), 'w'):
+                pass
+
+            listed = []
+            original_scan = inotify.crawl._scan
+
+            def scan(path, **kwargs):
+                listed.append(path)
+                return original_scan(path, **kwargs)
+
+            inotify.crawl._scan = scan
+
+            try:
+                i = inotify.adapters.InotifyTree(
+                        path,
+                        mask=mask,
+                        snapshot_filepath=filepath)
+            finally:
+                inotify.crawl._scan = original_scan
+
+            # Only what changed was listed.
+            self.assertEqual(sorted(listed), sorted([path1, path2, path3]))
+            self.assertEqual(i.inotify.watch_count, 5)
+
+            events = self.__read_all_events(i)
+
+            self.assertEqual(
+                sorted((event_path, filename, type_names)
+                       for _, type_names, event_path, filename
+                       in events),
+                [
+                    (path1, 'dd', ['IN_CREATE', 'IN_ISDIR']),
+                    (path3, 'file2', ['IN_CREATE']),
+                    (path2, 'file1', ['IN_DELETE']),
+                ])
+
+            # The new directory is being watched.
+
+            with open(os.path.join(path3, 'file3'), 'w'):
+                pass
+
+            events = self.__read_all_events(i)
+
+            self.assertEqual(
+                [(event_path, filename) for _, _, event_path, filename in events],
+                [(path3, 'file3')])
+
     def test__automatic_new_watches_on_existing_paths(self):
 
         # Tests whether the watches are recursively established when we
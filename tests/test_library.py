@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+import unittest
+
+import inotify.library
+
+# Fail if anything tries to start a process (as `ctypes.util.find_library()`
+# can) while importing or while the library is loaded.
+_IMPORT_SCRIPT = """
+import subprocess
+
+def _fail(*args, **kwargs):
+    raise AssertionError("A subprocess was started")
+
+subprocess.Popen.__init__ = _fail
+
+import inotify.adapters
+import inotify.library
+
+assert inotify.library._instance is None, "The library was loaded at import"
+
+i = inotify.adapters.Inotify()
+assert inotify.library._instance is not None
+"""
+
+
+class TestLibrary(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestLibrary, self).__init__(*args, **kwargs)
+
+    def test__import__lazy(self):
+        root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        subprocess.check_call(
+            [sys.executable, '-c', _IMPORT_SCRIPT],
+            cwd=root_path)
+
+    def test__get_instance(self):
+        library = inotify.library.get_instance()
+
+        self.assertIs(inotify.library.get_instance(), library)
+        self.assertIs(inotify.library.instance, library)
+        self.assertIsNotNone(library.inotify_init1)
+
+        with self.assertRaises(AttributeError):
+            inotify.library.missing
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.adapters
+import inotify.constants
+import inotify.filters
+import inotify.metrics
+import inotify.test_support
+
+
+class TestHistogram(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestHistogram, self).__init__(*args, **kwargs)
+
+    def test__get_percentile(self):
+        histogram = inotify.metrics.Histogram()
+
+        # 1ms through 1s.
+        for i in range(1, 1001):
+            histogram.record(i / 1000.0)
+
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.max, 1.0)
+        self.assertAlmostEqual(histogram.sum, 500.5)
+
+        for percentile in (1, 50, 90, 99, 99.9):
+            expected = percentile / 100.0
+            actual = histogram.get_percentile(percentile)
+
+            self.assertGreaterEqual(actual, expected)
+            self.assertLess((actual - expected) / expected, 0.01)
+
+        self.assertEqual(histogram.get_percentile(100), 1.0)
+
+        # Above the highest trackable value.
+        histogram.record(120)
+        self.assertAlmostEqual(histogram.get_percentile(100), 60, delta=0.6)
+        self.assertEqual(histogram.max, 120)
+
+        copied = histogram.copy()
+        copied.merge(histogram)
+
+        self.assertEqual(copied.count, 2002)
+        self.assertEqual(copied.get_percentile(50), histogram.get_percentile(50))
+
+
+class TestInotifyMetrics(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestInotifyMetrics, self).__init__(*args, **kwargs)
+
+    def test__stats(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify()
+            i.add_watch(path, inotify.constants.IN_CREATE)
+
+            for j in range(3):
+                with open(os.path.join(path, 'file{}'.format(j)), 'w'):
+                    pass
+
+            stats = i.stats()
+
+            self.assertEqual(stats.reads, 0)
+            self.assertEqual(stats.watches, 1)
+            self.assertGreater(stats.queued_bytes, 0)
+
+            events = i.read_events()
+            self.assertEqual(len(events), 3)
+
+            stats = i.stats()
+
+            self.assertEqual(stats.reads, 1)
+            self.assertEqual(stats.events_read, 3)
+            self.assertEqual(stats.events_per_read, 3)
+            self.assertEqual(stats.bytes_read, sum(e[0].len + 16 for e in events))
+            self.assertEqual(stats.events_dropped, 0)
+            self.assertEqual(stats.overflows, 0)
+            self.assertEqual(stats.queued_bytes, 0)
+            self.assertEqual(stats.handler_lag_s.count, 1)
+
+            # The first batch is always timed.
+            self.assertEqual(stats.decode_s.count, 1)
+
+            # The watch limit is system-wide configuration.
+            self.assertEqual(
+                stats.maximum_watches,
+                inotify.metrics.get_maximum_user_watches())
+
+    def test__stats__filtered(self):
+        with inotify.test_support.temp_path() as path:
+            filter_spec = inotify.filters.FilterSpec(
+                            mask=inotify.constants.IN_CREATE,
+                            exclude=['*.tmp'])
+
+            tree = inotify.adapters.InotifyTree(path, filter_spec=filter_spec)
+
+            for filename in ('aa', 'bb.tmp', 'cc.tmp'):
+                with open(os.path.join(path, filename), 'w'):
+                    pass
+
+            events = list(tree.event_gen(timeout_s=0.1, yield_nones=False))
+            self.assertEqual([e[3] for e in events], ['aa'])
+
+            stats = tree.inotify.stats()
+
+            self.assertEqual(stats.events_read, 3)
+            self.assertEqual(stats.events_filtered, 2)
+
+    def test__write_prometheus(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.Inotify()
+            i.add_watch(path)
+
+            with open(os.path.join(path, 'file1'), 'w'):
+                pass
+
+            i.read_events()
+
+            filepath = os.path.join(path, 'inotify.prom')
+            inotify.metrics.write_prometheus(
+                filepath,
+                i.stats(),
+                labels={'watcher': 'test'})
+
+            with open(filepath) as f:
+                lines = f.read().splitlines()
+
+            # Nothing left behind.
+            self.assertEqual(sorted(os.listdir(path)), ['file1', 'inotify.prom'])
+
+            self.assertIn('# TYPE inotify_events_read_total counter', lines)
+            self.assertIn('inotify_events_read_total{watcher="test"} 3', lines)
+            self.assertIn('# TYPE inotify_watches gauge', lines)
+            self.assertIn('inotify_watches{watcher="test"} 1', lines)
+            self.assertIn('# TYPE inotify_handler_lag_s summary', lines)
+            self.assertIn('inotify_handler_lag_s_count{watcher="test"} 1', lines)
+
+            quantiles = [
+                line.split(' ')[0]
+                for line
+                in lines
+                if line.startswith('inotify_decode_s{')
+            ]
+
+            self.assertEqual(
+                quantiles,
+                [
+                    'inotify_decode_s{watcher="test",quantile="0.5"}',
+                    'inotify_decode_s{watcher="test",quantile="0.9"}',
+                    'inotify_decode_s{watcher="test",quantile="0.99"}',
+                    'inotify_decode_s{watcher="test",quantile="0.999"}',
+                ])
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.mounts
+import inotify.test_support
+
+_MOUNTINFO = """\
+22 1 252:1 / / rw,relatime shared:1 - ext4 /dev/vda rw
+23 22 0:21 / /proc rw,nosuid,nodev,noexec,relatime shared:5 - proc proc rw
+40 22 0:35 / /mnt/shared\\040files rw,relatime shared:20 - nfs4 server:/export rw,vers=4.2
+41 40 0:36 / /mnt/shared\\040files/scratch rw,relatime - tmpfs tmpfs rw
+42 22 0:37 / /home/user/remote rw,nosuid,nodev,relatime - fuse.sshfs user@host:/ rw
+43 22 0:38 / /var/lib/docker/overlay2/merged rw,relatime - overlay overlay rw
+"""
+
+
+class TestMounts(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestMounts, self).__init__(*args, **kwargs)
+
+    def __get_mounts(self, path):
+        filepath = os.path.join(path, 'mountinfo')
+        with open(filepath, 'w') as f:
+            f.write(_MOUNTINFO)
+
+        return inotify.mounts.read_mounts(filepath)
+
+    def test__read_mounts(self):
+        with inotify.test_support.temp_path() as path:
+            mounts = self.__get_mounts(path)
+
+            self.assertEqual(
+                [(m.mount_point, m.filesystem_type) for m in mounts],
+                [
+                    ('/', 'ext4'),
+                    ('/proc', 'proc'),
+                    ('/mnt/shared files', 'nfs4'),
+                    ('/mnt/shared files/scratch', 'tmpfs'),
+                    ('/home/user/remote', 'fuse.sshfs'),
+                    ('/var/lib/docker/overlay2/merged', 'overlay'),
+                ])
+
+            self.assertEqual(
+                [m.mount_point for m in mounts if inotify.mounts.is_blind(m)],
+                [
+                    '/mnt/shared files',
+                    '/home/user/remote',
+                ])
+
+            self.assertEqual(
+                inotify.mounts.read_mounts(os.path.join(path, 'missing')),
+                [])
+
+    def test__get_is_blind_cb(self):
+        with inotify.test_support.temp_path() as path:
+            mounts = self.__get_mounts(path)
+
+            # Nothing blind is involved.
+            self.assertIsNone(
+                inotify.mounts.get_is_blind_cb(['/var/lib'], mounts))
+
+            self.assertIsNone(
+                inotify.mounts.get_is_blind_cb(['/mnt/shared'], mounts))
+
+            # The tree contains a blind mount.
+            is_blind_cb = inotify.mounts.get_is_blind_cb(['/mnt'], mounts)
+
+            self.assertFalse(is_blind_cb('/mnt'))
+            self.assertTrue(is_blind_cb('/mnt/shared files'))
+            self.assertTrue(is_blind_cb('/mnt/shared files/aa'))
+            self.assertFalse(is_blind_cb('/mnt/shared files/scratch/aa'))
+            self.assertFalse(is_blind_cb('/mnt/shared'))
+
+            # The tree is within a blind mount.
+            is_blind_cb = inotify.mounts.get_is_blind_cb(
+                            ['/home/user/remote/project'],
+                            mounts)
+
+            self.assertTrue(is_blind_cb('/home/user/remote/project/aa'))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.adapters
+import inotify.constants
+import inotify.moves
+import inotify.test_support
+
+
+class TestMoves(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestMoves, self).__init__(*args, **kwargs)
+
+    @staticmethod
+    def __read_all_events(i):
+        events = inotify.moves.correlate(
+                    i.event_gen(timeout_s=1, yield_nones=True),
+                    window_s=0.1)
+
+        return [event for event in events if event is not None]
+
+    def test__correlate(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = os.path.join(path, 'aa')
+            path2 = os.path.join(path, 'bb')
+
+            os.mkdir(path1)
+            os.mkdir(path2)
+
+            with open(os.path.join(path1, 'old_filename'), 'w'):
+                pass
+
+            with open(os.path.join(path, 'unwatched'), 'w'):
+                pass
+
+            mask = inotify.constants.IN_MOVE | inotify.constants.IN_ATTRIB
+
+            i = inotify.adapters.Inotify()
+            i.add_watch(path1, mask)
+            i.add_watch(path2, mask)
+
+            os.rename(
+                os.path.join(path1, 'old_filename'),
+                os.path.join(path2, 'new_filename'))
+
+            os.chmod(os.path.join(path2, 'new_filename'), 0o600)
+
+            # Out of and into what we're watching.
+            os.rename(
+                os.path.join(path2, 'new_filename'),
+                os.path.join(path, 'new_filename'))
+
+            os.rename(
+                os.path.join(path, 'unwatched'),
+                os.path.join(path1, 'unwatched'))
+
+            events = self.__read_all_events(i)
+
+            moved = events[0]
+
+            self.assertEqual(
+                (moved.src, moved.dst, moved.is_dir),
+                (os.path.join(path1, 'old_filename'),
+                 os.path.join(path2, 'new_filename'),
+                 False))
+
+            self.assertEqual(moved.from_event[0].cookie, moved.cookie)
+            self.assertEqual(moved.to_event[1], ['IN_MOVED_TO'])
+
+            self.assertEqual(
+                [(type_names, path_, filename) for _, type_names, path_, filename in events[1:]],
+                [
+                    (['IN_ATTRIB'], path2, 'new_filename'),
+                    (['IN_CREATE'], path1, 'unwatched'),
+                    (['IN_DELETE'], path2, 'new_filename'),
+                ])
+
+    def test__maximum_pending(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = os.path.join(path, 'aa')
+            os.mkdir(path1)
+
+            i = inotify.adapters.Inotify(compact_events=True)
+            i.add_watch(path1, inotify.constants.IN_MOVE)
+
+            for j in range(3):
+                filename = 'file{}'.format(j)
+
+                with open(os.path.join(path1, filename), 'w'):
+                    pass
+
+                os.rename(
+                    os.path.join(path1, filename),
+                    os.path.join(path, filename))
+
+            correlator = inotify.moves.MoveCorrelator(
+                            window_s=60,
+                            maximum_pending=2)
+
+            output = []
+            for event in i.read_events():
+                output += correlator.process(event)
+
+            self.assertEqual(len(correlator), 2)
+
+            self.assertEqual(
+                [(event.filename, event.type_names) for event in output],
+                [('file0', ('IN_DELETE',))])
+
+            self.assertEqual(
+                [event.filename for event in correlator.flush()],
+                ['file1', 'file2'])
+
+            self.assertEqual(len(correlator), 0)
+
+    def test__recreated(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = os.path.join(path, 'aa')
+            os.mkdir(path1)
+
+            with open(os.path.join(path1, 'file1'), 'w'):
+                pass
+
+            i = inotify.adapters.Inotify()
+            i.add_watch(path1, inotify.constants.IN_MOVE | inotify.constants.IN_CREATE)
+
+            # Moved out of what we're watching, and then created again.
+
+            os.rename(os.path.join(path1, 'file1'), os.path.join(path, 'file1'))
+
+            with open(os.path.join(path1, 'file1'), 'w'):
+                pass
+
+            correlator = inotify.moves.MoveCorrelator(window_s=60)
+
+            output = []
+            for event in i.read_events():
+                output += correlator.process(event)
+
+            self.assertEqual(len(correlator), 0)
+
+            self.assertEqual(
+                [(type_names, filename) for _, type_names, _, filename in output],
+                [
+                    (['IN_DELETE'], 'file1'),
+                    (['IN_CREATE'], 'file1'),
+                ])
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import unittest
+
+import inotify.adapters
+import inotify.constants
+import inotify.polling
+import inotify.test_support
+
+
+class TestPollingInotify(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestPollingInotify, self).__init__(*args, **kwargs)
+
+    def __read_events(self, i):
+        return sorted(
+            (e[2], e[3], e[1])
+            for e
+            in i.read_events(timeout_s=1))
+
+    def test__read_events(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.polling.PollingInotify(poll_interval_s=0.05)
+            wd = i.add_watch(path)
+
+            self.assertEqual(wd, 1)
+            self.assertEqual(i.get_watch_id(path), 1)
+
+            os.mkdir('aa')
+
+            with open('file1', 'w'):
+                pass
+
+            self.assertEqual(
+                self.__read_events(i),
+                [
+                    (path, 'aa', ['IN_CREATE', 'IN_ISDIR']),
+                    (path, 'file1', ['IN_CREATE']),
+                ])
+
+            with open('file1', 'w') as f:
+                f.write('data')
+
+            self.assertEqual(
+                self.__read_events(i),
+                [
+                    (path, 'file1', ['IN_CLOSE_WRITE']),
+                    (path, 'file1', ['IN_MODIFY']),
+                ])
+
+            os.chmod('file1', 0o600)
+
+            self.assertEqual(
+                self.__read_events(i),
+                [
+                    (path, 'file1', ['IN_ATTRIB']),
+                ])
+
+            os.unlink('file1')
+            os.rmdir('aa')
+
+            self.assertEqual(
+                self.__read_events(i),
+                [
+                    (path, 'aa', ['IN_DELETE', 'IN_ISDIR']),
+                    (path, 'file1', ['IN_DELETE']),
+                ])
+
+            # Nothing changed.
+            self.assertEqual(i.read_events(timeout_s=0.2), [])
+
+            i.remove_watch(path)
+
+            self.assertEqual(
+                self.__read_events(i),
+                [
+                    (path, '', ['IN_IGNORED']),
+                ])
+
+            self.assertEqual(i.watch_count, 0)
+
+    def test__mask(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.polling.PollingInotify(poll_interval_s=0.05)
+            i.add_watch(path, inotify.constants.IN_DELETE)
+
+            with open('file1', 'w'):
+                pass
+
+            self.assertEqual(i.read_events(timeout_s=0.2), [])
+
+            os.unlink('file1')
+
+            self.assertEqual(
+                self.__read_events(i),
+                [
+                    (path, 'file1', ['IN_DELETE']),
+                ])
+
+    def test__add_watch__not_directory(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.polling.PollingInotify()
+
+            with open('file1', 'w'):
+                pass
+
+            _, errors = i.add_watches([
+                os.path.join(path, 'file1'),
+                os.path.join(path, 'missing'),
+            ])
+
+            self.assertEqual(
+                errors,
+                {
+                    os.path.join(path, 'file1'): inotify.polling.ENOTDIR,
+                    os.path.join(path, 'missing'): inotify.polling.ENOENT,
+                })
+
+
+class TestPollingTree(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestPollingTree, self).__init__(*args, **kwargs)
+
+    def __read_all_events(self, i):
+        events = i.event_gen(timeout_s=0.5, yield_nones=False)
+        return [(e[2], e[3], e[1]) for e in events]
+
+    def test__backend(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.InotifyTree(
+                    path,
+                    mask=inotify.constants.IN_CREATE,
+                    backend='polling',
+                    backend_poll_interval_s=0.05)
+
+            self.assertEqual(i.inotify.watch_count, 1)
+            self.assertGreaterEqual(
+                i.inotify.get_watch_id(path),
+                inotify.adapters._POLLED_FIRST_WD)
+
+            # Everything in a new directory is reported since it all happened
+            # between scans.
+
+            os.makedirs(os.path.join('aa', 'bb'))
+
+            with open(os.path.join('aa', 'bb', 'file1'), 'w'):
+                pass
+
+            path1 = os.path.join(path, 'aa')
+            path2 = os.path.join(path1, 'bb')
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [
+                    (path, 'aa', ['IN_CREATE', 'IN_ISDIR']),
+                    (path1, 'bb', ['IN_CREATE', 'IN_ISDIR']),
+                    (path2, 'file1', ['IN_CREATE']),
+                ])
+
+            self.assertEqual(i.inotify.watch_count, 3)
+
+            shutil.rmtree(path1)
+
+            events = self.__read_all_events(i)
+
+            self.assertIn((path, 'aa', ['IN_DELETE', 'IN_ISDIR']), events)
+            self.assertEqual(i.inotify.watch_count, 1)
+
+    def test__backend__auto(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.adapters.InotifyTree(path)
+
+            # Temporary directories are local.
+            self.assertIsInstance(i.inotify, inotify.adapters.Inotify)
+
+            with self.assertRaises(ValueError):
+                inotify.adapters.InotifyTree(path, backend='invalid')
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.constants
+import inotify.sharded
+import inotify.test_support
+
+
+class TestInotifyShardedTree(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestInotifyShardedTree, self).__init__(*args, **kwargs)
+
+    def __read_all_events(self, i):
+        events = list(i.event_gen(timeout_s=1, yield_nones=False))
+        return sorted((path, filename) for _, _, path, filename in events)
+
+    def test__cycle(self):
+        with inotify.test_support.temp_path() as path:
+            for name in ('aa', 'bb', 'cc', 'dd'):
+                os.makedirs(os.path.join(path, name, 'ee'))
+
+            mask = inotify.constants.IN_CREATE | inotify.constants.IN_MOVE
+
+            with inotify.sharded.InotifyShardedTree(path, shards=2, mask=mask) as i:
+                self.assertEqual(
+                    [stats.watches for stats in i.stats],
+                    [5, 4])
+
+                for name in ('aa', 'bb', 'cc', 'dd'):
+                    with open(os.path.join(path, name, 'ee', 'file'), 'w'):
+                        pass
+
+                self.assertEqual(
+                    self.__read_all_events(i),
+                    [(os.path.join(path, name, 'ee'), 'file') for name in ('aa', 'bb', 'cc', 'dd')])
+
+                # New top-level directories go to the least-loaded shard.
+
+                os.mkdir(os.path.join(path, 'ff'))
+                self.assertEqual(self.__read_all_events(i), [(path, 'ff')])
+
+                self.assertEqual(
+                    [stats.watches for stats in i.stats],
+                    [5, 5])
+
+                # Renames are handled by the shard that owns the directory.
+
+                os.rename(os.path.join(path, 'aa'), os.path.join(path, 'gg'))
+                self.assertEqual(
+                    self.__read_all_events(i),
+                    [(path, 'aa'), (path, 'gg')])
+
+                with open(os.path.join(path, 'gg', 'ee', 'file2'), 'w'):
+                    pass
+
+                self.assertEqual(
+                    self.__read_all_events(i),
+                    [(os.path.join(path, 'gg', 'ee'), 'file2')])
+
+                stats = i.stats
+
+                self.assertEqual([s.watches for s in stats], [5, 5])
+                self.assertEqual([s.overflows for s in stats], [0, 0])
+                self.assertEqual([s.queued_bytes for s in stats], [0, 0])
+                self.assertEqual(sum(s.events for s in stats), 8)
+
+    def test__reader_failed(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.sharded.InotifyShardedTree(path, shards=2)
+
+            def _handle_event(event):
+                raise ValueError("Handling failed.")
+
+            for shard in i.shards:
+                shard._handle_event = _handle_event
+
+            with open(os.path.join(path, 'file1'), 'w'):
+                pass
+
+            with self.assertRaises(ValueError):
+                list(i.event_gen(timeout_s=1, yield_nones=False))
+
+            i.close()
+
+            for shard in i.shards:
+                self.assertIsNone(shard.inotify.fd)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import inotify.crawl
+import inotify.snapshot
+import inotify.test_support
+
+
+class TestTreeSnapshot(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestTreeSnapshot, self).__init__(*args, **kwargs)
+
+    def test__rescan(self):
+        with inotify.test_support.temp_path() as path:
+            path1 = os.path.join(path, 'aa')
+            os.mkdir(path1)
+            os.mkdir(os.path.join(path1, 'bb'))
+
+            with open(os.path.join(path, 'file1'), 'w'):
+                pass
+
+            snapshot = inotify.snapshot.TreeSnapshot()
+            inotify.crawl.crawl(path, listing_cb=snapshot.record)
+
+            self.assertEqual(
+                sorted(snapshot.paths),
+                sorted([path, path1, os.path.join(path1, 'bb')]))
+
+            os.unlink(os.path.join(path, 'file1'))
+            os.mkdir(os.path.join(path, 'cc'))
+
+            # Everything was just modified, so everything is stale.
+            self.assertEqual(sorted(snapshot.find_stale()), sorted(snapshot.paths))
+
+            (created, deleted) = snapshot.rescan(path)
+
+            self.assertEqual(created, [('cc', True)])
+            self.assertEqual(deleted, [('file1', False)])
+
+            self.assertEqual(snapshot.rescan(path), ([], []))
+            self.assertIsNone(snapshot.rescan(os.path.join(path, 'missing')))
+
+    def test__remove_subtree(self):
+        with inotify.test_support.temp_path() as path:
+            os.makedirs(os.path.join(path, 'aa', 'bb'))
+            os.mkdir(os.path.join(path, 'cc'))
+
+            snapshot = inotify.snapshot.TreeSnapshot()
+            inotify.crawl.crawl(path, listing_cb=snapshot.record)
+
+            path1 = os.path.join(path, 'aa')
+
+            self.assertEqual(
+                [p for p, _ in snapshot.iterate_subtree(path1)],
+                [path1, os.path.join(path1, 'bb')])
+
+            removed = snapshot.remove_subtree(path1)
+
+            self.assertEqual(removed, [path1, os.path.join(path1, 'bb')])
+            self.assertEqual(
+                sorted(snapshot.paths),
+                sorted([path, os.path.join(path, 'cc')]))
+
+    def test__save_and_load(self):
+        with inotify.test_support.temp_path() as path:
+            os.makedirs(os.path.join(path, 'aa', 'bb'))
+
+            with open(os.path.join(path, 'file1'), 'w'):
+                pass
+
+            snapshot = inotify.snapshot.TreeSnapshot()
+            inotify.crawl.crawl(path, listing_cb=snapshot.record)
+
+            filepath = os.path.join(path, 'tree.snapshot')
+            snapshot.save(filepath)
+
+            loaded = inotify.snapshot.TreeSnapshot.load(filepath)
+
+            self.assertEqual(sorted(loaded.paths), sorted(snapshot.paths))
+
+            for p in snapshot.paths:
+                expected = snapshot.get(p)
+                actual = loaded.get(p)
+
+                self.assertEqual(
+                    (actual.inode, actual.mtime_ns, actual.is_racy, actual.children),
+                    (expected.inode, expected.mtime_ns, expected.is_racy, expected.children))
+
+            self.assertIsNone(
+                inotify.snapshot.TreeSnapshot.load(os.path.join(path, 'missing')))
+
+            # Anything unrecognizable is ignored.
+
+            with open(filepath, 'r+b') as f:
+                f.seek(len(inotify.snapshot._FILE_MAGIC))
+                f.write(b'\xff\xff')
+
+            self.assertIsNone(inotify.snapshot.TreeSnapshot.load(filepath))
+
+            with open(filepath, 'wb') as f:
+                f.write(b'not a snapshot')
+
+            self.assertIsNone(inotify.snapshot.TreeSnapshot.load(filepath))
+
+            # A valid header with a body that doesn't decode.
+
+            with open(filepath, 'wb') as f:
+                f.write(inotify.snapshot._FILE_MAGIC)
+                f.write(inotify.snapshot._FILE_HEADER_STRUCT.pack(
+                            inotify.snapshot._FILE_VERSION))
+
+                f.write(b'[["aa", 1]')
+
+            self.assertIsNone(inotify.snapshot.TreeSnapshot.load(filepath))
+
+    def test__deep_subtree(self):
+        snapshot = inotify.snapshot.TreeSnapshot()
+
+        # Deeper than the interpreter's recursion-limit.
+        paths = []
+        path = '/'
+        for _ in range(5000):
+            paths.append(path)
+            snapshot.add(
+                path,
+                inotify.snapshot.DirectoryState(0, 0, {'aa': True}))
+
+            path = os.path.join(path, 'aa')
+
+        self.assertEqual([p for p, _ in snapshot.iterate_subtree('/')], paths)
+        self.assertEqual(snapshot.remove_subtree('/'), paths)
+        self.assertEqual(len(snapshot), 0)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import unittest
+
+import inotify.constants
+import inotify.threaded
+import inotify.test_support
+
+
+class TestThreadedInotify(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        self.maxDiff = None
+
+        super(TestThreadedInotify, self).__init__(*args, **kwargs)
+
+    def __wait_for(self, predicate):
+        stop_at_s = time.time() + 2
+        while predicate() is False:
+            self.assertLess(time.time(), stop_at_s)
+            time.sleep(0.01)
+
+    def __read_all_events(self, i):
+        events = i.event_gen(timeout_s=0.2, yield_nones=False)
+        return [(filename, type_names) for _, type_names, _, filename in events]
+
+    def test__cycle(self):
+        with inotify.test_support.temp_path() as path:
+            mask = inotify.constants.IN_CREATE | inotify.constants.IN_DELETE_SELF
+
+            with inotify.threaded.ThreadedInotify() as i:
+                i.add_watch(path, mask)
+
+                # Watches can be added from another thread while we read.
+
+                os.mkdir('aa')
+
+                thread = threading.Thread(
+                            target=i.add_watch,
+                            args=(os.path.join(path, 'aa'), mask))
+
+                thread.start()
+                thread.join()
+
+                with open(os.path.join('aa', 'file1'), 'w'):
+                    pass
+
+                events = list(i.event_gen(timeout_s=0.2, yield_nones=False))
+
+                self.assertEqual(
+                    [(p, filename, type_names) for _, type_names, p, filename in events],
+                    [
+                        (path, 'aa', ['IN_CREATE', 'IN_ISDIR']),
+                        (os.path.join(path, 'aa'), 'file1', ['IN_CREATE']),
+                    ])
+
+                self.assertEqual(i.watch_count, 2)
+
+                i.remove_watch(os.path.join(path, 'aa'))
+                self.assertEqual(i.watch_count, 1)
+
+                self.assertEqual(i.stats().watches, 1)
+
+            # Closing stops the generator once everything has been retrieved.
+
+            self.assertEqual(list(i.event_gen(yield_nones=False)), [])
+
+    def test__overflow_policy__block(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.threaded.ThreadedInotify(
+                    maximum_queued_events=1,
+                    overflow_policy='block')
+
+            i.add_watch(path, inotify.constants.IN_CREATE)
+
+            for name in ('file1', 'file2', 'file3'):
+                with open(name, 'w'):
+                    pass
+
+            self.__wait_for(lambda: i.queued_events == 1)
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [
+                    ('file1', ['IN_CREATE']),
+                    ('file2', ['IN_CREATE']),
+                    ('file3', ['IN_CREATE']),
+                ])
+
+            i.close()
+
+    def test__overflow_policy__drop_oldest(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.threaded.ThreadedInotify(
+                    maximum_queued_events=2,
+                    overflow_policy='drop-oldest',
+                    compact_events=True)
+
+            i.add_watch(path, inotify.constants.IN_CREATE)
+
+            for name in ('file1', 'file2', 'file3', 'file4', 'file5'):
+                with open(name, 'w'):
+                    pass
+
+            self.__wait_for(lambda: i.dropped_events == 3)
+
+            self.assertEqual(
+                [e.filename for e in i.read_events()],
+                ['file4', 'file5'])
+
+            i.close()
+
+    def test__overflow_policy__coalesce(self):
+        with inotify.test_support.temp_path() as path:
+            i = inotify.threaded.ThreadedInotify(
+                    maximum_queued_events=1,
+                    overflow_policy='coalesce')
+
+            mask = \
+                inotify.constants.IN_CREATE | \
+                inotify.constants.IN_MODIFY | \
+                inotify.constants.IN_ATTRIB
+
+            with open('aa', 'w') as f:
+                i.add_watch(path, mask)
+
+                # Identical consecutive events are merged by the kernel, so we
+                # alternate. They're all merged into the one that's waiting.
+                for _ in range(5):
+                    f.write('x')
+                    f.flush()
+
+                    os.chmod(f.name, 0o600)
+
+            self.__wait_for(lambda: i.coalesced_events == 9)
+
+            # A creation isn't merged (even into the most recent event for the
+            # same file), so the reader waits for room.
+
+            os.unlink('aa')
+
+            with open('aa', 'w'):
+                pass
+
+            self.assertEqual(
+                self.__read_all_events(i),
+                [
+                    ('aa', ['IN_MODIFY', 'IN_ATTRIB']),
+                    ('aa', ['IN_CREATE']),
+                ])
+
+            self.assertEqual(i.coalesced_events, 9)
+
+            i.close()
+
+    def test__overflow_policy__invalid(self):
+        with self.assertRaises(ValueError):
+            inotify.threaded.ThreadedInotify(overflow_policy='other')